@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script Name: run_benchmarks.py
+Description: Reproducible benchmark of the logD prediction pipeline.
+
+For every library size and representation the pipeline stages are run on a
+deterministic synthetic SMILES library (see smiles_library.py) and timed
+with the StageProfiler used by logD_predictor.py --profile. Throughput
+(molecules/s) and peak memory of every stage, plus the end-to-end time per
+representation, are written to a JSON results file and compared with a
+stored baseline.
+
+Stages that cannot run on the current machine (no Java/predictor jars for
+the NMR representations, no model tables for the query stage) are recorded
+as skipped. With --nmr-backend lookup the NMR representations run on the
+pure-Python stand-in backend instead of Java, so bucketing, merging and
+model_query can be benchmarked on any machine. No network access is needed.
+
+Examples:
+    python benchmarks/run_benchmarks.py --sizes 100 1000 --representations FP 1H
+    python benchmarks/run_benchmarks.py --sizes 100 --save-baseline
+    python benchmarks/run_benchmarks.py --sizes 100 --tolerance 0.25
+    python benchmarks/run_benchmarks.py --sizes 10000 --nmr-backend lookup
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BIN_DIR = os.path.join(os.path.dirname(BENCH_DIR), "logD_predictor_bin")
+sys.path.insert(0, BIN_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from smiles_library import write_library  # noqa: E402
+from profiler import StageProfiler  # noqa: E402
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+REPRESENTATIONS = ['FP', '1H', '13C', 'hybrid']
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+
+def java_available():
+    """The NMR stages need javac/java and the predictor jars."""
+    jars = [os.path.join(BIN_DIR, "predictor", jar) for jar in ("predictorh.jar", "predictorc.jar", "cdk-2.9.jar")]
+    return bool(shutil.which("java") and shutil.which("javac") and all(os.path.exists(j) for j in jars))
+
+
+def nmr_available(nmr_backend):
+    return nmr_backend != 'java' or java_available()
+
+
+class _Skip(Exception):
+    pass
+
+
+class BenchmarkRun:
+    """Runs the stages of one library size in a scratch directory."""
+
+    def __init__(self, size, seed, work_dir, algorithms, models_dir, nmr_backend='java'):
+        self.size = size
+        self.nmr_backend = nmr_backend
+        self.work_dir = work_dir
+        self.algorithms = algorithms
+        self.models_dir = models_dir
+        self.csv_path = write_library(os.path.join(work_dir, f"bench_{size}.csv"), size, seed)
+        self.verified_csv_path = None
+        self.mol_directory = None
+        self.shared = {}
+
+    def _silent(self):
+        log = io.StringIO()
+        stack = contextlib.ExitStack()
+        stack.enter_context(contextlib.redirect_stdout(log))
+        stack.enter_context(contextlib.redirect_stderr(log))
+        return stack
+
+    def verify(self):
+        """verify_csv once per size; shared by all representations."""
+        from csv_checker import verify_csv
+        profiler = StageProfiler(enabled=True)
+        profiler.molecules = self.size
+        with self._silent(), profiler.stage('verify_csv'):
+            self.verified_csv_path = verify_csv(self.csv_path, True)
+        self.shared['verify_csv'] = profiler.stages[0]
+
+    def mols(self):
+        """generate_mol_files once per size; shared by the NMR representations."""
+        from gen_mols import generate_mol_files
+        profiler = StageProfiler(enabled=True)
+        profiler.molecules = self.size
+        with self._silent(), profiler.stage('generate_mol_files'):
+            self.mol_directory = generate_mol_files(self.verified_csv_path, True, self.work_dir)
+        self.shared['generate_mol_files'] = profiler.stages[0]
+
+    def representation(self, representation):
+        """Runs the remaining stages of *representation* and returns its records."""
+        from nmr_backends import get_backend
+        from bucket import bucket
+        from fp_generator import fp_generator
+        from concatenator import concatenate
+
+        profiler = StageProfiler(enabled=True)
+        profiler.molecules = self.size
+        skipped = []
+        rep_dir = os.path.join(self.work_dir, representation)
+        os.makedirs(rep_dir, exist_ok=True)
+
+        with self._silent():
+            if representation == 'FP':
+                with profiler.stage('fp_generator'):
+                    processed_dir = fp_generator(self.verified_csv_path, True, rep_dir)
+                datasets = [self._dataset(profiler, processed_dir, 'FP', rep_dir)]
+            else:
+                if not nmr_available(self.nmr_backend):
+                    raise _Skip("java/javac or predictor jars not available")
+                backend = get_backend(self.nmr_backend)
+                datasets = []
+                for sub_predictor in (['1H', '13C'] if representation == 'hybrid' else [representation]):
+                    with profiler.stage('predict_spectra', sub_predictor):
+                        csv_output_folder = backend.predict(self.mol_directory, sub_predictor, True, rep_dir)
+                    with profiler.stage('bucket', sub_predictor):
+                        processed_dir = bucket(csv_output_folder, sub_predictor, True, rep_dir)
+                    datasets.append(self._dataset(profiler, processed_dir, sub_predictor, rep_dir))
+
+            if representation == 'hybrid':
+                with profiler.stage('concatenate'):
+                    dataset, _ = concatenate(datasets, True, rep_dir)
+            else:
+                dataset = datasets[0]
+
+            try:
+                self._query(profiler, dataset, representation)
+            except _Skip as e:
+                skipped.append(f"query: {e}")
+
+        return profiler.stages, skipped
+
+    def _dataset(self, profiler, processed_dir, predictor, rep_dir):
+        from merger import merger
+        from custom_header import custom_header
+        with profiler.stage('merger', predictor):
+            output_path, _ = merger(processed_dir, self.verified_csv_path, predictor, True, rep_dir)
+        with profiler.stage('custom_header', predictor):
+            dataset, _ = custom_header(output_path, self.verified_csv_path, predictor, True, rep_dir)
+        return dataset
+
+    def _query(self, profiler, dataset, representation):
+        from model_query import get_model, predict_models, read_model_table, summarize_predictions
+        model_table_path = os.path.join(self.models_dir, f"{representation}_models_info.csv")
+        if not os.path.exists(model_table_path):
+            raise _Skip(f"{model_table_path} not found")
+        model_table_df = read_model_table(model_table_path)
+        model_table_df = model_table_df[model_table_df['ML_algorithm'].isin(self.algorithms)]
+        if model_table_df.empty:
+            raise _Skip(f"no models for {self.algorithms}")
+        features = dataset.set_index('MOLECULE_NAME')
+        # Model loading is timed separately so that 'query' measures warm inference only
+        with profiler.stage('load_models', representation, molecules=0):
+            for _, row in model_table_df.iterrows():
+                get_model(row['ML_algorithm'], os.path.join(self.models_dir, row['model_path']), features.shape[1])
+        with profiler.stage('query', representation):
+            predictions = predict_models(features, model_table_df, self.models_dir)
+            summarize_predictions(predictions, model_table_df)
+
+
+def run(sizes, representations, seed, algorithms, models_dir, keep_files=False, nmr_backend='java'):
+    """Runs all benchmarks and returns the results dictionary."""
+    results = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+        'seed': seed,
+        'nmr_backend': nmr_backend,
+        'algorithms': algorithms,
+        'benchmarks': [],
+    }
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix=f"logD_bench_{size}_")
+        try:
+            run_ = BenchmarkRun(size, seed, work_dir, algorithms, models_dir, nmr_backend)
+            run_.verify()
+            if any(r != 'FP' for r in representations) and nmr_available(nmr_backend):
+                run_.mols()
+
+            for representation in representations:
+                print(f"Benchmark {COLORS[2]}{representation}{RESET} on {COLORS[2]}{size}{RESET} molecules ...")
+                entry = {'size': size, 'representation': representation, 'stages': [], 'skipped': []}
+                shared = ['verify_csv'] + ([] if representation == 'FP' else ['generate_mol_files'])
+                start = time.perf_counter()
+                try:
+                    stages, skipped = run_.representation(representation)
+                    entry['stages'] = [run_.shared[name] for name in shared if name in run_.shared] + stages
+                    entry['skipped'] = skipped
+                    end_to_end = time.perf_counter() - start + sum(
+                        run_.shared[name]['wall_s'] for name in shared if name in run_.shared)
+                    entry['end_to_end_s'] = round(end_to_end, 4)
+                    entry['end_to_end_molecules_per_s'] = round(size / end_to_end, 2) if end_to_end > 0 else None
+                except _Skip as e:
+                    entry['skipped'].append(f"all stages: {e}")
+                    print(f"  {COLORS[2]}skipped:{RESET} {e}")
+                results['benchmarks'].append(entry)
+        finally:
+            if keep_files:
+                print(f"Scratch files kept in {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _throughputs(results):
+    """Maps (size, representation, stage) to molecules/s, including 'end_to_end'."""
+    values = {}
+    for entry in results.get('benchmarks', []):
+        key = (entry['size'], entry['representation'])
+        for stage in entry.get('stages', []):
+            if stage.get('molecules_per_s'):
+                values[key + (stage['stage'],)] = stage['molecules_per_s']
+        if entry.get('end_to_end_molecules_per_s'):
+            values[key + ('end_to_end',)] = entry['end_to_end_molecules_per_s']
+    return values
+
+
+def _peak_memory(results):
+    """Maps (size, representation, stage) to the peak RSS of the stage in MB."""
+    values = {}
+    for entry in results.get('benchmarks', []):
+        key = (entry['size'], entry['representation'])
+        for stage in entry.get('stages', []):
+            if stage.get('peak_rss_mb'):
+                values[key + (stage['stage'],)] = stage['peak_rss_mb']
+    return values
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares throughputs and peak memory with the baseline. Returns the list
+    of regressions: entries whose molecules/s dropped, or whose peak RSS
+    grew, by more than *tolerance* (fraction).
+    """
+    regressions = []
+    metrics = [('molecules_per_s', _throughputs, 'mol/s', lambda ratio: ratio < 1.0 - tolerance),
+               ('peak_rss_mb', _peak_memory, 'MB', lambda ratio: ratio > 1.0 + tolerance)]
+    for metric, values, unit, regressed in metrics:
+        current = values(results)
+        reference = values(baseline)
+        for key, base_value in sorted(reference.items(), key=str):
+            if key not in current:
+                continue
+            ratio = current[key] / base_value
+            status = 'REGRESSION' if regressed(ratio) else 'ok'
+            color = COLORS[1] if status == 'REGRESSION' else COLORS[0]
+            print(f"{color}{status:>10}{RESET}  {key[0]:>7} {key[1]:<7} {key[2]:<32} "
+                  f"{current[key]:>10.2f} {unit:<5}  (baseline {base_value:.2f}, x{ratio:.2f})")
+            if status == 'REGRESSION':
+                regressions.append({'size': key[0], 'representation': key[1], 'stage': key[2],
+                                    'metric': metric, metric: current[key], f'baseline_{metric}': base_value})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible benchmark of the logD prediction pipeline.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Library sizes to benchmark (default: 100 1000 10000 100000).")
+    parser.add_argument("--representations", nargs='+', default=REPRESENTATIONS, choices=REPRESENTATIONS,
+                        help="Representations to benchmark.")
+    parser.add_argument("--algorithms", nargs='+', default=['SVR', 'XGB', 'DNN', 'CNN'],
+                        choices=['SVR', 'XGB', 'DNN', 'CNN'], help="Models queried in the query stage.")
+    parser.add_argument("--models-dir", type=str, default=os.path.join(BIN_DIR, "joblib_models"),
+                        help="Directory with <representation>_models_info.csv and the model files.")
+    parser.add_argument("--seed", type=int, default=2024, help="Seed of the SMILES library generator.")
+    parser.add_argument("--nmr-backend", type=str, default='java', choices=['java', 'lookup'],
+                        help="NMR spectrum prediction backend ('lookup' runs without Java).")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Results file (default: benchmarks/results/bench_<timestamp>.json).")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline results file.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative drop of molecules/s, or growth of peak memory, before a stage "
+                             "counts as a regression.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results of this run as the new baseline.")
+    parser.add_argument("--keep-files", action="store_true", help="Do not delete the scratch directories.")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.representations, args.seed, args.algorithms, args.models_dir,
+                  args.keep_files, args.nmr_backend)
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"bench_{results['timestamp']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved as {COLORS[2]}{args.baseline}{RESET}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nComparison with baseline {COLORS[2]}{args.baseline}{RESET} (tolerance {args.tolerance:.0%}):\n")
+        results['regressions'] = compare(results, baseline, args.tolerance)
+        if results['regressions']:
+            exit_code = 1
+    else:
+        print(f"\n{COLORS[2]}No baseline found ({args.baseline}); run with --save-baseline to create one.{RESET}")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved as {COLORS[2]}{output}{RESET}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
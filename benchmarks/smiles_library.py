@@ -0,0 +1,111 @@
+# smiles_library.py
+
+"""
+Deterministic generator of drug-like SMILES libraries for benchmarking.
+
+Molecules are assembled from a fixed set of ring fragments, linkers and
+substituents with a seeded random generator, so a given (size, seed) always
+yields the same library on every machine. When RDKit is available every
+SMILES is validated and canonicalised.
+"""
+
+import random
+
+try:
+    from rdkit import Chem, RDLogger
+    RDLogger.DisableLog("rdApp.*")
+except ImportError:  # the generator itself does not need RDKit
+    Chem = None
+
+# Ring fragments; the first atom bonds to the previous fragment and
+# {R} marks an optional substituent position.
+RING_FRAGMENTS = [
+    "c1ccc({R})cc1",
+    "c1cc({R})ccc1",
+    "c1ccncc1",
+    "c1cnc({R})nc1",
+    "c1ccc2[nH]ccc2c1",
+    "c1ccc2ncccc2c1",
+    "c1cc({R})sc1",
+    "c1cnn(C)c1",
+    "c1ncc({R})o1",
+    "C1CCN(CC1)",
+    "C1CCOCC1",
+    "C1CC1",
+    "C1CCCCC1",
+    "N1CCOCC1",
+    "N1CCN(C)CC1",
+]
+
+# Linkers placed between two ring fragments
+LINKERS = [
+    "",
+    "C",
+    "CC",
+    "C(=O)N",
+    "NC(=O)",
+    "O",
+    "OC",
+    "N",
+    "S(=O)(=O)N",
+    "C(=O)",
+    "CN(C)C",
+    "NC(=O)N",
+]
+
+# Substituents filled into the {R} positions
+SUBSTITUENTS = [
+    "C", "CC", "F", "Cl", "Br", "O", "OC", "N", "N(C)C", "C#N",
+    "C(F)(F)F", "C(=O)O", "C(=O)N", "S(C)(=O)=O", "OC(F)(F)F", "CO",
+]
+
+
+def _fragment(rng):
+    fragment = rng.choice(RING_FRAGMENTS)
+    while "{R}" in fragment:
+        fragment = fragment.replace("{R}", rng.choice(SUBSTITUENTS) if rng.random() < 0.7 else "[H]", 1)
+    return fragment
+
+
+def random_smiles(rng, min_fragments=2, max_fragments=4):
+    """Builds one molecule from 2-4 ring fragments joined by linkers."""
+    n_fragments = rng.randint(min_fragments, max_fragments)
+    parts = [_fragment(rng)]
+    for _ in range(n_fragments - 1):
+        parts.append(rng.choice(LINKERS))
+        parts.append(_fragment(rng))
+    return "".join(parts)
+
+
+def generate_library(size, seed=2024):
+    """
+    Returns a list of *size* unique (name, SMILES) tuples.
+
+    Parameters:
+    - size (int): Number of molecules.
+    - seed (int): Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    library = []
+    seen = set()
+    while len(library) < size:
+        smiles = random_smiles(rng)
+        if Chem is not None:
+            mol = Chem.MolFromSmiles(smiles)
+            if mol is None:
+                continue
+            smiles = Chem.MolToSmiles(mol)
+        if smiles in seen:
+            continue
+        seen.add(smiles)
+        library.append((f"BENCH_{len(library) + 1:06d}", smiles))
+    return library
+
+
+def write_library(path, size, seed=2024):
+    """Writes the library as a MOLECULE_NAME;SMILES input CSV and returns *path*."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("MOLECULE_NAME;SMILES\n")
+        for name, smiles in generate_library(size, seed):
+            f.write(f"{name};{smiles}\n")
+    return path
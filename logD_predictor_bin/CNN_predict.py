@@ -131,45 +131,67 @@ class Net(nn.Module):
         return x
 
 
-def model_predictor(model_path, structure_features, quiet):
-
-    # Defining the function that controls printing
-    def verbose_print(*args, **kwargs):
-        if not quiet:
-            print(*args, **kwargs)
-
+def load_model(model_path, input_dim):
+    """
+    Reconstructs the network from the hyperparameters stored next to the
+    weights file and loads the saved weights. The model is returned in
+    evaluation mode.
+    """
     summary_path = model_path.replace("_model.pth", "_summary.txt")
     params = parse_params_from_summary(summary_path)
 
-    input_dim = structure_features.shape[1]
     model = Net(params, input_dim)
     # Loading model weights without the whole object
     model_weights = torch.load(model_path, map_location=torch.device('cpu'), weights_only=True)
     model.load_state_dict(model_weights)  # Pass only the weights to the model
     model.eval()
-
-    # Convert `structure_features` to numeric data types and tensor PyTorch
-    if hasattr(structure_features, 'values'):
-        structure_features = structure_features.values  
-    structure_features = structure_features.astype(np.float32)  
-
-    verbose_print(f"Initial shape of structure_features: {structure_features.shape}")
+    return model
+
+def save_compiled(model, path_base, input_dim):
+    """
+    Stores the network for the compiled model bundle as a frozen TorchScript
+    module, so loading it needs neither the summary file nor Net.
+    """
+    from model_bundle import save_torchscript
+    return save_torchscript(model, path_base, torch.zeros((2, 1, input_dim), dtype=torch.float32))
+
+def load_compiled(path, input_dim=None):
+    """Loads a network stored by save_compiled() in evaluation mode."""
+    from model_bundle import load_torchscript
+    return load_torchscript(path)
+
+def predict(model, features):
+    """
+    Predicts values for a 2D feature matrix (rows = molecules) and returns
+    a 1D NumPy array with one prediction per row.
+    """
+    if hasattr(features, 'values'):
+        features = features.values
+    features = np.asarray(features, dtype=np.float32)
+    if features.ndim == 1:
+        features = features[np.newaxis, :]
 
     with torch.no_grad():
-        # Remove all redundant dimensions to get a flat tensor [250].
-        input_features = torch.tensor(structure_features.squeeze(), dtype=torch.float32)
+        # Add the channel dimension so that the resulting tensor is [batch, 1, n_features].
+        input_features = torch.tensor(features, dtype=torch.float32).unsqueeze(1)
+        prediction = model(input_features).reshape(-1)
 
-        # Add dimensions for batch and channels so that the resulting tensor is [1, 1, 250].
-        input_features = input_features.unsqueeze(0).unsqueeze(0)
-        
-        # Confirmation of final form
-        verbose_print(f"Final shape of input_features for model: {input_features.shape}")
+    return prediction.numpy().astype(float)
 
-        # Transfer to the model
-        prediction = model(input_features).item()
 
+def model_predictor(model_path, structure_features, quiet):
 
-    return prediction
+    # Defining the function that controls printing
+    def verbose_print(*args, **kwargs):
+        if not quiet:
+            print(*args, **kwargs)
 
+    input_dim = structure_features.shape[1]
+    model = load_model(model_path, input_dim)
 
+    verbose_print(f"Initial shape of structure_features: {structure_features.shape}")
 
+    # Transfer to the model
+    prediction = predict(model, structure_features)[0].item()
+
+    return prediction
@@ -107,44 +107,74 @@ class Net(nn.Module):
     def forward(self, x):
         return self.model(x)
 
-def model_predictor(model_path, structure_features, quiet=False):
+def load_model(model_path, input_dim):
     """
-    Loads the model, reconstructs it based on saved hyperparameters,
-    and makes a prediction on the input features.
+    Reconstructs the network from the hyperparameters stored next to the
+    weights file and loads the saved weights. The model is returned in
+    evaluation mode.
     """
-    # Define a verbose print function
-    def verbose_print(*args, **kwargs):
-        if not quiet:
-            print(*args, **kwargs)
-
     # Derive the summary.txt path from the model path
     summary_path = model_path.replace("_final_model.pth", "_summary.txt")
     params = parse_params_from_summary(summary_path)
 
     # Create the model
-    input_dim = structure_features.shape[1]
     model = Net(params, input_dim)
 
     # Load model weights safely
     model_weights = torch.load(model_path, map_location=torch.device('cpu'), weights_only=True)
     model.load_state_dict(model_weights)
     model.eval()
+    return model
+
+def save_compiled(model, path_base, input_dim):
+    """
+    Stores the network for the compiled model bundle as a frozen TorchScript
+    module, so loading it needs neither the summary file nor Net.
+    """
+    from model_bundle import save_torchscript
+    return save_torchscript(model, path_base, torch.zeros((2, input_dim), dtype=torch.float32))
 
-    # Ensure structure_features is a NumPy array
-    if hasattr(structure_features, 'values'):
-        structure_features = structure_features.values  # If it's a DataFrame, get the values
+def load_compiled(path, input_dim=None):
+    """Loads a network stored by save_compiled() in evaluation mode."""
+    from model_bundle import load_torchscript
+    return load_torchscript(path)
+
+def predict(model, features):
+    """
+    Predicts values for a 2D feature matrix (rows = molecules) and returns
+    a 1D NumPy array with one prediction per row.
+    """
+    # Ensure features is a NumPy array
+    if hasattr(features, 'values'):
+        features = features.values  # If it's a DataFrame, get the values
 
-    # Convert to PyTorch tensor
     with torch.no_grad():
-        input_features = torch.tensor(structure_features.astype(np.float32), dtype=torch.float32)
+        input_features = torch.tensor(np.asarray(features, dtype=np.float32), dtype=torch.float32)
 
         # If input is 1D, add batch dimension
         if input_features.ndim == 1:
             input_features = input_features.unsqueeze(0)
 
-        verbose_print(f"Input features shape: {input_features.shape}")
+        prediction = model(input_features).reshape(-1)
+
+    return prediction.numpy().astype(float)
+
+def model_predictor(model_path, structure_features, quiet=False):
+    """
+    Loads the model, reconstructs it based on saved hyperparameters,
+    and makes a prediction on the input features.
+    """
+    # Define a verbose print function
+    def verbose_print(*args, **kwargs):
+        if not quiet:
+            print(*args, **kwargs)
+
+    input_dim = structure_features.shape[1]
+    model = load_model(model_path, input_dim)
+
+    verbose_print(f"Input features shape: {structure_features.shape}")
 
-        # Make prediction
-        prediction = model(input_features).item()
+    # Make prediction
+    prediction = predict(model, structure_features)[0].item()
 
     return prediction
@@ -1,4 +1,125 @@
+import json
+import numbers
+import os
+
 import joblib
+import numpy as np
+
+# Kernels that KernelSVR can evaluate from the exported arrays
+EXPORTABLE_KERNELS = ('linear', 'poly', 'rbf', 'sigmoid')
+
+class KernelSVR:
+    """
+    Fitted SVR reduced to its support vectors, dual coefficients and kernel
+    parameters. The arrays can be memory-mapped, so loading it costs
+    neither unpickling nor copying.
+    """
+
+    def __init__(self, support_vectors, dual_coef, intercept, kernel='rbf', gamma=1.0, coef0=0.0, degree=3):
+        self.support_vectors = support_vectors
+        self.dual_coef = dual_coef
+        self.intercept = intercept
+        self.kernel = kernel
+        self.gamma = gamma
+        self.coef0 = coef0
+        self.degree = degree
+        if kernel == 'rbf':
+            self._support_norms = np.einsum('ij,ij->i', support_vectors, support_vectors)
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=float)
+        products = features @ self.support_vectors.T
+        if self.kernel == 'linear':
+            kernel = products
+        elif self.kernel == 'poly':
+            kernel = (self.gamma * products + self.coef0) ** self.degree
+        elif self.kernel == 'sigmoid':
+            kernel = np.tanh(self.gamma * products + self.coef0)
+        else:
+            distances = np.einsum('ij,ij->i', features, features)[:, np.newaxis] - 2 * products + self._support_norms
+            kernel = np.exp(-self.gamma * np.maximum(distances, 0.0))
+        return kernel @ self.dual_coef + self.intercept
+
+def load_model(model_path, input_dim=None):
+    """
+    Loads a saved SVR model with joblib. *input_dim* is accepted only to keep
+    the signature shared with the neural network loaders.
+    """
+    return joblib.load(model_path)
+
+def fitted_gamma(model):
+    """
+    Kernel coefficient a fitted SVR uses: a numeric gamma as given, 'auto'
+    resolved like scikit-learn (1 / number of features) and 'scale', which
+    depends on the variance of the training data, taken from the fitted
+    model. Returns None if it cannot be determined.
+    """
+    gamma = model.get_params().get('gamma')
+    if isinstance(gamma, numbers.Real):
+        return float(gamma)
+    if gamma == 'auto':
+        return 1.0 / model.support_vectors_.shape[1]
+    # Private attribute of scikit-learn's fitted SVR; checked below by save_compiled()
+    fitted = getattr(model, '_gamma', None)
+    return float(fitted) if isinstance(fitted, numbers.Real) else None
+
+def save_compiled(model, path_base, input_dim=None):
+    """
+    Stores an SVR for the compiled model bundle: the support vectors and
+    dual coefficients as .npy arrays and the kernel parameters as JSON.
+    Models that are not a plain SVR with a built-in kernel (e.g.
+    pipelines), whose kernel coefficient cannot be determined, or whose
+    exported predictions differ from the model's own are stored as a
+    joblib copy instead. Returns the path of the file to pass to
+    load_compiled().
+    """
+    gamma = None
+    if getattr(model, 'kernel', None) in EXPORTABLE_KERNELS and hasattr(model, 'support_vectors_'):
+        gamma = fitted_gamma(model)
+    if gamma is not None:
+        support_vectors = np.ascontiguousarray(model.support_vectors_, dtype=float)
+        dual_coef = np.ascontiguousarray(model.dual_coef_.ravel(), dtype=float)
+        params = {
+            'kernel': model.kernel,
+            'gamma': gamma,
+            'coef0': float(model.coef0),
+            'degree': int(model.degree),
+            'intercept': float(model.intercept_[0]),
+        }
+        # The support vectors serve as check rows
+        rows = support_vectors[:10]
+        if not np.allclose(KernelSVR(support_vectors, dual_coef, **params).predict(rows), model.predict(rows),
+                           rtol=1e-9, atol=1e-9):
+            gamma = None
+    if gamma is None:
+        joblib.dump(model, path_base + '.joblib')
+        return path_base + '.joblib'
+
+    np.save(path_base + '_support_vectors.npy', support_vectors)
+    np.save(path_base + '_dual_coef.npy', dual_coef)
+    with open(path_base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
+    return path_base + '.json'
+
+def load_compiled(path, input_dim=None):
+    """Loads a model stored by save_compiled(); the arrays are memory-mapped."""
+    if path.endswith('.joblib'):
+        return joblib.load(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        params = json.load(f)
+    path_base = os.path.splitext(path)[0]
+    return KernelSVR(np.load(path_base + '_support_vectors.npy', mmap_mode='r'),
+                     np.load(path_base + '_dual_coef.npy', mmap_mode='r'), **params)
+
+def predict(model, features):
+    """
+    Predicts values for a feature DataFrame (rows = molecules) and returns
+    a 1D NumPy array with one prediction per row.
+    """
+    if hasattr(features, 'values'):
+        features = features.values
+    features = np.asarray(features, dtype=float)
+    return np.asarray(model.predict(features), dtype=float).ravel()
 
 def model_predictor(model_path, structure_features, quiet):
 
@@ -8,8 +129,8 @@ def model_predictor(model_path, structure_features, quiet):
             print(*args, **kwargs)
 
     # Loading the model using joblib
-    model = joblib.load(model_path)
+    model = load_model(model_path)
     structure_features = structure_features.astype(float)
-    prediction = model.predict(structure_features.values)
+    prediction = predict(model, structure_features)
 
-    return prediction
\ No newline at end of file
+    return prediction
@@ -1,6 +1,86 @@
+import argparse
+import glob
+import os
+
 import joblib
+import numpy as np
 import xgboost as xgb
 
+# Number of threads of the boosters used by model_query (--xgb-threads); None = thread budget
+NTHREAD = None
+
+# Extension of boosters saved in XGBoost's native (UBJSON) format
+NATIVE_EXTENSION = '.ubj'
+
+def native_path(model_path):
+    """Path of the native booster file belonging to a *.joblib model."""
+    return os.path.splitext(model_path)[0] + NATIVE_EXTENSION
+
+def set_nthread(nthread):
+    """Sets the number of threads of the boosters used by model_query (None = thread budget)."""
+    global NTHREAD
+    NTHREAD = nthread
+
+def with_nthread(model, nthread):
+    """
+    Returns a copy of *model* that predicts with *nthread* threads. The
+    copies are cached per thread count (model_query.get_model()), so a
+    booster shared between threads is never reconfigured while in use.
+    """
+    model = model.copy()
+    model.set_param({'nthread': nthread})
+    return model
+
+def load_model(model_path, input_dim=None):
+    """
+    Loads a saved XGBoost model as a Booster. If a native booster file
+    (see save_native()) newer than the joblib file exists, it is loaded
+    instead, which avoids unpickling. *input_dim* is accepted only to keep
+    the signature shared with the neural network loaders.
+    """
+    native_model_path = native_path(model_path)
+    if (native_model_path != model_path and os.path.exists(native_model_path)
+            and (not os.path.exists(model_path)
+                 or os.path.getmtime(native_model_path) >= os.path.getmtime(model_path))):
+        return xgb.Booster(model_file=native_model_path)
+
+    model = joblib.load(model_path)
+    # Models saved through the scikit-learn wrapper are scored by their booster
+    if hasattr(model, 'get_booster'):
+        model = model.get_booster()
+    return model
+
+def save_native(model_path):
+    """
+    Saves the booster of a *.joblib model next to it in XGBoost's native
+    UBJSON format and returns the new path.
+    """
+    model = load_model(model_path)
+    output_path = native_path(model_path)
+    model.save_model(output_path)
+    return output_path
+
+def save_compiled(model, path_base, input_dim=None):
+    """Stores the booster for the compiled model bundle in the native UBJSON format."""
+    model.save_model(path_base + NATIVE_EXTENSION)
+    return path_base + NATIVE_EXTENSION
+
+def load_compiled(path, input_dim=None):
+    """Loads a booster stored by save_compiled()."""
+    return xgb.Booster(model_file=path)
+
+def predict(model, features):
+    """
+    Predicts values for a feature DataFrame (rows = molecules) and returns
+    a 1D NumPy array with one prediction per row.
+
+    The whole matrix is scored with a single inplace_predict() call, without
+    building a DMatrix, using the threads the booster was configured with
+    (see with_nthread()). The DataFrame is passed as-is so the feature names
+    are validated by the booster.
+    """
+    return np.asarray(model.inplace_predict(features.astype(float)), dtype=float).ravel()
+
 def model_predictor(model_path, structure_features, quiet):
 
     # Definiowanie funkcji kontrolującej drukowanie
@@ -9,9 +89,30 @@ def model_predictor(model_path, structure_features, quiet):
             print(*args, **kwargs)
 
     # Loading the model using joblib
-    model = joblib.load(model_path)
+    model = load_model(model_path)
     structure_features = structure_features.astype(float)
-    dmatrix_features = xgb.DMatrix(structure_features)
-    prediction = model.predict(dmatrix_features)
+    prediction = predict(model, structure_features)
 
     return prediction
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts the *_xgb.joblib models to XGBoost's native UBJSON format (*_xgb.ubj). "
+                    "load_model() then reads the native files, which is faster than unpickling.")
+    parser.add_argument(
+        "models_dir",
+        nargs='?',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "joblib_models"),
+        help="Directory with the *_xgb.joblib models (default: joblib_models next to this script)."
+    )
+    args = parser.parse_args()
+
+    model_paths = sorted(glob.glob(os.path.join(args.models_dir, '*_xgb.joblib')))
+    if not model_paths:
+        print(f"No *_xgb.joblib models found in {args.models_dir}.")
+        return
+    for model_path in model_paths:
+        print(f"Saved {save_native(model_path)}")
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,10 @@ import os
 import csv
 import numpy as np
 
+from run_journal import PART_SUFFIX, count_lines, publish, remove_partial
 
-def bucket(directory, predictor, quiet=False):
+
+def bucket(directory, predictor, quiet=False, work_dir=None, resume=False, trace=None):
     """
     Function to bucket NMR spectra data based on the type of predictor
     (1H or 13C).
@@ -13,6 +15,11 @@ def bucket(directory, predictor, quiet=False):
     Parameters:
     - directory: Directory containing input CSV files with spectra data.
     - predictor: Type of NMR predictor ('1H' or '13C').
+    - work_dir: Directory for the output folder (defaults to the current
+      working directory).
+    - resume: If True, complete bucketed spectra left by an interrupted run
+      are kept and only the missing ones are created.
+    - trace: MoleculeTrace receiving the time of every spectrum (--trace).
 
     Returns:
     - processed_dir: Directory path where bucketed spectra files are stored.
@@ -67,23 +74,34 @@ def bucket(directory, predictor, quiet=False):
             output_file_path = os.path.join(
                 output_dir, os.path.basename(file_path)
             )
-            with open(output_file_path, 'w') as out_f:
+            with open(output_file_path + PART_SUFFIX, 'w') as out_f:
                 for i in range(250):
                     out_f.write(f"{buckets[i]}\n")
+            publish(output_file_path + PART_SUFFIX)
 
             return error_values
 
     bucket_range, _ = create_buckets()
-    processed_dir = os.path.join(os.getcwd(), f'bucketed_{predictor}_spectra')
+    processed_dir = os.path.join(work_dir or os.getcwd(), f'bucketed_{predictor}_spectra')
     os.makedirs(processed_dir, exist_ok=True)
+    if resume:
+        remove_partial(processed_dir)
 
     success_count = 0
+    reused_count = 0
     error_files = {}
 
     for filename in os.listdir(directory):
         if filename.endswith('.csv'):
+            if resume and count_lines(os.path.join(processed_dir, filename)) == 250:
+                reused_count += 1
+                continue
             file_path = os.path.join(directory, filename)
+            start = trace.timer() if trace is not None else None
             error_values = process_file(file_path, processed_dir, bucket_range)
+            if start is not None:
+                trace.add_since(f'bucket:{predictor}', filename[:-len('.csv')], start,
+                                f"{len(error_values)} values out of range" if error_values else '')
 
             if error_values:
                 error_files[filename] = error_values
@@ -91,6 +109,8 @@ def bucket(directory, predictor, quiet=False):
                 success_count += 1
 
     verbose_print(f"\nSuccessfully created {success_count} files as pseudo spectra by BUCKETING.")
+    if reused_count:
+        verbose_print(f"Reused {reused_count} bucketed spectra of the interrupted run.")
     if error_files:
         print(f"{COLORS[1]}Files with errors: {len(error_files)}{RESET}")
         for fname, errors in error_files.items():
@@ -0,0 +1,154 @@
+# charts.py
+
+"""
+Summary charts of a prediction run (--chart).
+
+Up to CHART_DETAIL_LIMIT molecules, every molecule is drawn as a point
+with its StdDev as error bar and its name on the x axis. Larger result
+sets switch to aggregated views whose rendering time does not depend on
+the number of molecule labels: a hexbin density of Average vs StdDev per
+property with the TOP_K_OUTLIERS least certain molecules labelled, and the
+distribution of the Average values per property.
+
+Charts are rendered off-screen with the Agg backend. The image viewer is
+started without waiting for it, and not at all on headless systems.
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from profiler import timed_import
+
+# Largest number of molecules drawn individually
+CHART_DETAIL_LIMIT = 100
+
+# Molecules with the highest StdDev labelled in the aggregated chart
+TOP_K_OUTLIERS = 10
+
+# Colors of the three properties
+COLORS = ['red', 'green', 'blue']
+
+PREDICTOR_TITLES = {'1H': '¹H', '13C': '¹³C', 'hybrid': '¹H and ¹³C', 'FP': 'RDKit Fingerprints'}
+
+
+def _pyplot():
+    matplotlib = timed_import('matplotlib')
+    # Off-screen rendering; never opens a window or needs a display
+    matplotlib.use('Agg')
+    return timed_import('matplotlib.pyplot')
+
+
+def plot_detailed(summary_results, properties, plt):
+    """One point with error bar per molecule and property."""
+    fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+    fig.subplots_adjust(wspace=0.2)
+
+    for ax, prop, color in zip(axes, properties, COLORS):
+        # Get the data for the property in question
+        x = summary_results['MOLECULE_NAME']
+        y = summary_results[(prop, 'Average')]
+        yerr = summary_results[(prop, 'StdDev')]
+
+        # Spot chart with “whiskers” of error
+        ax.errorbar(x, y, yerr=yerr, fmt='o', capsize=5, color=color, ecolor='black')
+        ax.set_title(prop, fontweight='bold')
+        ax.set_xlabel('Molecule name/ID', fontweight='bold')
+        ax.set_ylabel('Average logD values', fontweight='bold')
+
+        # Y-axis number format settings
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.1f}'))
+
+        # Rotate the X-axis labels, if necessary.
+        ax.tick_params(axis='x', rotation=90)
+    return fig
+
+
+def plot_aggregated(summary_results, properties, plt, top_k=TOP_K_OUTLIERS):
+    """Average vs StdDev density with labelled outliers and Average distributions."""
+    fig, axes = plt.subplots(2, 3, figsize=(18, 11))
+    names = summary_results['MOLECULE_NAME'].astype(str).to_numpy()
+
+    for column, (prop, color) in enumerate(zip(properties, COLORS)):
+        average = summary_results[(prop, 'Average')].to_numpy(dtype=float)
+        std = summary_results[(prop, 'StdDev')].to_numpy(dtype=float)
+        valid = ~(np.isnan(average) | np.isnan(std))
+
+        ax = axes[0, column]
+        if valid.any():
+            hexbin = ax.hexbin(average[valid], std[valid], gridsize=40, mincnt=1, bins='log', cmap='viridis')
+            fig.colorbar(hexbin, ax=ax, label='Molecules (log)')
+
+            # Label the least certain predictions
+            candidates = np.flatnonzero(valid)
+            outliers = candidates[np.argsort(-std[candidates], kind='stable')[:top_k]]
+            ax.scatter(average[outliers], std[outliers], s=18, facecolors='none', edgecolors=color)
+            for i in outliers:
+                ax.annotate(names[i], (average[i], std[i]), fontsize=7, xytext=(3, 3), textcoords='offset points')
+        ax.set_title(prop, fontweight='bold')
+        ax.set_xlabel('Average logD value', fontweight='bold')
+        ax.set_ylabel('StdDev of the models', fontweight='bold')
+
+        ax = axes[1, column]
+        ax.hist(average[valid], bins=50, color=color, alpha=0.7)
+        ax.set_xlabel('Average logD value', fontweight='bold')
+        ax.set_ylabel('Molecules', fontweight='bold')
+    return fig
+
+
+def save_chart(summary_results, properties, predictor, output_dir, limit=CHART_DETAIL_LIMIT):
+    """
+    Draws the summary chart and saves it as summary_results_plot.png.
+
+    Parameters:
+    - summary_results (pd.DataFrame): Summary table with the
+      ('MOLECULE_NAME', '') and (<property>, 'Average' / 'StdDev') columns.
+    - properties (list): The three properties to draw.
+    - predictor (str): Representation, used in the title.
+    - output_dir (str): Directory of the image.
+    - limit (int): Above this number of molecules the aggregated chart is drawn.
+
+    Returns:
+    - chart_file_path (str): Path of the saved image.
+    """
+    plt = _pyplot()
+    detailed = len(summary_results) <= limit
+    if detailed:
+        fig = plot_detailed(summary_results, properties, plt)
+    else:
+        fig = plot_aggregated(summary_results, properties, plt)
+
+    title = f"Average logD values from {PREDICTOR_TITLES.get(predictor, predictor)} representation Predictor"
+    if not detailed:
+        title += f" ({len(summary_results)} molecules)"
+    fig.suptitle(title, fontweight='bold', fontsize=16)
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
+
+    # Save the chart
+    chart_file_path = os.path.join(output_dir, 'summary_results_plot.png')
+    fig.savefig(chart_file_path)
+    plt.close(fig)
+    return chart_file_path
+
+
+def open_image(path):
+    """
+    Opens *path* in the default image viewer without waiting for it.
+    Returns False if no viewer can be used (e.g. on a headless system).
+    """
+    if sys.platform.startswith('win'):
+        os.startfile(path)
+        return True
+    if sys.platform.startswith('darwin'):
+        command = ['open', path]
+    elif sys.platform.startswith('linux'):
+        if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+            return False
+        command = ['xdg-open', path]
+    else:
+        return False
+    subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+    return True
@@ -2,13 +2,15 @@ import os
 import pandas as pd
 from pathlib import Path
 
-def concatenate(datasets, quiet=False):
+def concatenate(datasets, quiet=False, work_dir=None):
     """
     Combine 1H and 13C DataFrames by concatenation and save the result to a CSV.
 
     Parameters:
         datasets (list): List of two DataFrames [1H, 13C].
         quiet (bool): If True, suppresses output.
+        work_dir (str): Directory for the output folder (defaults to the
+            current working directory).
 
     Returns:
         str: Path to the folder containing the concatenated file.
@@ -45,7 +47,7 @@ def concatenate(datasets, quiet=False):
         raise ValueError("Expected exactly two datasets: [1H, 13C].")
 
     df_1h, df_13c = datasets
-    concat_dir = Path(os.getcwd()) / "hybrid_generated_ML_querries"
+    concat_dir = Path(work_dir or os.getcwd()) / "hybrid_generated_ML_querries"
     concat_dir.mkdir(parents=True, exist_ok=True)
 
     combined = concat_features(df_1h, df_13c)
@@ -2,13 +2,16 @@ import pandas as pd
 import csv
 import os
 
-def verify_csv(file_path, quiet=False):
+def verify_csv(file_path, quiet=False, work_dir=None):
     """
     Function to verify and modify a CSV file by handling separators, decimal
     points, and column structure. Additionally, it cleans up the first column
     (e.g., molecule names) by removing problematic characters.
     
     If any rows are malformed (i.e., column count mismatch), they are reported.
+
+    The verified file (<name>_verified.csv) is saved in *work_dir*, or next
+    to the input file if no work_dir is given.
     """
     # Defining the function that controls printing
     def verbose_print(*args, **kwargs):
@@ -109,6 +112,8 @@ def verify_csv(file_path, quiet=False):
             verbose_print(f"\nReduced to {df.shape[1]} columns.")
 
         verified_file_path = file_path.replace('.csv', '_verified.csv')
+        if work_dir is not None:
+            verified_file_path = os.path.join(work_dir, os.path.basename(verified_file_path))
         if separator == ';':
             df.to_csv(verified_file_path, index=False, sep=',')
         else:
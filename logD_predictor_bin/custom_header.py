@@ -3,7 +3,7 @@
 import os
 import pandas as pd
 
-def custom_header(output_path, csv_path, predictor, quiet=False):
+def custom_header(output_path, csv_path, predictor, quiet=False, work_dir=None):
     """
     Adds custom headers to the provided DataFrame based on the number of
     columns and saves it as a new CSV file.
@@ -14,6 +14,8 @@ def custom_header(output_path, csv_path, predictor, quiet=False):
     - csv_path (str): The path to the CSV file used to generate the new
       filename.
     - predictor (str): Type of NMR predictor.
+    - work_dir (str): Directory for the output folder (defaults to the
+      current working directory).
 
     Returns:
     - None
@@ -47,7 +49,7 @@ def custom_header(output_path, csv_path, predictor, quiet=False):
             print(f"{COLORS[1]}Error: Headers count ({len(header_list)}) does not match {RESET}"
                   f"{COLORS[1]}columns count ({len(merged.columns)}).{RESET}")
             
-        final_dir = os.path.join(os.getcwd(), f'{predictor}_generated_ML_querries')
+        final_dir = os.path.join(work_dir or os.getcwd(), f'{predictor}_generated_ML_querries')
         os.makedirs(final_dir, exist_ok=True)
 
         file_name = os.path.basename(csv_path).rsplit('.', 1)[0].rsplit('_', 1)[0]
@@ -14,7 +14,7 @@ COLORS = ['\033[38;5;46m',    # Green
 RESET = '\033[0m'
 
 
-def fp_generator(csv_path, quiet=False):
+def fp_generator(csv_path, quiet=False, work_dir=None):
     """
     Generates .csv files containing fingerprints from SMILES strings provided in a CSV file.
 
@@ -23,6 +23,7 @@ def fp_generator(csv_path, quiet=False):
 
     Parameters:
     - csv_path (str): Path to the input CSV file containing 'MOLECULE_NAME' and 'SMILES' columns.
+    - work_dir (str): Directory for the 'fp' folder (defaults to the current working directory).
 
     Returns:
     - fp_directory (str): Path to the directory where generated fingerprint CSV files are stored.
@@ -32,7 +33,7 @@ def fp_generator(csv_path, quiet=False):
         if not quiet:
             print(*args, **kwargs)
 
-    fp_directory = os.path.join(os.getcwd(), "fp")
+    fp_directory = os.path.join(work_dir or os.getcwd(), "fp")
 
     if not os.path.exists(fp_directory):
         os.makedirs(fp_directory)
@@ -53,7 +54,7 @@ def fp_generator(csv_path, quiet=False):
         file_count = 0        # Counter for successfully generated fingerprint files
         error_file_count = 0  # Counter for fingerprint files with errors
 
-        print("\nGenerating fingerprint files ...\n")
+        verbose_print("\nGenerating fingerprint files ...\n")
 
         total_files = len(data)
         last_update = 0  # Last progress percentage update
@@ -94,7 +95,7 @@ def fp_generator(csv_path, quiet=False):
 
             # Update progress bar if progress increased by at least 1%
             progress = (index / total_files) * 100
-            if progress - last_update >= 1 or index == total_files:
+            if not quiet and (progress - last_update >= 1 or index == total_files):
                 print_progress(index, total_files)
                 last_update = progress
 
@@ -15,6 +15,10 @@ Pipeline
 5.  Write a V3000 MOL file (2 D coordinates, no stereo wedges).
 6.  Log errors to *mol_creation_error.log* and all fall-backs/
     warnings to *mol_creation_warning.log*.
+    • ETKDG and OpenBabel get *MOLECULE_TIMEOUT* seconds per molecule;
+      molecules that exceed it are logged as errors and skipped.
+    • Molecules are built in worker processes; a worker still busy
+      *KILL_GRACE* seconds after both limits is killed and replaced.
 
 Notes
 -----
@@ -25,16 +29,24 @@ Notes
 
 from __future__ import annotations
 
+import multiprocessing
 import os
 import subprocess
 import sys
 import tempfile
+import time
+from multiprocessing.connection import wait as wait_connections
 from typing import List, Tuple
 
 import pandas as pd
 from rdkit import Chem, RDLogger
 from rdkit.Chem import AllChem, rdCoordGen
 
+import thread_budget
+from run_journal import PART_SUFFIX, is_complete_mol, publish, remove_partial
+from molecule_trace import MoleculeTrace
+from scheduler import CostModel, longest_first, smiles_descriptors
+
 # Silence all RDKit log output (optional but recommended)
 RDLogger.DisableLog("rdApp.*")
 
@@ -49,6 +61,11 @@ ANSI_RESET = "\033[0m"
 PROGRESS_BAR_LEN = 25
 MAX_ETKDG_RETRIES = 3
 EMBED_RANDOM_SEED = 42
+MOLECULE_TIMEOUT = 120    # seconds per molecule for ETKDG and OpenBabel (0 = no limit)
+KILL_GRACE = 10           # seconds past both limits before a molecule's worker is killed
+
+# Stage name of the MOL generation timings in the cost model (scheduler.py)
+COST_STAGE = "generate_mol_files"
 
 
 # ──────────────────────────────────────────────────────────────
@@ -58,14 +75,19 @@ def safe_embed_molecule(
     mol: Chem.Mol,
     max_retries: int = MAX_ETKDG_RETRIES,
     seed: int = EMBED_RANDOM_SEED,
+    timeout: float = MOLECULE_TIMEOUT,
 ) -> Tuple[Chem.Mol | None, str | None]:
     """
     Try ETKDG embedding up to *max_retries* times, fall back to CoordGen.
 
+    An embedding that runs into *timeout* seconds is not retried; the
+    molecule is rejected instead.
+
     Returns
     -------
     mol
-        RDKit molecule with at least one conformer, or None on hard fail.
+        RDKit molecule with at least one conformer, or None on hard fail
+        or timeout.
     warning
         None on ETKDG success, otherwise a human-readable note.
     """
@@ -81,11 +103,16 @@ def safe_embed_molecule(
     # Set only attributes guaranteed to exist across versions
     params.randomSeed = seed
     # DO NOT set params.maxAttempts – not present in some RDKit builds
+    if timeout and hasattr(params, "timeout"):
+        params.timeout = int(max(1, timeout))  # older builds have no time limit
 
+    start = time.perf_counter()
     for _ in range(max_retries):
         mol.RemoveAllConformers()
         if AllChem.EmbedMolecule(mol, params) == 0:
             return mol, None  # ETKDG success
+        if timeout and time.perf_counter() - start >= timeout:
+            return None, f"ETKDG timed out after {timeout:g} s"
 
     # Fallback to 2D coords if 3D embedding failed
     try:
@@ -103,9 +130,13 @@ def has_hypervalent_sulphur(mol: Chem.Mol) -> bool:
     )
 
 
-def openbabel_fallback(rdkit_mol: Chem.Mol, out_path: str) -> Tuple[bool, str | None]:
+def openbabel_fallback(
+    rdkit_mol: Chem.Mol, out_path: str, timeout: float = MOLECULE_TIMEOUT
+) -> Tuple[bool, str | None]:
     """
-    Run *obabel* -d --gen2D on *rdkit_mol*; write to *out_path*.
+    Run *obabel* -d --gen2D on *rdkit_mol*; write to *out_path* (always in
+    MOL format, whatever its extension). *obabel* is killed after *timeout*
+    seconds.
 
     Returns *(success, error_message)*.
     """
@@ -113,19 +144,22 @@ def openbabel_fallback(rdkit_mol: Chem.Mol, out_path: str) -> Tuple[bool, str |
         tmp.write(Chem.MolToMolBlock(rdkit_mol, forceV3000=True).encode())
         tmp_path = tmp.name
 
-    cmd = ["obabel", tmp_path, "-O", out_path, "-d", "--gen2D"]
+    cmd = ["obabel", tmp_path, "-omol", "-O", out_path, "-d", "--gen2D"]
     try:
         subprocess.run(
             cmd,
             check=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            timeout=timeout or None,
         )
-        os.remove(tmp_path)
         return True, None
     except subprocess.CalledProcessError as exc:
-        os.remove(tmp_path)
         return False, exc.stderr.decode().strip()
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {timeout:g} s"
+    finally:
+        os.remove(tmp_path)
 
 
 def canonical_smiles(smiles: str) -> str:
@@ -192,10 +226,216 @@ def is_dot_smiles(smiles: str) -> bool:
     """True if SMILES contains disconnected fragments (“dot-SMILES”)."""
     return "." in smiles
 
+
+# ──────────────────────────────────────────────────────────────
+# One molecule
+# ──────────────────────────────────────────────────────────────
+def build_mol_file(
+    name: str, raw_smiles: str, output_dir: str, timeout: float = MOLECULE_TIMEOUT
+) -> Tuple[str | None, List[str], float, str]:
+    """
+    Write ``<output_dir>/<name>.mol`` for one molecule, giving ETKDG and
+    OpenBabel *timeout* seconds each.
+
+    Returns
+    -------
+    error
+        None on success, otherwise the entry for the error log.
+    warnings
+        Entries for the warning log.
+    seconds
+        Wall time spent on the molecule.
+    route
+        How the MOL file was written: "RDKit", "OpenBabel (<reasons>)" or
+        "error" (for the --trace report).
+    """
+    start = time.perf_counter()
+    warnings: List[str] = []
+    route = "RDKit"
+    try:
+        smiles = canonical_smiles(raw_smiles)
+        mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+
+        # ── RDKit embedding ───────────────────────────────────────────
+        mol, warn_msg = safe_embed_molecule(mol, timeout=timeout)
+        if mol is None:
+            raise ValueError(warn_msg)
+        if warn_msg:
+            warnings.append(f"{name}: {warn_msg}")
+
+        # ---------- Decide if this molecule must go through OpenBabel -------------
+        force_babel = False
+        reason_list: List[str] = []
+
+        if needs_openbabel(mol):
+            force_babel = True
+            reason_list.append("exotic atom / metal / radical / size")
+
+        if is_dot_smiles(smiles):
+            force_babel = True
+            reason_list.append("dot-SMILES (disconnected fragments)")
+
+        if warn_msg:          # ETKDG failed earlier → CoordGen only
+            force_babel = True
+            reason_list.append("ETKDG failure")
+
+        if force_babel:
+            warnings.append(f"{name}: OpenBabel fallback → {', '.join(reason_list)}")
+            route = f"OpenBabel ({', '.join(reason_list)})"
+
+        # ── Basic 3D sanity check ───────────────────────────────────
+        conf = mol.GetConformer()
+        if all(conf.GetAtomPosition(i).Length() < 0.1 for i in range(mol.GetNumAtoms())):
+            raise ValueError("All atoms at origin (invalid 3D)")
+
+        # ── Flatten copy to 2D; strip wedge bonds ───────────────────
+        mol2d = Chem.Mol(mol)
+        AllChem.Compute2DCoords(mol2d)
+        Chem.RemoveStereochemistry(mol2d)
+
+        out_path = os.path.join(output_dir, f"{name}.mol")
+        part_path = out_path + PART_SUFFIX
+
+        # ── Write via RDKit or OpenBabel ─────────────────────────────
+        # (renamed to *.mol only when complete, so an interrupted run
+        # never leaves a truncated MOL file)
+        if not force_babel:
+            with open(part_path, "w", encoding="utf-8") as handle:
+                handle.write(Chem.MolToMolBlock(mol2d, forceV3000=True))
+        else:
+            success, ob_error = openbabel_fallback(mol2d, part_path, timeout)
+            if not success:
+                raise ValueError(f"OpenBabel fallback failed: {ob_error}")
+        publish(part_path, out_path)
+
+    except Exception as exc:  # pylint: disable=broad-except
+        return (
+            f"Molecule: {name}\nSMILES: {raw_smiles}\nError: {exc}\n",
+            warnings,
+            time.perf_counter() - start,
+            "error",
+        )
+    return None, warnings, time.perf_counter() - start, route
+
+
 # ──────────────────────────────────────────────────────────────
 # Main routine
 # ──────────────────────────────────────────────────────────────
-def generate_mol_files(csv_path: str, strict_mode: bool = True) -> str:
+def _molecule_worker(connection, output_dir, timeout, threads):
+    """
+    Worker process: answers every (index, name, SMILES) task on *connection*
+    with build_mol_file(), using at most *threads* OpenMP/BLAS threads.
+    """
+    RDLogger.DisableLog("rdApp.*")
+    for name in thread_budget.THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    with thread_budget.limit_threads(threads):
+        while True:
+            task = connection.recv()
+            if task is None:
+                return
+            index, name, smiles = task
+            connection.send((index, build_mol_file(name, smiles, output_dir, timeout)))
+
+
+def _start_worker(output_dir, timeout, threads):
+    """Starts a _molecule_worker() process and returns (connection, process)."""
+    connection, worker_end = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_molecule_worker, args=(worker_end, output_dir, timeout, threads),
+                                      daemon=True)
+    process.start()
+    worker_end.close()
+    return connection, process
+
+
+def _stop_worker(connection, process, kill=False):
+    if kill:
+        process.kill()
+    else:
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+    process.join()
+    connection.close()
+
+
+def _run_molecules(order, names, smiles_list, output_dir, workers, timeout):
+    """
+    Yields (index, build_mol_file() result) of the molecules in *order* as they finish.
+
+    With a *timeout*, every molecule is built in a worker process. ETKDG and
+    OpenBabel get *timeout* seconds each, and a worker that is still busy
+    KILL_GRACE seconds after both (e.g. stuck inside EmbedMolecule) is
+    killed and replaced; its molecule is reported as an error, like a
+    molecule whose worker crashed.
+    """
+    if workers <= 1 and not timeout:
+        for i in order:
+            yield i, build_mol_file(names[i], smiles_list[i], output_dir, timeout)
+        return
+
+    # The workers share the thread budget (--threads / --cpu-budget)
+    threads = thread_budget.share(thread_budget.budget(), workers)
+    limit = 2 * timeout + KILL_GRACE if timeout else None
+    pending = list(reversed(order))
+    idle = [_start_worker(output_dir, timeout, threads) for _ in range(min(max(1, workers), len(order)))]
+    busy = {}  # connection -> (process, index, start time)
+
+    def failed(i, reason, started):
+        # A killed worker may leave an unfinished MOL file behind
+        part_path = os.path.join(output_dir, f"{names[i]}.mol") + PART_SUFFIX
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        error = f"Molecule: {names[i]}\nSMILES: {smiles_list[i]}\nError: {reason}\n"
+        return i, (error, [], time.perf_counter() - started, "error")
+
+    try:
+        while pending or busy:
+            while idle and pending:
+                connection, process = idle.pop()
+                i = pending.pop()
+                connection.send((i, names[i], smiles_list[i]))
+                busy[connection] = (process, i, time.perf_counter())
+
+            wait_time = None
+            if limit:
+                deadline = min(started for _, _, started in busy.values()) + limit
+                wait_time = max(0.0, deadline - time.perf_counter())
+            for connection in wait_connections(list(busy), timeout=wait_time):
+                process, i, started = busy.pop(connection)
+                try:
+                    index, result = connection.recv()
+                except (EOFError, OSError):
+                    _stop_worker(connection, process, kill=True)
+                    yield failed(i, f"worker process exited with status {process.exitcode}", started)
+                    if pending:
+                        idle.append(_start_worker(output_dir, timeout, threads))
+                    continue
+                idle.append((connection, process))
+                yield index, result
+
+            if limit:
+                now = time.perf_counter()
+                for connection in [c for c, (_, _, started) in busy.items() if now - started > limit]:
+                    process, i, started = busy.pop(connection)
+                    _stop_worker(connection, process, kill=True)
+                    yield failed(i, f"killed after {limit:g} s", started)
+                    if pending:
+                        idle.append(_start_worker(output_dir, timeout, threads))
+    finally:
+        for connection, process in idle:
+            _stop_worker(connection, process)
+        for connection, (process, _, _) in busy.items():
+            _stop_worker(connection, process, kill=True)
+
+
+def generate_mol_files(
+    csv_path: str, strict_mode: bool = True, work_dir: str | None = None,
+    resume: bool = False, workers: int = 1, cost_model: CostModel | None = None,
+    timeout: float = MOLECULE_TIMEOUT, trace: MoleculeTrace | None = None,
+    quiet: bool = False
+) -> str:
     """
     Convert SMILES in *csv_path* to flat MOL files.
 
@@ -205,13 +445,43 @@ def generate_mol_files(csv_path: str, strict_mode: bool = True) -> str:
         CSV with columns ``MOLECULE_NAME`` and ``SMILES``.
     strict_mode
         If *True*, reject molecules whose 3D coords all sit at (0, 0, 0).
+    work_dir
+        Directory for the ``mols`` folder and the log files
+        (defaults to the current working directory).
+    resume
+        If *True*, complete MOL files left in the ``mols`` folder by an
+        interrupted run are kept and only the missing molecules are
+        generated (see run_journal.py).
+    workers
+        Number of worker processes. With more than one, the molecules are
+        submitted longest-first by estimated cost (see scheduler.py).
+        With a *timeout*, even a single worker runs in its own process,
+        so that a molecule exceeding the limit can be killed. The workers
+        are capped by the thread budget (thread_budget.py) and share it.
+    cost_model
+        Cost model used for the order; the measured time of every
+        molecule is added to it.
+    timeout
+        Time limit (seconds) of ETKDG and OpenBabel per molecule; molecules
+        that exceed it are written to the error log (0 = no limit). A
+        worker still busy KILL_GRACE seconds after both limits is killed.
+    trace
+        Per-molecule trace receiving the time and route of every molecule.
+    quiet
+        If *True*, nothing is printed (progress, summary); the log files
+        are still written.
 
     Returns
     -------
     str
         Output directory path.
     """
-    output_dir = os.path.join(os.getcwd(), "mols")
+    work_dir = work_dir or os.getcwd()
+    # Never more worker processes than threads in the budget
+    workers = max(1, min(workers, thread_budget.budget()))
+    output_dir = os.path.join(work_dir, "mols")
+    error_log = os.path.join(work_dir, "mol_creation_error.log")
+    warning_log = os.path.join(work_dir, "mol_creation_warning.log")
     os.makedirs(output_dir, exist_ok=True)
 
     errors: List[str] = []
@@ -220,89 +490,74 @@ def generate_mol_files(csv_path: str, strict_mode: bool = True) -> str:
     data = pd.read_csv(csv_path)
     data = data.drop_duplicates(subset="MOLECULE_NAME", keep="first")
 
+    reused_files = 0
+    if resume:
+        remove_partial(output_dir)
+        done = data["MOLECULE_NAME"].map(
+            lambda name: is_complete_mol(os.path.join(output_dir, f"{name}.mol"))
+        )
+        reused_files = int(done.sum())
+        data = data[~done]
+        if not quiet:
+            print(f"\nReusing {reused_files} complete MOL files of the interrupted run.")
+
     total = len(data)
-    last_update = 0
     saved_files = 0
+    names = data["MOLECULE_NAME"].tolist()
+    smiles_list = data["SMILES"].tolist()
+    results: List[Tuple[str | None, List[str], float, str] | None] = [None] * total
+
+    if not quiet:
+        print("\nGenerating *.mol files …\n")
+
+    # Cost estimates decide the order of the parallel work and, together
+    # with the measured times, refine the cost model
+    rows = None
+    if workers > 1 or cost_model is not None:
+        rows = [smiles_descriptors(smiles) for smiles in smiles_list]
+    if workers > 1:
+        costs = (cost_model or CostModel(path=None)).estimate(COST_STAGE, rows)
+        order = longest_first(costs.tolist())
+    else:
+        order = list(range(total))
 
-    print("\nGenerating *.mol files …\n")
+    last_update = 0
+    for done, (i, result) in enumerate(_run_molecules(order, names, smiles_list, output_dir, workers, timeout), start=1):
+        results[i] = result
+        # ── Progress bar update ─────────────────────────────────────────
+        progress = (done / total) * 100
+        if not quiet and done != total and progress - last_update >= 1:
+            print_progress(done, total)
+            last_update = progress
 
-    for idx, row in enumerate(data.itertuples(index=False), start=1):
-        name, raw_smiles = row.MOLECULE_NAME, row.SMILES
-        try:
-            smiles = canonical_smiles(raw_smiles)
-            mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
-
-            # ── RDKit embedding ───────────────────────────────────────────
-            mol, warn_msg = safe_embed_molecule(mol)
-            if mol is None:
-                raise ValueError(warn_msg)
-            if warn_msg:
-                warnings.append(f"{name}: {warn_msg}")
-
-            # ---------- Decide if this molecule must go through OpenBabel -------------
-            force_babel = False
-            reason_list: List[str] = []
-
-            if needs_openbabel(mol):
-                force_babel = True
-                reason_list.append("exotic atom / metal / radical / size")
-
-            if is_dot_smiles(smiles):
-                force_babel = True
-                reason_list.append("dot-SMILES (disconnected fragments)")
-
-            if warn_msg:          # ETKDG failed earlier → CoordGen only
-                force_babel = True
-                reason_list.append("ETKDG failure")
-
-            if force_babel:
-                warnings.append(f"{name}: OpenBabel fallback → {', '.join(reason_list)}")
-
-            # ── Basic 3D sanity check ───────────────────────────────────
-            conf = mol.GetConformer()
-            if all(conf.GetAtomPosition(i).Length() < 0.1 for i in range(mol.GetNumAtoms())):
-                raise ValueError("All atoms at origin (invalid 3D)")
-
-            # ── Flatten copy to 2D; strip wedge bonds ───────────────────
-            mol2d = Chem.Mol(mol)
-            AllChem.Compute2DCoords(mol2d)
-            Chem.RemoveStereochemistry(mol2d)
-
-            out_path = os.path.join(output_dir, f"{name}.mol")
-
-            # ── Write via RDKit or OpenBabel ─────────────────────────────
-            if not force_babel:
-                with open(out_path, "w", encoding="utf-8") as handle:
-                    handle.write(Chem.MolToMolBlock(mol2d, forceV3000=True))
-            else:
-                success, ob_error = openbabel_fallback(mol2d, out_path)
-                if not success:
-                    raise ValueError(f"OpenBabel fallback failed: {ob_error}")
+    if total and not quiet:
+        print_progress(total, total)
 
+    # Log entries in input order, whatever order the workers finished in
+    for error, mol_warnings, _, _ in results:
+        warnings.extend(mol_warnings)
+        if error is None:
             saved_files += 1
+        else:
+            errors.append(error)
 
-        except Exception as exc:  # pylint: disable=broad-except
-            errors.append(
-                f"Molecule: {name}\nSMILES: {raw_smiles}\nError: {exc}\n"
-            )
-
-        # ── Progress bar update ─────────────────────────────────────────
-        progress = (idx / total) * 100
-        if idx != total and progress - last_update >= 1:
-            print_progress(idx, total)
-            last_update = progress
-
-    print_progress(total, total)
+    if cost_model is not None and total:
+        cost_model.add_samples(COST_STAGE, rows, [seconds for _, _, seconds, _ in results])
+    if trace is not None:
+        for name, (error, _, seconds, route) in zip(names, results):
+            trace.add(COST_STAGE, name, seconds, route if error is None else error.rsplit("Error: ", 1)[-1].strip())
 
     # ── Write logs ─────────────────────────────────────────────────────
     if errors:
-        with open("mol_creation_error.log", "w", encoding="utf-8") as fh_err:
+        with open(error_log, "w", encoding="utf-8") as fh_err:
             fh_err.write("==== MOL CREATION ERRORS ====\n\n" + "\n".join(errors))
     if warnings:
-        with open("mol_creation_warning.log", "w", encoding="utf-8") as fh_warn:
+        with open(warning_log, "w", encoding="utf-8") as fh_warn:
             fh_warn.write("==== MOL CREATION WARNINGS ====\n\n" + "\n".join(warnings))
 
     # ── Summary to console ─────────────────────────────────────────────
+    if quiet:
+        return output_dir
     print(f"\n{ANSI_GREEN}Generated {saved_files} MOL files in '{output_dir}'.{ANSI_RESET}")
     print(f"{ANSI_GREEN}Failed to generate {len(errors)} MOL files.{ANSI_RESET}")
     if errors:
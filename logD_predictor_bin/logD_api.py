@@ -0,0 +1,230 @@
+# logD_api.py
+
+"""
+Importable, non-interactive interface to the logD prediction pipeline.
+
+The command line script (logD_predictor.py) redirects the console, prints
+banners and waits for ENTER. This module runs the same stages
+(gen_mols -> NMR prediction -> bucketing -> merging -> model_query) without
+any console side effects and returns the results as a DataFrame.
+
+Example:
+
+    import sys
+    sys.path.append("logD_predictor_bin")
+    from logD_api import LogDPredictor
+
+    predictor = LogDPredictor(representation="hybrid")
+    predictor.warmup()
+    results = predictor.predict(["CCO", "c1ccccc1O"])
+"""
+
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from nmr_backends import get_backend
+from bucket import bucket
+from merger import merger
+from custom_header import custom_header
+from concatenator import concatenate
+from model_query import (
+    ALGORITHM_MODULES,
+    DESIRED_PROPERTIES,
+    FEATURE_COUNTS,
+    MODELS_DIR,
+    get_model,
+    load_model_table,
+    predict_models,
+    summarize_predictions,
+)
+
+REPRESENTATIONS = list(FEATURE_COUNTS)
+
+
+class LogDPredictor:
+    """
+    Keeps the model zoo and the NMR backend warm between predictions.
+
+    Models are loaded on first use (or by warmup()) and reused by every
+    later call, and the Java BatchProcessor is compiled only once per
+    representation by the Java backend, so repeated calls cost only the
+    per-molecule work.
+
+    Parameters:
+    - representation (str): Default representation: '1H', '13C', 'FP' or
+      'hybrid'.
+    - algorithms (list): Default ML algorithms: any of 'SVR', 'XGB', 'DNN',
+      'CNN'.
+    - models_dir (str): Directory with <representation>_models_info.csv and
+      the model files.
+    - work_root (str): Parent directory for the per-call scratch folders
+      (defaults to the system temporary directory).
+    - keep_files (bool): If True, scratch folders are not deleted.
+    - nmr_backend (str): NMR spectrum prediction backend, 'java' or 'lookup'
+      (see nmr_backends.py).
+    - ensemble_workers (int): Models evaluated concurrently (default: one
+      per model, at most one per CPU; 1 = sequential).
+    """
+
+    def __init__(self, representation='hybrid', algorithms=('SVR', 'XGB', 'DNN', 'CNN'),
+                 models_dir=MODELS_DIR, work_root=None, keep_files=False, nmr_backend='java',
+                 ensemble_workers=None):
+        self.representation = self._check_representation(representation)
+        self.algorithms = self._check_algorithms(algorithms)
+        self.models_dir = models_dir
+        self.work_root = work_root
+        self.keep_files = keep_files
+        self.ensemble_workers = ensemble_workers
+        self._model_tables = {}
+        self.backend = get_backend(nmr_backend, silent=True)
+
+    @staticmethod
+    def _check_representation(representation):
+        if representation not in FEATURE_COUNTS:
+            raise ValueError(f"Unknown representation '{representation}'. "
+                             f"Choose one of: {', '.join(REPRESENTATIONS)}.")
+        return representation
+
+    @staticmethod
+    def _check_algorithms(algorithms):
+        algorithms = list(algorithms)
+        unknown = [a for a in algorithms if a not in ALGORITHM_MODULES]
+        if unknown or not algorithms:
+            raise ValueError(f"Unknown or empty algorithm selection {algorithms}. "
+                             f"Choose from: {', '.join(ALGORITHM_MODULES)}.")
+        return algorithms
+
+    def model_table(self, representation=None, algorithms=None):
+        """
+        Returns the rows of <representation>_models_info.csv for the
+        selected algorithms. The table is read from disk only once per
+        representation and algorithm selection.
+        """
+        representation = self._check_representation(representation or self.representation)
+        algorithms = self._check_algorithms(algorithms or self.algorithms)
+
+        key = (representation, tuple(algorithms))
+        if key not in self._model_tables:
+            model_table_path = os.path.join(self.models_dir, f"{representation}_models_info.csv")
+            if not os.path.exists(model_table_path):
+                raise FileNotFoundError(f"File {model_table_path} does not exist. "
+                                        f"Add relevant model files and data.")
+            model_table_df = load_model_table(representation, self.models_dir, algorithms)
+            self._model_tables[key] = model_table_df[model_table_df['ML_algorithm'].isin(algorithms)]
+
+        model_table_df = self._model_tables[key]
+        if model_table_df.empty:
+            raise ValueError(f"No {representation} models available for {algorithms}.")
+        return model_table_df
+
+    def warmup(self, representation=None, algorithms=None):
+        """
+        Loads all selected models into memory so the first predict() call
+        does not pay for deserialisation.
+        """
+        representation = representation or self.representation
+        model_table_df = self.model_table(representation, algorithms)
+        for _, row in model_table_df.iterrows():
+            model_path = os.path.join(self.models_dir, row['model_path'])
+            get_model(row['ML_algorithm'], model_path, FEATURE_COUNTS[representation])
+        return self
+
+    def predict(self, smiles_list, names=None, representation=None, algorithms=None,
+                return_models=False):
+        """
+        Predicts logD values for a list of SMILES strings.
+
+        Parameters:
+        - smiles_list (list): SMILES strings.
+        - names (list): Optional molecule names, one per SMILES. Defaults to
+          the position in *smiles_list*.
+        - representation (str): Overrides the default representation.
+        - algorithms (list): Overrides the default ML algorithms.
+        - return_models (bool): If True, the per-model predictions are
+          appended to the result.
+
+        Returns:
+        - results (pd.DataFrame): One row per input SMILES, in input order,
+          with MOLECULE_NAME, SMILES and '<property>_Average' /
+          '<property>_StdDev' columns. Molecules that could not be processed
+          have NaN values.
+        """
+        representation = self._check_representation(representation or self.representation)
+        model_table_df = self.model_table(representation, algorithms)
+
+        smiles_list = list(smiles_list)
+        if names is None:
+            names = list(range(len(smiles_list)))
+        elif len(names) != len(smiles_list):
+            raise ValueError("'names' must have the same length as 'smiles_list'.")
+
+        # Internal identifiers are safe to use as file names
+        ids = [f"MOL_{i:07d}" for i in range(len(smiles_list))]
+        results = pd.DataFrame({'MOLECULE_NAME': list(names), 'SMILES': smiles_list}, index=ids)
+        if not smiles_list:
+            return results.reset_index(drop=True)
+
+        # The stages run quietly; the process-wide console is left alone, so
+        # other threads (e.g. of logD_server.py) keep their output
+        work_dir = tempfile.mkdtemp(prefix='logD_', dir=self.work_root)
+        try:
+            csv_path = os.path.join(work_dir, 'input.csv')
+            pd.DataFrame({'MOLECULE_NAME': ids, 'SMILES': smiles_list}).to_csv(csv_path, index=False)
+            dataset = self._features(csv_path, representation, work_dir)
+        finally:
+            if not self.keep_files:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        features = dataset.set_index('MOLECULE_NAME')
+        features.index = features.index.astype(str)
+        predictions = predict_models(features, model_table_df, self.models_dir, self.ensemble_workers)
+        summary = summarize_predictions(predictions, model_table_df)
+
+        summary_columns = [f'{prop}_{stat}' for prop in DESIRED_PROPERTIES
+                           for stat in ('Average', 'StdDev') if f'{prop}_{stat}' in summary.columns]
+        results = results.join(summary[summary_columns])
+        if return_models:
+            results = results.join(predictions)
+        return results.reset_index(drop=True)
+
+    def _features(self, csv_path, representation, work_dir):
+        """
+        Runs the feature generation stages and returns the ML query dataset
+        (MOLECULE_NAME + FEATURE_* columns).
+        """
+        # RDKit is only imported by the stages that need it
+        if representation == 'FP':
+            from fp_generator import fp_generator
+            processed_dir = fp_generator(csv_path, True, work_dir)
+            return self._dataset(processed_dir, csv_path, 'FP', work_dir)
+
+        from gen_mols import generate_mol_files
+        mol_directory = generate_mol_files(csv_path, True, work_dir, quiet=True)
+        sub_predictors = ['1H', '13C'] if representation == 'hybrid' else [representation]
+
+        datasets = []
+        for sub_predictor in sub_predictors:
+            csv_output_folder = self.backend.predict(mol_directory, sub_predictor, True, work_dir)
+            if csv_output_folder is None:
+                raise RuntimeError(f"{sub_predictor} NMR spectra prediction failed.")
+
+            processed_dir = bucket(csv_output_folder, sub_predictor, True, work_dir)
+            datasets.append(self._dataset(processed_dir, csv_path, sub_predictor, work_dir))
+
+        if representation == 'hybrid':
+            dataset, _ = concatenate(datasets, True, work_dir)
+            return dataset
+        return datasets[0]
+
+    @staticmethod
+    def _dataset(processed_dir, csv_path, predictor, work_dir):
+        output_path, _ = merger(processed_dir, csv_path, predictor, True, work_dir)
+        if output_path is None:
+            raise RuntimeError(f"Merging of the {predictor} files failed.")
+        dataset, _ = custom_header(output_path, csv_path, predictor, True, work_dir)
+        if dataset is None:
+            raise RuntimeError(f"Building the {predictor} ML query failed.")
+        return dataset
@@ -5,84 +5,105 @@ Script Name: logD_predictor.py
 Description: A script for predicting logD values using various machine learning models.
 """
 
+import time
+SCRIPT_START = time.perf_counter()
+
 import argparse
-import shutil
+import json
 import os
 import subprocess
-from art import text2art
-import re
 import sys
 
-# Import custom modules required for the script
-from csv_checker import verify_csv
-from gen_mols import generate_mol_files
-from predictor import run_java_batch_processor
-from bucket import bucket
-from merger import merger
-from custom_header import custom_header
-from model_query import query
-from fp_generator import fp_generator
-from concatenator import concatenate
-
-def strip_ansi_codes(s):
-    ansi_escape = re.compile(r'''
-        \x1B # ESC
-        (?:   # 7-bit C1 Fe (various sequences)
-            [@-Z\\-_]
-        | # or CSI [ - ].
-            \[
-            [0-?]* # Optional parameters.
-            [-/]* # Optional intermediate bytes.
-            [@-~] # Final byte
-        )
-    ''', re.VERBOSE)
-    return ansi_escape.sub('', s)
-
-# Import sys and define the Tee class
-class Tee(object):
-    def __init__(self, *files):
-        self.files = files
-
-    def write(self, obj):
-        for f in self.files:
-            # Check if the file is a terminal (stdout/stderr)
-            if hasattr(f, 'isatty') and f.isatty():
-                f.write(obj)
-            else:
-                # Remove ANSI codes before writing to file
-                f.write(strip_ansi_codes(obj))
-            f.flush()
-
-    def flush(self):
-        for f in self.files:
-            f.flush()
+# Import custom modules required for the script. The pipeline stages pull in
+# pandas, RDKit, torch, xgboost and matplotlib, so they are imported only
+# when the selected representation and models actually need them.
+import thread_budget
+from nmr_backends import BACKENDS, get_backend
+from charts import CHART_DETAIL_LIMIT
+from result_writer import OUTPUT_FORMATS
+from profiler import StageProfiler, count_molecules, startup_report, timed_import
+from molecule_trace import TOP_N, MoleculeTrace
+from run_log import LOG_FORMATS, LOG_LEVELS, LogStream, RunLog
+from run_journal import RunJournal, file_digest
+from workspace import SCRATCH_ROOT_ENV, Workspace
 
 def verbose_print(args, *messages):
     if not args.quiet:
         print(*messages)
 
-def main():
-    try:
-        # Clear the log file at the start of each run
-        with open('RUN_LOG_FILE.log', 'w', encoding='utf-8') as log_file:
-            log_file.write("")  # Pusty zapis, aby wyczyścić zawartość pliku
-
-        # ANSI color
-        COLORS = ['\033[38;5;46m',    # Green
-                '\033[38;5;196m',   # Red
-                '\033[38;5;214m'    # Orange
-                ]
-        RESET = '\033[0m'
-
-        # Open the log file in append mode
-        log_file = open('RUN_LOG_FILE.log', 'a', encoding='utf-8')
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
+def resumable_stage(journal, stage, key, run, resume=False):
+    """
+    Runs a pipeline stage and records it in the run journal (if the run is
+    checkpointed). When a run is resumed, a stage the journal lists as
+    completed is skipped and its output folder is reused.
+
+    Parameters:
+    - journal (RunJournal): Journal of the run, or None.
+    - stage (str): Name of the stage.
+    - key (str): Nucleus of the stage, or None.
+    - run (callable): Runs the stage and returns its output folder.
+    - resume (bool): If True, the run is a resumed one.
+
+    Returns:
+    - output (str): The output folder of the stage.
+    """
+    entry = journal.completed(stage, key) if journal is not None and resume else None
+    if entry is not None and os.path.isdir(entry['output']):
+        return entry['output']
+    output = run()
+    if journal is not None and output is not None:
+        journal.record(stage, key, output=output, files=len(os.listdir(output)))
+    return output
+
+def write_startup_report(args, COLORS, RESET):
+    """
+    Prints the import times of this run and saves them as
+    startup_<timestamp>.json next to the prediction results.
+    """
+    configuration = {
+        'predictor': args.predictor,
+        'nmr_backend': args.nmr_backend,
+        'use_svr': args.use_svr,
+        'use_xgb': args.use_xgb,
+        'use_dnn': args.use_dnn,
+        'use_cnn': args.use_cnn,
+        'chart': args.chart,
+    }
+    report = startup_report(SCRIPT_START, configuration)
+
+    print(f"\n{COLORS[2]}Startup report (deferred imports){RESET}")
+    for entry in report['imports']:
+        print(f"   {entry['module']:<22} {entry['seconds']:>8.3f} s")
+    print(f"   {'total':<22} {report['deferred_imports_s']:>8.3f} s")
+
+    output_dir = os.path.join(os.getcwd(), "Prediction_Results", f'{args.predictor}_logD_results')
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, f"startup_{report['timestamp']}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Startup report saved as {COLORS[2]}{report_path}{RESET}")
 
-    # Redirect sys.stdout and sys.stderr to the Tee instance
-    sys.stdout = Tee(sys.__stdout__, log_file)
-    sys.stderr = Tee(sys.__stderr__, log_file)
+def main():
+    profiler = StageProfiler(enabled=False)
+    trace = MoleculeTrace(enabled=False)
+    args = None
+    workspace = None
+    journal = None
+    completed = False  # Set when the whole pipeline has run
+    # ANSI color
+    COLORS = ['\033[38;5;46m',    # Green
+            '\033[38;5;196m',   # Red
+            '\033[38;5;214m'    # Orange
+            ]
+    RESET = '\033[0m'
+
+    # The log file is truncated at the start of each run and written by a
+    # background thread
+    run_log = RunLog('RUN_LOG_FILE.log')
+
+    # Redirect sys.stdout and sys.stderr to the run log
+    sys.stdout = LogStream(sys.__stdout__, run_log, 'INFO')
+    sys.stderr = LogStream(sys.__stderr__, run_log, 'WARNING')
 
     try:
 
@@ -144,6 +165,39 @@ def main():
             action='store_true',
             help="If set, the script will NOT delete intermediate temporary files after execution."
         )
+
+        parser.add_argument(
+            "--scratch-root",
+            type=str,
+            default=None,
+            help=f"Directory in which the per-run workspace of intermediate files is created, e.g. /dev/shm "
+                 f"(default: ${SCRATCH_ROOT_ENV} or the system temporary directory)."
+        )
+
+        parser.add_argument(
+            "--shard",
+            type=str,
+            default=None,
+            metavar="I/N",
+            help="Process only shard I of N of the input (stable, cost-balanced split for multi-node runs). "
+                 "Merge the shard results with sharding.py."
+        )
+
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Keep the workspace of a run that does not finish (error, Ctrl-C, reboot with a disk-backed "
+                 "--scratch-root) so that it can be continued with --resume."
+        )
+
+        parser.add_argument(
+            "--resume",
+            type=str,
+            default=None,
+            metavar="RUN_ID",
+            help="Continue the checkpointed run RUN_ID on the same input file, reusing its finished MOL files, "
+                 "predicted and bucketed spectra and scored molecules."
+        )
         
         parser.add_argument(
             "--models",
@@ -162,14 +216,214 @@ def main():
             action="store_true",
             help="Print results on designed plot."
         )
+
+        parser.add_argument(
+            "--chart-limit",
+            type=int,
+            default=CHART_DETAIL_LIMIT,
+            help=f"With --chart, draw every molecule up to this number of molecules (default: {CHART_DETAIL_LIMIT}); "
+                 "larger sets get density/distribution plots with the top outliers labelled."
+        )
         
+        parser.add_argument(
+            "--output-format",
+            type=str,
+            default='csv',
+            choices=OUTPUT_FORMATS,
+            help="Format of the summary and per-model result tables: 'csv' (default), 'parquet' or 'feather' "
+                 "(the latter two need pyarrow and store the model metadata in the file)."
+        )
+
+        parser.add_argument(
+            "--per-molecule-files",
+            action="store_true",
+            help="Additionally save one <molecule>_<property>.csv file per molecule and property."
+        )
+
         parser.add_argument("--use_svr", action="store_true", help="Enable SVR predictor.")
         parser.add_argument("--use_xgb", action="store_true", help="Enable XGB predictor.")
         parser.add_argument("--use_dnn", action="store_true", help="Enable DNN predictor.")
         parser.add_argument("--use_cnn", action="store_true", help="Enable CNN predictor.")
 
+        parser.add_argument(
+            "--xgb-threads",
+            type=int,
+            default=None,
+            help="Number of threads used by the XGB models (default: XGBoost's own default)."
+        )
+
+        budget_group = parser.add_mutually_exclusive_group()
+        budget_group.add_argument(
+            "--threads",
+            type=int,
+            default=None,
+            help="Total CPU threads of the run, shared by the JVM, XGBoost, PyTorch and BLAS (default: all CPUs)."
+        )
+        budget_group.add_argument(
+            "--cpu-budget",
+            type=float,
+            default=None,
+            help="Like --threads, but as a fraction of the available CPUs (e.g. 0.5)."
+        )
+
+        parser.add_argument(
+            "--java-heap",
+            type=str,
+            default='1g',
+            help="Maximum heap of the Java BatchProcessor (JVM -Xmx value, default: 1g)."
+        )
+
+        parser.add_argument(
+            "--java-opts",
+            type=str,
+            default=None,
+            help="Additional JVM options of the Java BatchProcessor, e.g. \"-XX:+UseSerialGC\"."
+        )
+
+        parser.add_argument(
+            "--shift-cache",
+            type=int,
+            default=0,
+            metavar="ENTRIES",
+            help="Reuse the predicted shift of an atom environment (HOSE code) for later atoms with the same "
+                 "environment, keeping up to ENTRIES environments (Java backend with --nmr-2d, default: 0 = off)."
+        )
+
+        parser.add_argument(
+            "--symmetry-reuse",
+            action="store_true",
+            help="Predict one atom per class of topologically equivalent atoms (methyl H, tert-butyl C, ...) and "
+                 "give its shift to the whole class (Java backend with --nmr-2d: the classes ignore stereochemistry "
+                 "and geometry, so they are not used for 3D predictions)."
+        )
+
+        parser.add_argument(
+            "--nmr-2d",
+            action="store_true",
+            help="Predict the NMR spectra from the 2D structure instead of the 3D coordinates of the MOL files "
+                 "(Java backend). The shifts differ slightly from the default 3D predictions."
+        )
+
+        parser.add_argument(
+            "--verify-shift-reuse",
+            action="store_true",
+            help="With --shift-cache or --symmetry-reuse, still predict every atom and report reused shifts that differ."
+        )
+
+        parser.add_argument(
+            "--ensemble-workers",
+            type=int,
+            default=None,
+            help="Number of models evaluated concurrently (default: one per model, at most one per CPU; 1 = sequential)."
+        )
+
+        parser.add_argument(
+            "--latency-budget",
+            type=float,
+            default=None,
+            metavar="MS",
+            help="Scoring time in milliseconds per molecule for all models; per property, the enabled models with "
+                 "the best expected accuracy within an equal share are used (requires model_latency.py profiling)."
+        )
+
+        parser.add_argument(
+            "--quantize",
+            action="store_true",
+            help="Run the DNN/CNN models approved by the quantization.py accuracy check in int8 "
+                 "(the others stay float32)."
+        )
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Parallel workers of MOL generation and Java spectrum prediction, fed longest-first by "
+                 "estimated molecule cost (default: 1 = sequential)."
+        )
+
+        parser.add_argument(
+            "--molecule-timeout",
+            type=float,
+            default=120,
+            help="Time limit in seconds of one molecule in MOL generation (ETKDG, OpenBabel) and Java spectrum "
+                 "prediction; molecules that exceed it are logged and skipped (default: 120, 0 = no limit)."
+        )
+
+        parser.add_argument(
+            "--nmr-backend",
+            type=str,
+            default='java',
+            choices=list(BACKENDS),
+            help="NMR spectrum prediction backend: 'java' (NMRShiftDB2, default) or 'lookup' "
+                 "(pure-Python stand-in for testing the downstream stages only)."
+        )
+
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Record per-stage timings, throughput and peak memory into a JSON report next to the results."
+        )
+
+        parser.add_argument(
+            "--trace",
+            action="store_true",
+            help="Record the time of every molecule in MOL generation, spectrum prediction, bucketing and scoring "
+                 "into a trace file next to the results and report the slowest molecules."
+        )
+
+        parser.add_argument(
+            "--trace-top",
+            type=int,
+            default=TOP_N,
+            help=f"Number of slowest molecules listed by --trace (default: {TOP_N})."
+        )
+
+        parser.add_argument(
+            "--profile-stage",
+            type=str,
+            default=None,
+            choices=['verify_csv', 'generate_mol_files', 'fp_generator', 'predict_spectra',
+                     'bucket', 'merger', 'custom_header', 'concatenate', 'query'],
+            help="With --profile, additionally capture the chosen stage with cProfile (*.prof file)."
+        )
+
+        parser.add_argument(
+            "--log-level",
+            type=str,
+            default='INFO',
+            choices=list(LOG_LEVELS),
+            help="Lowest level written to RUN_LOG_FILE.log (console output is INFO, errors are WARNING or ERROR)."
+        )
+
+        parser.add_argument(
+            "--log-format",
+            type=str,
+            default='text',
+            choices=LOG_FORMATS,
+            help="RUN_LOG_FILE.log format: 'text' (console transcript) or 'jsonl' (one time-stamped record per line)."
+        )
+
+        parser.add_argument(
+            "--startup-report",
+            action="store_true",
+            help="Report how long the deferred imports of every framework took (cold-start latency)."
+        )
+
         # Parse the command-line arguments
         args = parser.parse_args()
+        sharding = None
+        if args.shard is not None:
+            sharding = timed_import('sharding')
+            try:
+                shard, shards = sharding.parse_shard(args.shard)
+            except ValueError as e:
+                parser.error(str(e))
+        run_log.configure(args.log_level, args.log_format)
+
+        # Limit the thread pools before the native libraries are imported
+        threads = thread_budget.configure(args.threads, args.cpu_budget)
+
+        text2art = timed_import('art').text2art
     
         # Clear the console and display the ASCII art logo
         subprocess.call('cls' if os.name == 'nt' else 'clear', shell=True)
@@ -187,54 +441,122 @@ def main():
         final_art = f"{ascii_art_predictor}\n{centered_2nd_line}\n{centered_3rd_line}"
         print(final_art)                   
 
+        profiler = StageProfiler(enabled=args.profile, cprofile_stage=args.profile_stage,
+                                 thread_budget=threads)
+        trace = MoleculeTrace(enabled=args.trace)
+
+        # All intermediate files of this run are written to its own workspace
+        resume = args.resume is not None
+        workspace = Workspace(args.scratch_root, keep=args.debug, run_id=args.resume)
+        work_dir = workspace.path
+        verbose_print(args, f"\nWorkspace of this run: {COLORS[2]}{work_dir}{RESET}")
+
+        # Checkpointed runs record their completed stages in a journal
+        journal = RunJournal(work_dir) if args.checkpoint or resume else None
+        if journal is not None:
+            print(f"\n{'Resuming' if resume else 'Checkpointed'} run {COLORS[2]}{workspace.run_id}{RESET}")
+
         # Step 1: Verify the CSV input file and correct any issues
-        verified_csv_path = verify_csv(args.csv_path, args.quiet)
+        with profiler.stage('verify_csv'):
+            entry = journal.completed('verify_csv') if resume else None
+            input_digest = (file_digest(args.csv_path) if (journal is not None or sharding is not None)
+                            and os.path.exists(args.csv_path) else None)
+            if entry is not None and (entry['input_sha256'] != input_digest or entry.get('shard') != args.shard):
+                raise ValueError(f"{args.csv_path} is not the input file (or shard) of run {workspace.run_id}; "
+                                 f"it cannot be resumed.")
+            if (entry is not None and os.path.exists(entry['verified'])
+                    and file_digest(entry['verified']) == entry['verified_sha256']):
+                verified_csv_path = entry['verified']
+                verbose_print(args, f"\nReusing the verified file {COLORS[2]}{verified_csv_path}{RESET}")
+            else:
+                verify_csv = timed_import('csv_checker').verify_csv
+                verified_csv_path = verify_csv(args.csv_path, args.quiet, work_dir)
+                if sharding is not None and verified_csv_path:
+                    selected, total = sharding.select_shard(verified_csv_path, shard, shards)
+                    print(f"\nShard {COLORS[2]}{shard}/{shards}{RESET}: {selected} of {total} molecules.")
+                if journal is not None and verified_csv_path:
+                    journal.record('verify_csv', input=os.path.abspath(args.csv_path), input_sha256=input_digest,
+                                   verified=verified_csv_path, verified_sha256=file_digest(verified_csv_path),
+                                   shard=args.shard)
+        if profiler.enabled and verified_csv_path:
+            profiler.molecules = count_molecules(verified_csv_path)
         
         # Determine the predictors to use
         predictors = [args.predictor] if args.predictor in ['1H', '13C', 'FP'] else 'hybrid'
 
-        temp_data = []  # List to keep track of temporary directories
+        # Parallel stages are ordered by a cost model learned from earlier runs (scheduler.py)
+        cost_model = timed_import('scheduler').CostModel() if args.workers > 1 else None
+        backend = get_backend(args.nmr_backend,
+                              java_options=thread_budget.java_options(args.java_heap, args.java_opts),
+                              workers=args.workers, cost_model=cost_model, timeout=args.molecule_timeout,
+                              trace=trace, shift_cache=args.shift_cache,
+                              symmetry_reuse=args.symmetry_reuse, verify_reuse=args.verify_shift_reuse,
+                              use3d=not args.nmr_2d)
+        if args.shift_cache and not args.nmr_2d:
+            print(f"{COLORS[2]}--shift-cache only applies to 2D predictions (--nmr-2d); every atom is "
+                  f"predicted.{RESET}")
+        if args.symmetry_reuse and not args.nmr_2d:
+            print(f"{COLORS[2]}--symmetry-reuse only applies to 2D predictions (--nmr-2d); every atom is "
+                  f"predicted.{RESET}")
+
+        # Result files of a shard are tagged with it
+        result_tag = sharding.shard_tag(shard, shards) if sharding is not None else None
+
+        # Scored molecules of checkpointed runs are saved in the workspace
+        checkpoint_dir = os.path.join(work_dir, 'scores') if journal is not None else None
+
+        # Stage functions
+        bucket = timed_import('bucket').bucket
+        merger = timed_import('merger').merger
+        custom_header = timed_import('custom_header').custom_header
+
         mol_directory = None  # Initialize mol_directory
+        result_paths = []  # Stays empty if the query stage does not run
         predictor = args.predictor
 
         if predictor in ['1H', '13C', 'FP']:
 
             for predictor in predictors:
 
-                temp_dirs = []  # Temporary directories for this predictor
-
                 if predictor == 'FP':
                     # Step 2 - 4: Generate FingerPrint files
-                    processed_dir = fp_generator(verified_csv_path, args.quiet)
-                    temp_dirs.append(processed_dir)
+                    with profiler.stage('fp_generator'):
+                        fp_generator = timed_import('fp_generator').fp_generator
+                        processed_dir = resumable_stage(journal, 'fp_generator', None, lambda: fp_generator(
+                            verified_csv_path, args.quiet, work_dir), resume)
                 else:
                     if mol_directory is None:
                         # Step 2: Generate .mol files from SMILES strings
-                        mol_directory = generate_mol_files(verified_csv_path, args.quiet)
-                        temp_data.append(mol_directory)
+                        with profiler.stage('generate_mol_files'):
+                            generate_mol_files = timed_import('gen_mols').generate_mol_files
+                            mol_directory = resumable_stage(journal, 'generate_mol_files', None, lambda: generate_mol_files(
+                                verified_csv_path, args.quiet, work_dir, resume, args.workers, cost_model,
+                            args.molecule_timeout, trace), resume)
 
                     # Step 3: Predict NMR spectra and save results as .csv files
-                    csv_output_folder = run_java_batch_processor(mol_directory, predictor, args.quiet)
-                    temp_dirs.append(csv_output_folder)
+                    with profiler.stage('predict_spectra', predictor):
+                        predict_spectra = backend.resume if resume else backend.predict
+                        csv_output_folder = resumable_stage(journal, 'predict_spectra', predictor, lambda: predict_spectra(
+                            mol_directory, predictor, args.quiet, work_dir), resume)
                 
                     # Step 4: Perform bucketing to generate pseudo NMR spectra
-                    processed_dir = bucket(csv_output_folder, predictor, args.quiet)
-                    temp_dirs.append(processed_dir)
+                    with profiler.stage('bucket', predictor):
+                        processed_dir = resumable_stage(journal, 'bucket', predictor, lambda: bucket(
+                            csv_output_folder, predictor, args.quiet, work_dir, resume, trace), resume)
             
                 # Step 5: Merge spectra in CSV format into one matrix file
-                output_path, merged_dir = merger(processed_dir, verified_csv_path, predictor, args.quiet)
-                temp_dirs.append(merged_dir)
+                with profiler.stage('merger', predictor):
+                    output_path, merged_dir = merger(processed_dir, verified_csv_path, predictor, args.quiet, work_dir)
             
                 # Step 6: Create custom headers for the final dataset
-                dataset, final_dir = custom_header(output_path, verified_csv_path, predictor, args.quiet)
-                temp_dirs.append(final_dir)
-
-                # Collect all temporary directories
-                temp_data.extend(temp_dirs)
+                with profiler.stage('custom_header', predictor):
+                    dataset, final_dir = custom_header(output_path, verified_csv_path, predictor, args.quiet, work_dir)
         
                 # Step 7: Query ML models
                 show_models_table = args.models
-                query(dataset, predictor, show_models_table, args.quiet, args.chart, args.use_svr, args.use_xgb, args.use_dnn, args.use_cnn)
+                with profiler.stage('query', predictor):
+                    query = timed_import('model_query').query
+                    result_paths = query(dataset, predictor, show_models_table, args.quiet, args.chart, args.use_svr, args.use_xgb, args.use_dnn, args.use_cnn, args.xgb_threads, args.ensemble_workers, args.per_molecule_files, args.output_format, args.chart_limit, checkpoint_dir, result_tag, trace, args.latency_budget, args.quantize)
 
         elif predictor == 'hybrid':
             
@@ -242,81 +564,119 @@ def main():
 
             predictors = ['1H', '13C']  # Use both 1H and 13C predictors for hybrid
             for sub_predictor in predictors:
-                temp_dirs = []  # Temporary directories for this predictor
 
                 if mol_directory is None:
                     # Step 2: Generate .mol files from SMILES strings
-                    mol_directory = generate_mol_files(verified_csv_path, args.quiet)
-                    temp_data.append(mol_directory)
+                    with profiler.stage('generate_mol_files'):
+                        generate_mol_files = timed_import('gen_mols').generate_mol_files
+                        mol_directory = resumable_stage(journal, 'generate_mol_files', None, lambda: generate_mol_files(
+                            verified_csv_path, args.quiet, work_dir, resume, args.workers, cost_model,
+                            args.molecule_timeout, trace), resume)
 
                 # Step 3: Predict NMR spectra and save results as .csv files
-                csv_output_folder = run_java_batch_processor(mol_directory, sub_predictor, args.quiet)
-                temp_dirs.append(csv_output_folder)
+                with profiler.stage('predict_spectra', sub_predictor):
+                    predict_spectra = backend.resume if resume else backend.predict
+                    csv_output_folder = resumable_stage(journal, 'predict_spectra', sub_predictor, lambda: predict_spectra(
+                        mol_directory, sub_predictor, args.quiet, work_dir), resume)
             
                 # Step 4: Perform bucketing to generate pseudo NMR spectra
-                processed_dir = bucket(csv_output_folder, sub_predictor, args.quiet)
-                temp_dirs.append(processed_dir)
+                with profiler.stage('bucket', sub_predictor):
+                    processed_dir = resumable_stage(journal, 'bucket', sub_predictor, lambda: bucket(
+                        csv_output_folder, sub_predictor, args.quiet, work_dir, resume, trace), resume)
 
                 # Step 5: Merge spectra in CSV format into one matrix file
-                output_path, merged_dir = merger(processed_dir, verified_csv_path, sub_predictor, args.quiet)
-                temp_dirs.append(merged_dir)
+                with profiler.stage('merger', sub_predictor):
+                    output_path, merged_dir = merger(processed_dir, verified_csv_path, sub_predictor, args.quiet, work_dir)
             
                 # Step 6: Create custom headers for the final dataset
-                dataset, final_dir = custom_header(output_path, verified_csv_path, sub_predictor, args.quiet)
-                temp_dirs.append(final_dir)
+                with profiler.stage('custom_header', sub_predictor):
+                    dataset, final_dir = custom_header(output_path, verified_csv_path, sub_predictor, args.quiet, work_dir)
                 datasets.append(dataset)  # Collect dataset for hybrid prediction
 
-                # Collect all temporary directories
-                temp_data.extend(temp_dirs)
-
             # Step 7: Generate concatenated 1H|13C input files
-            dataset2, concat_dir = concatenate(datasets, args.quiet)
-            temp_data.append(concat_dir)
+            with profiler.stage('concatenate'):
+                concatenate = timed_import('concatenator').concatenate
+                dataset2, concat_dir = concatenate(datasets, args.quiet, work_dir)
 
             verbose_print(args, f'{predictor}')
 
             # Step 8: Query ML models
             show_models_table = args.models
-            query(dataset2, predictor, show_models_table, args.quiet, args.chart, args.use_svr, args.use_xgb, args.use_dnn, args.use_cnn)
+            with profiler.stage('query', predictor):
+                query = timed_import('model_query').query
+                result_paths = query(dataset2, predictor, show_models_table, args.quiet, args.chart, args.use_svr, args.use_xgb, args.use_dnn, args.use_cnn, args.xgb_threads, args.ensemble_workers, args.per_molecule_files, args.output_format, args.chart_limit, checkpoint_dir, result_tag, trace, args.latency_budget, args.quantize)
 
-        # Optional: Clean up temporary dirs and data unless the --debug flag is set
-        if not args.debug:
-            verbose_print(args, 
-                f"\nAll temporary files "
-                f"and folders will be removed:\n"
-            )
+        # Record the finished shard for the merge (sharding.py)
+        if sharding is not None and result_paths:
+            scored = dataset2 if args.predictor == 'hybrid' else dataset
+            manifest_path = sharding.write_manifest(
+                os.path.dirname(result_paths[0]), shard, shards, result_paths, args.predictor, args.csv_path,
+                input_digest, count_molecules(verified_csv_path), len(scored))
+            print(f"Shard manifest saved as {COLORS[2]}{manifest_path}{RESET}")
 
-            while temp_data:  # Continue until temp_data is empty
-                folder = temp_data.pop()  # Pop the last item to ensure each is processed only once
+        if cost_model is not None:
+            cost_model.save()
 
-                if os.path.exists(folder):
-                    shutil.rmtree(folder)
-                    verbose_print(args, f"Temporary folder {COLORS[2]}'{folder}'{RESET} has been deleted.")
-                else:
-                    verbose_print(args, f"Folder {COLORS[1]}'{folder}'{RESET} does not exist.")
+        completed = True
 
-            # Delete the verified CSV file
-            if os.path.exists(verified_csv_path):
-                os.remove(verified_csv_path)
-                verbose_print(args, f"The file {COLORS[2]}'{verified_csv_path}'{RESET} has been deleted.")
-            else:
-                verbose_print(args, f"The file {COLORS[1]}'{verified_csv_path}'{RESET} does not exist.")
-
-        else:
-            verbose_print(args, f"\nScript executed with the {COLORS[2]}--debug {RESET}option. All temporary files remain.")
+        if args.debug:
+            print(f"\nScript executed with the {COLORS[2]}--debug {RESET}option. All temporary files remain in {COLORS[2]}{work_dir}{RESET}")
 
     except Exception as e:
-        print(f"An error occurred: {e}")
         import traceback
-        traceback.print_exc()
+        run_log.log('ERROR', f"An error occurred: {e}\n{traceback.format_exc().rstrip()}", console=sys.__stderr__)
 
     finally:
+        # Remove the workspace of the run, also after an error, unless --debug keeps it
+        if workspace is not None:
+            try:
+                if journal is not None and not completed:
+                    workspace.keep = True
+                    print(f"\n{COLORS[1]}Run {workspace.run_id} did not finish.{RESET} Continue it with: "
+                          f"{COLORS[2]}--resume {workspace.run_id}{RESET}")
+                for path in workspace.collect():
+                    print(f"Saved {COLORS[2]}{os.path.basename(path)}{RESET} in the working directory.")
+                if workspace.cleanup() and args is not None:
+                    verbose_print(args, f"\nTemporary workspace {COLORS[2]}'{workspace.path}'{RESET} has been deleted.")
+            except Exception as e:
+                print(f"Could not remove the workspace {workspace.path}: {e}")
+
+        # Report the cold-start cost of the deferred imports
+        if args is not None and args.startup_report:
+            try:
+                write_startup_report(args, COLORS, RESET)
+            except Exception as e:
+                print(f"Could not write the startup report: {e}")
+
+        # Write the profiling report next to the prediction results
+        if profiler.enabled:
+            try:
+                print(f"\n{COLORS[2]}CPU utilisation per stage ({profiler.thread_budget} threads){RESET}")
+                print(profiler.format_table())
+                report_path = profiler.write(os.path.join(os.getcwd(), "Prediction_Results", f'{args.predictor}_logD_results'))
+                print(f"\nProfiling report saved as {COLORS[2]}{report_path}{RESET}")
+            except Exception as e:
+                print(f"Could not write the profiling report: {e}")
+
+        # Report the slowest molecules of the run
+        if trace.enabled and trace.records:
+            try:
+                print(f"\n{trace.format_report(args.trace_top)}")
+                trace_path = trace.write(os.path.join(os.getcwd(), "Prediction_Results", f'{args.predictor}_logD_results'))
+                print(f"\nMolecule trace saved as {COLORS[2]}{trace_path}{RESET}")
+            except Exception as e:
+                print(f"Could not write the molecule trace: {e}")
+
         # Restore original sys.stdout and sys.stderr
+        for stream in (sys.stdout, sys.stderr):
+            if isinstance(stream, LogStream):
+                stream.flush()
+                stream.close_line()
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
         
-        # Close the log file
-        log_file.close()
+        # Write the remaining records and close the log file
+        run_log.close()
     
     input(f"{COLORS[0]}\nPress ENTER to close terminal window.\n{RESET}")
     
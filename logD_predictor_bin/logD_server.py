@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script Name: logD_server.py
+Description: Local HTTP prediction service with request micro-batching.
+
+The server keeps one warm LogDPredictor (models loaded, Java BatchProcessor
+compiled) and coalesces concurrent requests into micro-batches, so that the
+per-batch costs of the pipeline (MOL generation start-up, JVM start, model
+calls) are shared between clients. It binds to localhost by default and
+needs no network access beyond the local process.
+
+Endpoints:
+- POST /predict  body: {"smiles": [...], "names": [...] (optional)}
+                 reply: {"results": [{...}, ...], "latency_ms": float}
+- GET  /stats    request latency percentiles and batching counters
+- GET  /health   liveness check
+
+Example:
+    python logD_predictor_bin/logD_server.py --predictor hybrid --use_svr --use_xgb
+    curl -X POST localhost:8765/predict -d '{"smiles": ["CCO"]}'
+"""
+
+import argparse
+import collections
+import json
+import math
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from logD_api import LogDPredictor
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+
+class _PendingRequest:
+    """One client request waiting for its micro-batch to be processed."""
+
+    def __init__(self, smiles, names):
+        self.smiles = smiles
+        self.names = names
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False  # set when the client stopped waiting
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests and runs them as one prediction call.
+
+    A batch is closed when it holds *max_batch_size* molecules or when the
+    oldest request has waited *max_wait* seconds, whichever comes first.
+    A single worker thread owns the predictor, so model calls are never
+    made concurrently. Requests whose client stopped waiting are dropped
+    from the batch, and when a batch fails, its requests are retried one by
+    one so that only the requests with the offending molecules fail.
+
+    Parameters:
+    - predictor (LogDPredictor): Warm predictor used for every batch.
+    - max_batch_size (int): Maximum number of molecules per batch.
+    - max_wait (float): Maximum time in seconds a request waits for others.
+    - history (int): Number of recent request latencies kept for /stats.
+    """
+
+    def __init__(self, predictor, max_batch_size=64, max_wait=0.02, history=10000):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._latencies = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.molecules = 0
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self._worker = threading.Thread(target=self._run, name='logD-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, smiles, names=None, timeout=None):
+        """
+        Queues a request and blocks until its predictions are ready.
+
+        Returns:
+        - results (pd.DataFrame): Prediction rows for *smiles*, in order.
+        """
+        request = _PendingRequest(list(smiles), names)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            # Not scored if its batch has not started yet
+            request.cancelled = True
+            with self._lock:
+                self.cancelled += 1
+            raise TimeoutError("Prediction did not finish in time.")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the batch is full or times out."""
+        batch = [self._queue.get()]
+        size = len(batch[0].smiles)
+        deadline = batch[0].enqueued + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.smiles)
+        return batch
+
+    def _predict(self, batch):
+        """
+        Predicts the molecules of *batch* in one call.
+
+        Returns:
+        - outcomes (list): (result, error) of every request, in order.
+        """
+        smiles = [s for request in batch for s in request.smiles]
+        names = [n for request in batch
+                 for n in (request.names if request.names is not None else range(len(request.smiles)))]
+        try:
+            results = self.predictor.predict(smiles, names=names) if smiles else None
+        except Exception as e:
+            return [(None, e)] * len(batch)
+        outcomes = []
+        start = 0
+        for request in batch:
+            count = len(request.smiles)
+            outcomes.append((results.iloc[start:start + count].reset_index(drop=True)
+                             if results is not None else None, None))
+            start += count
+        return outcomes
+
+    def _run(self):
+        while True:
+            batch = [request for request in self._collect() if not request.cancelled]
+            if not batch:
+                continue
+            outcomes = self._predict(batch)
+            if len(batch) > 1 and outcomes[0][1] is not None:
+                # Retried one by one, so only the failing requests get the error
+                outcomes = [self._predict([request])[0] for request in batch]
+
+            finished = time.perf_counter()
+            with self._lock:
+                self.batches += 1
+                self.molecules += sum(len(request.smiles) for request in batch)
+                for request, (result, error) in zip(batch, outcomes):
+                    if error is None:
+                        request.result = result
+                    else:
+                        request.error = error
+                        self.errors += 1
+                    self.requests += 1
+                    self._latencies.append(finished - request.enqueued)
+                    request.done.set()
+
+    def stats(self):
+        """Returns the request latency percentiles (ms) and batching counters."""
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=float) * 1000.0
+            stats = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'cancelled': self.cancelled,
+                'batches': self.batches,
+                'molecules': self.molecules,
+                'mean_batch_size': round(self.molecules / self.batches, 2) if self.batches else 0.0,
+                'queued': self._queue.qsize(),
+            }
+        for name, q in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99)):
+            stats[f'latency_{name}_ms'] = round(float(np.percentile(latencies, q)), 2) if latencies.size else None
+        stats['latency_max_ms'] = round(float(latencies.max()), 2) if latencies.size else None
+        return stats
+
+
+def _json_safe(value):
+    """NaN is not valid JSON; failed molecules are reported as null."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def make_handler(batcher, request_timeout=None):
+    """Builds the request handler class bound to *batcher*."""
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, {'status': 'ok'})
+            elif self.path == '/stats':
+                self._reply(200, batcher.stats())
+            else:
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                smiles = payload['smiles']
+                if isinstance(smiles, str):
+                    smiles = [smiles]
+                names = payload.get('names')
+                if names is not None and len(names) != len(smiles):
+                    raise ValueError("'names' must have the same length as 'smiles'.")
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {'error': f'Bad request: {e}'})
+                return
+
+            start = time.perf_counter()
+            try:
+                results = batcher.submit(smiles, names, timeout=request_timeout)
+            except Exception as e:
+                self._reply(500, {'error': str(e)})
+                return
+            records = [] if results is None else [
+                {key: _json_safe(value) for key, value in record.items()}
+                for record in results.to_dict(orient='records')
+            ]
+            self._reply(200, {'results': records,
+                              'latency_ms': round((time.perf_counter() - start) * 1000.0, 2)})
+
+        def log_message(self, format, *args):
+            # Per-request access logging is skipped; latencies are available from /stats
+            pass
+
+    return PredictionHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local HTTP logD prediction service with request micro-batching.'
+    )
+    parser.add_argument("--predictor", type=str, default='hybrid',
+                        choices=['1H', '13C', 'FP', 'hybrid'],
+                        help="Select the type of predictive models: '1H', '13C', 'FP' or 'hybrid'.")
+    parser.add_argument("--host", type=str, default='127.0.0.1',
+                        help="Interface to bind to (default: localhost only).")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--max-batch-size", type=int, default=64,
+                        help="Maximum number of molecules coalesced into one batch.")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0,
+                        help="Maximum time a request waits for other requests to join its batch.")
+    parser.add_argument("--request-timeout", type=float, default=None,
+                        help="Seconds after which a waiting request is answered with an error.")
+    parser.add_argument("--use_svr", action="store_true", help="Enable SVR predictor.")
+    parser.add_argument("--use_xgb", action="store_true", help="Enable XGB predictor.")
+    parser.add_argument("--use_dnn", action="store_true", help="Enable DNN predictor.")
+    parser.add_argument("--use_cnn", action="store_true", help="Enable CNN predictor.")
+    args = parser.parse_args()
+
+    algorithms = [name for name, enabled in (('SVR', args.use_svr), ('XGB', args.use_xgb),
+                                             ('DNN', args.use_dnn), ('CNN', args.use_cnn)) if enabled]
+    if not algorithms:
+        algorithms = ['SVR', 'XGB', 'DNN', 'CNN']
+
+    print(f"Loading {COLORS[2]}{args.predictor}{RESET} models: {', '.join(algorithms)} ...")
+    predictor = LogDPredictor(representation=args.predictor, algorithms=algorithms).warmup()
+    batcher = MicroBatcher(predictor, args.max_batch_size, args.max_wait_ms / 1000.0)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, args.request_timeout))
+    print(f"{COLORS[0]}Serving logD predictions on http://{args.host}:{args.port}{RESET} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{COLORS[2]}Shutting down.{RESET} Final stats: {json.dumps(batcher.stats())}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import pandas as pd
 import os
 
 
-def merger(processed_dir, csv_path, predictor, quiet=False):
+def merger(processed_dir, csv_path, predictor, quiet=False, work_dir=None):
     """
     Merges multiple CSV files in the specified directory into a single
     DataFrame,
@@ -15,6 +15,8 @@ def merger(processed_dir, csv_path, predictor, quiet=False):
                            merged.
     - csv_path (str): Path to an initial CSV file used to generate the name of
                       the merged output file.
+    - work_dir (str): Directory for the merged folder (defaults to the current
+                      working directory).
 
     Returns:
     - output_path (str): Path to the merged CSV file.
@@ -34,7 +36,8 @@ def merger(processed_dir, csv_path, predictor, quiet=False):
     RESET = '\033[0m'
     
     try:
-        merging_directory = os.path.join(os.getcwd(), processed_dir)
+        work_dir = work_dir or os.getcwd()
+        merging_directory = os.path.join(work_dir, processed_dir)
         if not os.path.exists(merging_directory):
             print(f"{COLORS[1]}{merging_directory} does not exist.{RESET}")
             return None, None
@@ -52,7 +55,7 @@ def merger(processed_dir, csv_path, predictor, quiet=False):
             df_temp.insert(0, 'filename', filename_without_extension)
             df_merged = pd.concat([df_merged, df_temp], ignore_index=True)
 
-        merged_dir = os.path.join(os.getcwd(), f'{predictor}_merged')
+        merged_dir = os.path.join(work_dir, f'{predictor}_merged')
         if not os.path.exists(merged_dir):
             verbose_print(f"\n{COLORS[2]}{merged_dir}{RESET} directory has been created.")
             os.makedirs(merged_dir, exist_ok=True)
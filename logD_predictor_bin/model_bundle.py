@@ -0,0 +1,232 @@
+# model_bundle.py
+
+"""
+Precompiled model bundles for a fast cold start.
+
+Loading the model zoo from joblib_models unpickles the SVR and XGBoost
+models and, for DNN/CNN, parses the _summary.txt files, builds Net with a
+random weight initialisation and then loads the .pth state dicts. The
+one-time compile command
+
+    python logD_predictor_bin/model_bundle.py --predictor hybrid
+
+converts every entry of <predictor>_models_info.csv into
+joblib_models/<predictor>_bundle/ with:
+
+- manifest.json   – format version, input dimension and the source files
+                    (size and modification time) of every model,
+- models_info.csv – the metadata table,
+- frozen TorchScript modules (*.pt) for DNN/CNN,
+- native XGBoost boosters (*.ubj),
+- SVR support vectors and dual coefficients as .npy arrays that are
+  memory-mapped on load.
+
+model_query uses a bundle automatically as long as its sources have not
+changed since it was compiled; otherwise the original files are loaded.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import warnings
+from datetime import datetime
+
+from model_query import FEATURE_COUNTS, MODELS_DIR, algorithm_module, read_model_table
+
+BUNDLE_FORMAT_VERSION = 1
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+
+def bundle_dir(predictor, models_dir=MODELS_DIR):
+    """Directory of the compiled bundle of *predictor*."""
+    return os.path.join(models_dir, f"{predictor}_bundle")
+
+
+def file_stamp(path):
+    """Size and modification time of *path*, compared to detect changed source files."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def save_torchscript(model, path_base, example):
+    """
+    Saves a network as a frozen TorchScript module (<path_base>.pt) and
+    returns its path. Networks that cannot be scripted are traced with the
+    *example* input.
+    """
+    import torch
+
+    model.eval()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        try:
+            scripted = torch.jit.script(model)
+        except Exception:
+            scripted = torch.jit.trace(model, example)
+        scripted = torch.jit.freeze(scripted)
+        torch.jit.save(scripted, path_base + '.pt')
+    return path_base + '.pt'
+
+
+def load_torchscript(path):
+    """Loads a network saved by save_torchscript() in evaluation mode."""
+    import torch
+
+    with warnings.catch_warnings():
+        # TorchScript is deprecated in recent PyTorch releases, but still loads fastest
+        warnings.simplefilter('ignore', FutureWarning)
+        model = torch.jit.load(path, map_location=torch.device('cpu'))
+    model.eval()
+    return model
+
+
+def compile_bundle(predictor, models_dir=MODELS_DIR, quiet=False):
+    """
+    Compiles all models listed in <predictor>_models_info.csv into a bundle.
+
+    Parameters:
+    - predictor (str): '1H', '13C', 'FP' or 'hybrid'.
+    - models_dir (str): Directory with the models table and model files.
+    - quiet (bool): If True, progress is not printed.
+
+    Returns:
+    - output_dir (str): The bundle directory.
+    """
+    model_table_path = os.path.join(models_dir, f"{predictor}_models_info.csv")
+    if not os.path.exists(model_table_path):
+        raise FileNotFoundError(f"File {model_table_path} does not exist.")
+    model_table_df = read_model_table(model_table_path)
+    input_dim = FEATURE_COUNTS[predictor]
+
+    # The bundle is built next to the old one and swapped in at the end,
+    # so an interrupted compilation never leaves a half-written bundle
+    output_dir = bundle_dir(predictor, models_dir)
+    build_dir = output_dir + '.tmp'
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    entries = []
+    for _, row in model_table_df.iterrows():
+        module = algorithm_module(row['ML_algorithm'])
+        source_path = os.path.join(models_dir, row['model_path'])
+        model = module.load_model(source_path, input_dim)
+        compiled_path = module.save_compiled(model, os.path.join(build_dir, row['model_name']), input_dim)
+        entries.append({
+            'model_name': row['model_name'],
+            'ML_algorithm': row['ML_algorithm'],
+            'file': os.path.basename(compiled_path),
+            'source': row['model_path'],
+            'source_stamp': file_stamp(source_path),
+        })
+        if not quiet:
+            print(f"   {row['model_name']} -> {os.path.basename(compiled_path)}")
+
+    model_table_df.to_csv(os.path.join(build_dir, 'models_info.csv'), sep=';', index=False)
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'predictor': predictor,
+        'input_dim': input_dim,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'models_info_stamp': file_stamp(model_table_path),
+        'models': entries,
+    }
+    with open(os.path.join(build_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(build_dir, output_dir)
+    return output_dir
+
+
+def read_manifest(predictor, models_dir=MODELS_DIR):
+    """
+    Returns the manifest of the bundle of *predictor*, or None if there is
+    no bundle or it is out of date with respect to its source files.
+    """
+    manifest_path = os.path.join(bundle_dir(predictor, models_dir), 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        return None
+
+    sources = [(f"{predictor}_models_info.csv", manifest['models_info_stamp'])]
+    sources += [(entry['source'], entry['source_stamp']) for entry in manifest['models']]
+    for source, stamp in sources:
+        source_path = os.path.join(models_dir, source)
+        if not os.path.exists(source_path) or file_stamp(source_path) != stamp:
+            return None
+    return manifest
+
+
+def load_bundle(predictor, models_dir=MODELS_DIR, algorithms=None, skip=()):
+    """
+    Loads an up-to-date bundle.
+
+    Parameters:
+    - predictor (str): '1H', '13C', 'FP' or 'hybrid'.
+    - models_dir (str): Directory with the models table and the bundle.
+    - algorithms (list): Load only models of these ML algorithms (all if None).
+    - skip (iterable): 'model_path' entries that are already loaded.
+
+    Returns:
+    - (model_table_df, models, input_dim), where *models* maps the original
+      'model_path' entries to the loaded models, or None if no current
+      bundle exists.
+    """
+    manifest = read_manifest(predictor, models_dir)
+    if manifest is None:
+        return None
+
+    directory = bundle_dir(predictor, models_dir)
+    model_table_df = read_model_table(os.path.join(directory, 'models_info.csv'))
+    models = {}
+    for entry in manifest['models']:
+        if algorithms is not None and entry['ML_algorithm'] not in algorithms:
+            continue
+        if entry['source'] in skip:
+            continue
+        module = algorithm_module(entry['ML_algorithm'])
+        models[entry['source']] = module.load_compiled(os.path.join(directory, entry['file']), manifest['input_dim'])
+    return model_table_df, models, manifest['input_dim']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compiles the models of <predictor>_models_info.csv into a bundle that loads faster.")
+    parser.add_argument(
+        "--predictor",
+        nargs='+',
+        default=None,
+        choices=list(FEATURE_COUNTS),
+        help="Representations to compile (default: every one with a models table)."
+    )
+    parser.add_argument(
+        "--models-dir",
+        default=MODELS_DIR,
+        help="Directory with the models tables and model files (default: joblib_models)."
+    )
+    args = parser.parse_args()
+
+    predictors = args.predictor or [p for p in FEATURE_COUNTS
+                                    if os.path.exists(os.path.join(args.models_dir, f"{p}_models_info.csv"))]
+    if not predictors:
+        print(f"{COLORS[1]}No *_models_info.csv tables found in {args.models_dir}.{RESET}")
+        return
+
+    for predictor in predictors:
+        print(f"Compiling {COLORS[2]}{predictor}{RESET} models ...")
+        output_dir = compile_bundle(predictor, args.models_dir)
+        print(f"{COLORS[0]}Bundle saved in {output_dir}{RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# model_latency.py
+
+"""
+Per-model latency profiling and latency-budget model selection.
+
+Every property is predicted by an ensemble of the models listed in
+<predictor>_models_info.csv, and the --use_svr/--use_xgb/--use_dnn/--use_cnn
+switches only toggle whole families. The one-time profiling command
+
+    python logD_predictor_bin/model_latency.py --predictor hybrid
+
+scores a reference feature matrix with every model on its own and stores
+the measured scoring time per molecule (milliseconds) in
+joblib_models/<predictor>_latency.json. The models table itself is never
+rewritten; merge_latencies() adds the times as a LATENCY_MS column next to
+its RMSE/MAE/Q2 metrics when the table is read for model selection.
+
+With --latency-budget MS, logD_predictor.py then selects, per property, the
+subset of the enabled models with the lowest expected ensemble RMSE whose
+summed LATENCY_MS fits the property's equal share of the budget. The
+expected RMSE of the averaged subset is estimated from the RMSE of its
+models, assuming their errors are correlated with ERROR_CORRELATION.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from model_query import FEATURE_COUNTS, MODELS_DIR, predict_models, read_model_table
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+LATENCY_COLUMN = 'LATENCY_MS'
+
+# Molecules of the synthetic reference matrix and timed repetitions
+PROFILE_ROWS = 1000
+PROFILE_REPEATS = 3
+
+# Assumed correlation of the errors of two models of the same property
+ERROR_CORRELATION = 0.7
+
+# Above this many models of one property the subsets are built greedily
+EXHAUSTIVE_LIMIT = 12
+
+
+def reference_features(predictor, rows=PROFILE_ROWS, seed=0):
+    """
+    Synthetic feature matrix of *predictor*: sparse spectra-like intensities
+    for the NMR representations, sparse bits for fingerprints.
+    """
+    rng = np.random.default_rng(seed)
+    columns = FEATURE_COUNTS[predictor]
+    mask = rng.random((rows, columns)) < 0.1
+    values = mask.astype(float) if predictor == 'FP' else mask * rng.random((rows, columns))
+    return pd.DataFrame(values, columns=[f"FEATURE_{i + 1}" for i in range(columns)])
+
+
+def read_reference_features(path, predictor):
+    """Feature columns of a merged dataset CSV (MOLECULE_NAME followed by the features)."""
+    data = pd.read_csv(path)
+    features = data.iloc[:, 1:]
+    if features.shape[1] != FEATURE_COUNTS[predictor]:
+        raise ValueError(f"{path} has {features.shape[1]} feature columns, "
+                         f"{predictor} models expect {FEATURE_COUNTS[predictor]}.")
+    return features
+
+
+def profile_models(model_table_df, features, models_dir=MODELS_DIR, repeats=PROFILE_REPEATS, threads=None):
+    """
+    Measures the scoring time of every model on *features*.
+
+    Every model is scored on its own (after one warm-up call that also
+    loads it), without feature deduplication, and the median of *repeats*
+    timed calls is divided by the number of rows.
+
+    Returns:
+    - latencies (pd.Series): Milliseconds per molecule, indexed by model_name.
+    """
+    latencies = {}
+    for position in range(len(model_table_df)):
+        model_df = model_table_df.iloc[[position]]
+        predict_models(features.iloc[:10], model_df, models_dir, workers=1, threads=threads, deduplicate=False)
+        timings = []
+        for _ in range(max(1, repeats)):
+            started = time.perf_counter()
+            predict_models(features, model_df, models_dir, workers=1, threads=threads, deduplicate=False)
+            timings.append(time.perf_counter() - started)
+        latencies[model_df['model_name'].iloc[0]] = 1000 * float(np.median(timings)) / len(features)
+    return pd.Series(latencies, name=LATENCY_COLUMN)
+
+
+def latency_path(predictor, models_dir=MODELS_DIR):
+    """Latency file of *predictor*."""
+    return os.path.join(models_dir, f"{predictor}_latency.json")
+
+
+def save_latencies(predictor, latencies, rows, models_dir=MODELS_DIR):
+    """Writes *latencies* (ms per molecule by model_name) to the latency file and returns its path."""
+    path = latency_path(predictor, models_dir)
+    report = {
+        'predictor': predictor,
+        'reference_rows': rows,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'models': {name: round(float(latency), 4) for name, latency in latencies.items()},
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def merge_latencies(model_table_df, predictor, models_dir=MODELS_DIR):
+    """
+    Returns *model_table_df* with a LATENCY_MS column from the latency file
+    of *predictor* (NaN for models that were not profiled).
+    """
+    path = latency_path(predictor, models_dir)
+    latencies = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                latencies = json.load(f).get('models', {})
+        except (OSError, ValueError):
+            latencies = {}
+    return model_table_df.assign(**{LATENCY_COLUMN: model_table_df['model_name'].map(latencies).astype(float)})
+
+
+def expected_rmse(rmse_values, correlation=ERROR_CORRELATION):
+    """Expected RMSE of the average of models with the given RMSEs."""
+    rmse_values = np.asarray(rmse_values, dtype=float)
+    covariance = correlation * np.outer(rmse_values, rmse_values)
+    np.fill_diagonal(covariance, rmse_values ** 2)
+    return float(np.sqrt(covariance.sum())) / len(rmse_values)
+
+
+def _candidate_subsets(count):
+    if count <= EXHAUSTIVE_LIMIT:
+        for mask in range(1, 1 << count):
+            yield [i for i in range(count) if mask >> i & 1]
+    else:
+        # Models ordered by RMSE by the caller; every prefix is a candidate
+        for size in range(1, count + 1):
+            yield list(range(size))
+
+
+def select_models(model_table_df, budget_ms, correlation=ERROR_CORRELATION):
+    """
+    Selects the models of every property within a scoring time budget.
+
+    Every property gets an equal share of *budget_ms* (milliseconds per
+    molecule for all properties). Of the subsets of its models whose summed
+    LATENCY_MS fits the share, the one with the lowest expected_rmse() is
+    kept, the faster one on ties. If not even one model fits, the fastest
+    model is kept.
+
+    Parameters:
+    - model_table_df (pd.DataFrame): Models table with a LATENCY_MS column.
+    - budget_ms (float): Scoring time per molecule.
+    - correlation (float): Assumed error correlation of two models.
+
+    Returns:
+    - selected (pd.Series): True for the selected models, indexed like
+      *model_table_df*.
+    """
+    if LATENCY_COLUMN not in model_table_df.columns or model_table_df[LATENCY_COLUMN].isna().any():
+        raise ValueError("The models have not been profiled. Run "
+                         "'python logD_predictor_bin/model_latency.py --predictor <predictor>' first.")
+    properties = model_table_df['property'].unique()
+    share = budget_ms / max(1, len(properties))
+    selected = pd.Series(False, index=model_table_df.index)
+    for prop_value in properties:
+        models = model_table_df[model_table_df['property'] == prop_value]
+        rmse = models['RMSE'] if 'RMSE' in models.columns else pd.Series(1.0, index=models.index)
+        # Models without an RMSE are treated like the worst one
+        rmse = rmse.astype(float).fillna(rmse.max() if rmse.notna().any() else 1.0)
+        models = models.assign(_rmse=rmse).sort_values('_rmse', kind='stable')
+        latency = models[LATENCY_COLUMN].to_numpy(dtype=float)
+        best = None
+        for subset in _candidate_subsets(len(models)):
+            cost = latency[subset].sum()
+            if cost > share:
+                continue
+            key = (expected_rmse(models['_rmse'].to_numpy()[subset], correlation), cost)
+            if best is None or key < best[0]:
+                best = (key, subset)
+        subset = best[1] if best is not None else [int(np.argmin(latency))]
+        selected[models.index[subset]] = True
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures the scoring time of every model of <predictor>_models_info.csv and stores it "
+                    "in <predictor>_latency.json.")
+    parser.add_argument(
+        "--predictor",
+        nargs='+',
+        default=None,
+        choices=list(FEATURE_COUNTS),
+        help="Representations to profile (default: every one with a models table)."
+    )
+    parser.add_argument(
+        "--models-dir",
+        default=MODELS_DIR,
+        help="Directory with the models tables and model files (default: joblib_models)."
+    )
+    parser.add_argument(
+        "--features",
+        default=None,
+        help="Merged dataset CSV (MOLECULE_NAME and feature columns) to time the models on "
+             "(default: a synthetic matrix of --rows molecules)."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=PROFILE_ROWS,
+        help=f"Molecules of the synthetic reference matrix (default: {PROFILE_ROWS})."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=PROFILE_REPEATS,
+        help=f"Timed repetitions per model; the median is stored (default: {PROFILE_REPEATS})."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="CPU threads of the timed model (default: all CPUs). Use the setting of the production runs."
+    )
+    args = parser.parse_args()
+
+    import thread_budget
+    thread_budget.configure(args.threads)
+
+    predictors = args.predictor or [p for p in FEATURE_COUNTS
+                                    if os.path.exists(os.path.join(args.models_dir, f"{p}_models_info.csv"))]
+    if not predictors:
+        print(f"{COLORS[1]}No *_models_info.csv tables found in {args.models_dir}.{RESET}")
+        return
+
+    for predictor in predictors:
+        model_table_df = read_model_table(os.path.join(args.models_dir, f"{predictor}_models_info.csv"))
+        try:
+            features = (read_reference_features(args.features, predictor) if args.features
+                        else reference_features(predictor, args.rows))
+        except ValueError as e:
+            print(f"{COLORS[1]}{e}{RESET}")
+            raise SystemExit(1)
+        print(f"Profiling {COLORS[2]}{predictor}{RESET} models on {len(features)} molecules ...")
+        latencies = profile_models(model_table_df, features, args.models_dir, args.repeats)
+        for model_name, latency in latencies.items():
+            print(f"   {model_name:<40} {latency:>10.4f} ms/molecule")
+        path = save_latencies(predictor, latencies, len(features), args.models_dir)
+        print(f"{COLORS[0]}Latencies saved in {path}{RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
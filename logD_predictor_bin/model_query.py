@@ -1,17 +1,342 @@
+import hashlib
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
-import matplotlib.pyplot as plt
-import sys
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# W głównym skrypcie
-from SVR_predict import model_predictor as SVR_predictor
-from XGB_predict import model_predictor as XGB_predictor
-from DNN_predict import model_predictor as DNN_predictor
-from CNN_predict import model_predictor as CNN_predictor
+import thread_budget
+from charts import CHART_DETAIL_LIMIT, open_image, save_chart
+from profiler import timed_import
+from result_writer import write_results
+from run_journal import PART_SUFFIX, publish, remove_partial
 
-def query(dataset, predictor, show_models_table=False, quiet=False, chart=False, use_svr=False, use_xgb=False, use_dnn=False, use_cnn=False):
+# Directory holding the <predictor>_models_info.csv tables and model files
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "joblib_models")
+
+# Modules implementing load_model() / predict() for every ML algorithm.
+# They are imported on first use, so torch / xgboost / sklearn are only
+# loaded when a model of that family is actually queried.
+ALGORITHM_MODULES = {
+    "SVR": "SVR_predict",
+    "XGB": "XGB_predict",
+    "DNN": "DNN_predict",
+    "CNN": "CNN_predict"
+}
+
+# Number of features produced by every representation
+FEATURE_COUNTS = {'1H': 250, '13C': 250, 'hybrid': 500, 'FP': 2048}
+
+# Order of the properties in the summary tables
+DESIRED_PROPERTIES = ['CHI_logD_pH_2.6', 'CHI_logD_pH_7.4', 'CHI_logD_pH_10.5']
+
+# Molecules per saved chunk of model scores of a checkpointed run
+SCORE_CHUNK_SIZE = 5000
+
+# Rows of the per-model predictions printed to the console
+CONSOLE_PREVIEW_ROWS = 20
+
+# Models loaded in this process, keyed by (ML_algorithm, model_path, input_dim)
+_MODEL_CACHE = {}
+
+
+def algorithm_module(ml_algorithm):
+    """Returns the (lazily imported) prediction module of *ml_algorithm*."""
+    return timed_import(ALGORITHM_MODULES[ml_algorithm])
+
+
+def read_model_table(model_table_path):
+    """
+    Reads and validates a <predictor>_models_info.csv table.
+
+    Parameters:
+    - model_table_path (str): Path to the models table.
+
+    Returns:
+    - model_table_df (pd.DataFrame): Table with the metric columns rounded.
+    """
+    model_table_df = pd.read_csv(model_table_path, sep=';', decimal='.')
+
+    # Checking that the 'model_path' and 'model_name' columns exist and are of string type
+    required_columns = ['model_path', 'model_name', 'ML_algorithm', 'property']
+    for col in required_columns:
+        if col not in model_table_df.columns:
+            raise ValueError(f'Error: Column "{col}" does not exist in DataFrame. Check your {model_table_path} file.')
+        if not pd.api.types.is_string_dtype(model_table_df[col]):
+            raise ValueError(f'Error: Column "{col}" is not of type string. Check your model data: {model_table_path}')
+
+    columns_to_round = ['RMSE', 'MAE', 'Q2', 'PEARSON']
+    for col in columns_to_round:
+        if col in model_table_df.columns and pd.api.types.is_numeric_dtype(model_table_df[col]):
+            model_table_df[col] = model_table_df[col].round(4)
+
+    return model_table_df
+
+
+def load_model_table(predictor, models_dir=MODELS_DIR, algorithms=None):
+    """
+    Returns the models table of *predictor*. If an up-to-date compiled
+    bundle exists (see model_bundle.py), the models of the selected
+    *algorithms* are taken from it and put into the model cache, so
+    get_model() does not load the original files.
+    """
+    from model_bundle import load_bundle
+
+    input_dim = FEATURE_COUNTS.get(predictor)
+    skip = {os.path.relpath(key[1], models_dir) for key in _MODEL_CACHE if key[2] == input_dim}
+    bundle = load_bundle(predictor, models_dir, algorithms, skip)
+    if bundle is None:
+        return read_model_table(os.path.join(models_dir, f"{predictor}_models_info.csv"))
+
+    model_table_df, models, input_dim = bundle
+    for _, row in model_table_df.iterrows():
+        if row['model_path'] in models:
+            key = (row['ML_algorithm'], os.path.join(models_dir, row['model_path']), input_dim)
+            _MODEL_CACHE[key] = models[row['model_path']]
+    return model_table_df
+
+
+def get_model(ml_algorithm, model_path, input_dim, quantized=False, nthread=None):
+    """
+    Returns the loaded model, loading it on first use only. Later calls in
+    the same process reuse the cached object. With *quantized*, the int8
+    version of a DNN/CNN network is returned (see quantization.py). With
+    *nthread*, an XGBoost booster configured for that many threads is
+    returned; it is cached per thread count and never reconfigured.
+    """
+    if quantized:
+        key = (ml_algorithm, model_path, input_dim, 'int8')
+        if key not in _MODEL_CACHE:
+            from quantization import quantize_model
+            # Quantised from the original network, not from a compiled bundle
+            model = algorithm_module(ml_algorithm).load_model(model_path, input_dim)
+            _MODEL_CACHE[key] = quantize_model(model)
+        return _MODEL_CACHE[key]
+    key = (ml_algorithm, model_path, input_dim)
+    if key not in _MODEL_CACHE:
+        _MODEL_CACHE[key] = algorithm_module(ml_algorithm).load_model(model_path, input_dim)
+    if ml_algorithm != 'XGB' or nthread is None:
+        return _MODEL_CACHE[key]
+    threaded_key = key + (f'nthread={nthread}',)
+    if threaded_key not in _MODEL_CACHE:
+        _MODEL_CACHE[threaded_key] = algorithm_module(ml_algorithm).with_nthread(_MODEL_CACHE[key], nthread)
+    return _MODEL_CACHE[threaded_key]
+
+
+def distinct_rows(features):
+    """
+    Finds the bit-identical rows of a feature matrix.
+
+    Returns:
+    - (first, inverse): Positions of the distinct rows (first occurrence, in
+      input order) and, for every row, the index of its distinct row.
+    """
+    values = np.ascontiguousarray(features.to_numpy(dtype=float))
+    if values.shape[0] == 0 or values.shape[1] == 0:
+        return np.arange(min(values.shape[0], 1)), np.zeros(values.shape[0], dtype=int)
+    # One opaque bytes key per row
+    keys = values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.ravel()]
+
+
+def predict_models(features, model_table_df, models_dir=MODELS_DIR, workers=None, threads=None, deduplicate=True,
+                   quantized=()):
+    """
+    Evaluates every model of *model_table_df* on the whole feature matrix.
+
+    Molecules often share bit-identical feature rows (equal bucketed
+    spectra or fingerprints). With *deduplicate*, every distinct row is
+    evaluated once per model and the predictions are copied to all
+    molecules sharing it.
+
+    The models run concurrently on a thread pool (SVR, XGB and Torch
+    release the GIL in their native kernels), so for a small batch the
+    latency approaches that of the slowest model. The *threads* budget is
+    split between the running models so that XGBoost, Torch and BLAS do not
+    oversubscribe the cores.
+
+    Parameters:
+    - features (pd.DataFrame): FEATURE_* columns, one row per molecule.
+    - model_table_df (pd.DataFrame): Models to query.
+    - models_dir (str): Directory the 'model_path' entries are relative to.
+    - workers (int): Models evaluated at the same time (default: one per
+      model, at most one per CPU; 1 runs them one after another).
+    - threads (int): Total CPU threads of all models (default: the budget
+      of thread_budget.configure(), i.e. all CPUs unless limited).
+    - deduplicate (bool): Evaluate identical feature rows only once.
+    - quantized (set): 'model_path' entries of the models evaluated in int8.
+
+    Returns:
+    - predictions (pd.DataFrame): One column per model name, rounded to
+      two decimals, indexed like *features*. predictions.attrs holds the
+      number of 'scored_rows' and of 'distinct_rows' evaluated.
+    """
+    features = features.astype(float)
+    inverse = None
+    scored = features
+    if deduplicate and len(features) > 1:
+        first, inverse = distinct_rows(features)
+        if len(first) < len(features):
+            scored = features.iloc[first]
+        else:
+            inverse = None
+
+    threads = threads or thread_budget.budget()
+    workers = max(1, min(len(model_table_df), workers or threads))
+    threads_per_model = thread_budget.share(threads, workers)
+
+    # Models are loaded up front, one after another, and cached
+    jobs = []
+    for _, row in model_table_df.iterrows():
+        model_path = os.path.join(models_dir, row['model_path'])
+        module = algorithm_module(row['ML_algorithm'])
+        # An explicit --xgb-threads setting takes precedence over the budget
+        nthread = (module.NTHREAD or threads_per_model) if row['ML_algorithm'] == 'XGB' else None
+        model = get_model(row['ML_algorithm'], model_path, features.shape[1], row['model_path'] in quantized, nthread)
+        jobs.append((row['model_name'], row['ML_algorithm'], module, model))
+
+    def run(job):
+        model_name, ml_algorithm, module, model = job
+        return module.predict(model, scored)
+
+    with thread_budget.limit_threads(threads_per_model):
+        if workers == 1:
+            values = [run(job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ensemble') as executor:
+                values = list(executor.map(run, jobs))
+
+    predictions = pd.DataFrame(index=features.index)
+    for (model_name, _, _, _), model_values in zip(jobs, values):
+        model_values = np.round(model_values, 2)
+        predictions[model_name] = model_values[inverse] if inverse is not None else model_values
+    predictions.attrs.update(scored_rows=len(features), distinct_rows=len(scored))
+    return predictions
+
+
+def _read_score_chunk(path, molecule_names, model_names):
+    """Scores saved by predict_checkpointed(), or None if missing or not matching."""
+    if not os.path.exists(path):
+        return None
+    try:
+        chunk = pd.read_csv(path, dtype={'MOLECULE_NAME': str})
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+        return None
+    if (list(chunk.columns) != ['MOLECULE_NAME'] + model_names
+            or chunk['MOLECULE_NAME'].tolist() != molecule_names.astype(str).tolist()
+            or chunk[model_names].isna().any().any()):
+        return None
+    return chunk[model_names]
+
+
+def predict_checkpointed(features, molecule_names, model_table_df, checkpoint_dir, models_dir=MODELS_DIR,
+                         workers=None, chunk_size=SCORE_CHUNK_SIZE, trace=None, trace_stage='query', quantized=()):
+    """
+    predict_models() in chunks of *chunk_size* molecules. Every chunk is
+    saved in *checkpoint_dir* as soon as it is scored, and chunks saved by
+    an interrupted run are reused if they hold the same molecules and were
+    scored by the same models. With a *trace*, every scored molecule is
+    recorded with the scoring time of its chunk divided by the chunk size.
+
+    Returns:
+    - (predictions, reused): The predictions as returned by predict_models()
+      and the number of reused chunks.
+    """
+    if len(features) == 0:
+        return predict_models(features, model_table_df, models_dir, workers, quantized=quantized), 0
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    remove_partial(checkpoint_dir)
+    model_names = list(model_table_df['model_name'])
+    # int8 models score differently from their float32 versions
+    int8_names = [f"{name}:int8" for name, path in zip(model_names, model_table_df['model_path']) if path in quantized]
+    signature = hashlib.sha1('\n'.join(model_names + int8_names).encode('utf-8')).hexdigest()[:12]
+
+    chunks = []
+    reused = 0
+    scored_rows = distinct = 0
+    for number, start in enumerate(range(0, len(features), chunk_size)):
+        stop = start + chunk_size
+        names = molecule_names.iloc[start:stop]
+        path = os.path.join(checkpoint_dir, f"scores_{signature}_{number:05d}.csv")
+        chunk = _read_score_chunk(path, names, model_names)
+        if chunk is None:
+            started = trace.timer() if trace is not None else None
+            chunk = predict_models(features.iloc[start:stop], model_table_df, models_dir, workers, quantized=quantized)
+            trace_chunk(trace, trace_stage, names, started, f"chunk {number}")
+            scored_rows += chunk.attrs.get('scored_rows', len(chunk))
+            distinct += chunk.attrs.get('distinct_rows', len(chunk))
+            scores = pd.concat([names.astype(str).rename('MOLECULE_NAME'), chunk], axis=1)
+            scores.to_csv(path + PART_SUFFIX, index=False)
+            publish(path + PART_SUFFIX)
+        else:
+            reused += 1
+        chunk.index = features.index[start:stop]
+        chunks.append(chunk)
+    predictions = pd.concat(chunks)
+    predictions.attrs = {'scored_rows': scored_rows, 'distinct_rows': distinct}
+    return predictions, reused
+
+
+def trace_chunk(trace, stage, molecule_names, started, detail=''):
+    """Records the time since *started* (trace.timer()), shared equally by *molecule_names*."""
+    if trace is None or started is None or len(molecule_names) == 0:
+        return
+    seconds = (time.perf_counter() - started) / len(molecule_names)
+    detail = f"{detail}, {len(molecule_names)} molecules".lstrip(', ')
+    for name in molecule_names:
+        trace.add(stage, name, seconds, detail)
+
+
+def preview_table(table, rows=CONSOLE_PREVIEW_ROWS):
+    """First *rows* rows of *table* as text, followed by the number of rows left out."""
+    text = table.head(rows).to_string(index=False)
+    if len(table) > rows:
+        text += f"\n… {len(table) - rows} more rows (see the result files)"
+    return text
+
+
+def summarize_predictions(predictions, model_table_df):
+    """
+    Computes the per-property Average and StdDev of the model predictions.
+
+    Returns:
+    - summary (pd.DataFrame): '<property>_Average' and '<property>_StdDev'
+      columns, indexed like *predictions*.
+    """
+    columns = {}
+    for prop_value in model_table_df['property'].unique():
+        model_names = model_table_df.loc[model_table_df['property'] == prop_value, 'model_name']
+        values = predictions[list(model_names)].to_numpy(dtype=float)
+        columns[f'{prop_value}_Average'] = np.round(values.mean(axis=1), 2)
+        # Sample standard deviation like pandas; undefined (NaN) for a single model
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = values.std(axis=1, ddof=1) if values.shape[1] > 1 else np.full(len(values), np.nan)
+        columns[f'{prop_value}_StdDev'] = np.round(std, 2)
+    return pd.DataFrame(columns, index=predictions.index)
+
+
+def write_molecule_files(molecule_names, predictions, summary, model_table_df, output_dir):
+    """
+    Writes one <molecule>_<property>.csv file per molecule and property with
+    the model predictions, Average and StdDev (opt-in, --per-molecule-files).
+    """
+    for prop_value in model_table_df['property'].unique():
+        model_names = list(model_table_df.loc[model_table_df['property'] == prop_value, 'model_name'])
+        table = pd.concat([molecule_names.rename('MOLECULE_NAME'), predictions[model_names]], axis=1)
+        table['Average'] = summary[f'{prop_value}_Average'].to_numpy()
+        table['StdDev'] = summary[f'{prop_value}_StdDev'].to_numpy()
+        for position, molecule_name in enumerate(molecule_names):
+            table.iloc[[position]].to_csv(os.path.join(output_dir, f'{molecule_name}_{prop_value}.csv'),
+                                          index=False, sep=';')
+
+
+def query(dataset, predictor, show_models_table=False, quiet=False, chart=False, use_svr=False, use_xgb=False, use_dnn=False, use_cnn=False, xgb_threads=None, ensemble_workers=None, per_molecule_files=False, output_format='csv', chart_limit=CHART_DETAIL_LIMIT, checkpoint_dir=None, result_tag=None, trace=None, latency_budget=None, quantize=False):
     
     # Defining the function that controls printing
     def verbose_print(*args, **kwargs):
@@ -30,29 +355,18 @@ def query(dataset, predictor, show_models_table=False, quiet=False, chart=False,
     print("")
 
     model_table_file = f"{predictor}_models_info.csv"
-    model_table_path = os.path.join(os.getcwd(), "logD_predictor_bin", "joblib_models", model_table_file)
+    model_table_path = os.path.join(MODELS_DIR, model_table_file)
     
     if not os.path.exists(model_table_path):
         print(f"{COLORS[1]}File {model_table_path} does not exist. Check your data and add relevant model files and data. {RESET}")
         return None
     
-    model_table_df = pd.read_csv(model_table_path, sep=';', decimal='.')
-    
-    # Checking that the 'model_path' and 'model_name' columns exist and are of string type
-    required_columns = ['model_path', 'model_name', 'ML_algorithm', 'property']
-    for col in required_columns:
-        if col not in model_table_df.columns:
-            raise ValueError(f'{COLORS[1]}Error: Column "{col}" does not exist in DataFrame. Check your {model_table_path} file.{RESET}')
-            return None
-        if not pd.api.types.is_string_dtype(model_table_df[col]):
-            raise ValueError(f'{COLORS[1]}Error: Column "{col}" is not of type string. Check your model data: {model_table_path}{RESET}')
-            return None
+    selected_algorithms = [alg for alg, used in (("SVR", use_svr), ("XGB", use_xgb), ("DNN", use_dnn), ("CNN", use_cnn)) if used]
+    model_table_df = load_model_table(predictor, MODELS_DIR, selected_algorithms)
     
     columns_to_round = ['RMSE', 'MAE', 'Q2', 'PEARSON']
     for col in columns_to_round:
-        if pd.api.types.is_numeric_dtype(model_table_df[col]):
-            model_table_df[col] = model_table_df[col].round(4)
-        else:
+        if not pd.api.types.is_numeric_dtype(model_table_df[col]):
             print(f"\n{COLORS[1]}Error: Column '{col}' is not numeric, it cannot be rounded.{RESET}")
         
     # Create directory for saving results
@@ -61,24 +375,17 @@ def query(dataset, predictor, show_models_table=False, quiet=False, chart=False,
         print(f"\n{COLORS[2]}{ultimate_dir}{RESET} directory has been created.")
         os.makedirs(ultimate_dir, exist_ok=True)
 
-    # Dictionary of predictors
-    origin_predictor_dict = {
-        "SVR": SVR_predictor,
-        "XGB": XGB_predictor,
-        "DNN": DNN_predictor,
-        "CNN": CNN_predictor
-    }
-    
     # Filter the dictionary based on the passed arguments
     predictor_dict = {}
     if use_svr:
-        predictor_dict["SVR"] = origin_predictor_dict["SVR"]
+        predictor_dict["SVR"] = algorithm_module("SVR")
     if use_xgb:
-        predictor_dict["XGB"] = origin_predictor_dict["XGB"]
+        predictor_dict["XGB"] = algorithm_module("XGB")
+        predictor_dict["XGB"].set_nthread(xgb_threads)
     if use_dnn:
-        predictor_dict["DNN"] = origin_predictor_dict["DNN"]
+        predictor_dict["DNN"] = algorithm_module("DNN")
     if use_cnn:
-        predictor_dict["CNN"] = origin_predictor_dict["CNN"]
+        predictor_dict["CNN"] = algorithm_module("CNN")
     
     # Information on active models
     if not predictor_dict:
@@ -93,84 +400,61 @@ def query(dataset, predictor, show_models_table=False, quiet=False, chart=False,
         print(f"{COLORS[1]}No models available for the selected predictors.{RESET}")
         return None
 
-    # The rest of the code remains unchanged
-    # Create dynamic_dfs based on the filtered model_table_df
-    dynamic_dfs = {}
-
-    # Iterating over unique values in 'property' to create dynamic DataFrames
-    for prop_value in model_table_df['property'].unique():
-        filtered_df = model_table_df[model_table_df['property'] == prop_value]
-        df_name = f"df_{prop_value}"
-        dynamic_dfs[df_name] = filtered_df
-
-    # Initialize an empty list to collect results
-    summary_data = []
+    # Per-property subsets of the models within the scoring time budget
+    candidates_df = model_table_df
+    if latency_budget is not None:
+        from model_latency import LATENCY_COLUMN, merge_latencies, select_models
+        model_table_df = merge_latencies(model_table_df, predictor, MODELS_DIR)
+        try:
+            selected = select_models(model_table_df, latency_budget)
+        except ValueError as e:
+            print(f"{COLORS[1]}{e}{RESET}")
+            return None
+        candidates_df = model_table_df.assign(SELECTED=selected)
+        model_table_df = model_table_df[selected]
+        print(f"Latency budget {COLORS[2]}{latency_budget:g} ms{RESET} per molecule: {len(model_table_df)} of "
+              f"{len(candidates_df)} models selected ({model_table_df[LATENCY_COLUMN].sum():.4f} ms per molecule).")
+
+    # int8 versions of the DNN/CNN models that passed the accuracy check
+    quantized = set()
+    if quantize:
+        from quantization import QUANTIZABLE, approved_models
+        quantized = approved_models(predictor, MODELS_DIR) & set(model_table_df['model_path'])
+        candidates = model_table_df['ML_algorithm'].isin(QUANTIZABLE).sum()
+        print(f"int8 inference: {COLORS[2]}{len(quantized)}{RESET} of {candidates} DNN/CNN models "
+              f"(the others are not checked or outside tolerance and run in float32).")
 
-    # Initialize a set to keep track of all properties
-    all_properties = set()
-    
     # Loading dataset containing columns 'MOLECULE_NAME' and 'FEATURES'
-    df = dataset.copy()    
-
-    # Iterating over each row in the dataset
-    for index, structure in df.iterrows():
-        molecule_name = str(structure[structure.index[0]])
-        structure_features = structure.iloc[1:].to_frame().T
-
-        verbose_print(f"\n🧪 structure_features.shape: {structure_features.shape}")
-        verbose_print(f"🧪 structure_features.columns[:5]: {structure_features.columns[:5]}\n")
-
-        # Initialize a dictionary to store results for this molecule
-        molecule_data = {'MOLECULE_NAME': molecule_name}
-
-        # Looping through each 'property' DataFrame in dynamic_dfs
-        for df_name in dynamic_dfs:
-            # Resetting structure_result at the start of each iteration for a new df_name
-            structure_result = pd.DataFrame({structure.index[0]: [structure[structure.index[0]]]})
-
-            for idx, row in dynamic_dfs[df_name].iterrows():
-                model_path = row['model_path']
-                model_name = row['model_name']
-                prop_value = row['property']
-                ml_algorithm = row['ML_algorithm']
-                model_path = os.path.join(os.getcwd(),"logD_predictor_bin", "joblib_models", model_path)
-                
-                model_predictor = predictor_dict[ml_algorithm]
-                predicted_value = round(float(model_predictor(model_path, structure_features, quiet)), 2)
-
-                structure_result[model_name] = predicted_value
-
-            # Collect the property
-            all_properties.add(prop_value)
-
-            # Calculate average and standard deviation of all models for the current property
-            average_value = round(structure_result.iloc[0, 1:].mean(), 2)
-            std_value = round(structure_result.iloc[0, 1:].std(), 2)
-
-            # Add the average and standard deviation to structure_result
-            structure_result_with_average = structure_result.copy()
-            structure_result_with_average['Average'] = average_value
-            structure_result_with_average['StdDev'] = std_value
-
-            # Save results
-            structure_result_path = os.path.join(ultimate_dir, f'{molecule_name}_{prop_value}.csv')
-            structure_result_with_average.to_csv(structure_result_path, index=False, sep=';')
-            
-            verbose_print(f'Property: {COLORS[2]}{prop_value}{RESET} Molecule: {COLORS[2]}{molecule_name}{RESET}')
-            verbose_print(structure_result.to_string(index=False))
-            verbose_print(f'\n   Average value: {COLORS[0]}{average_value}{RESET}')
-            verbose_print(f'   Standard Deviation: {COLORS[0]}{std_value}{RESET}')
-            verbose_print('-----------------------------')
-            
-            # Collect data for summary with string keys
-            molecule_data[f'{prop_value}_Average'] = average_value
-            molecule_data[f'{prop_value}_StdDev'] = std_value
-
-        # Append molecule data to summary_data
-        summary_data.append(molecule_data)
-
-    # After processing all molecules, create summary_results DataFrame
-    summary_results = pd.DataFrame(summary_data)
+    molecule_names = dataset.iloc[:, 0].astype(str).reset_index(drop=True)
+    features = dataset.iloc[:, 1:].reset_index(drop=True)
+    verbose_print(f"\n🧪 features.shape: {features.shape}")
+    verbose_print(f"🧪 features.columns[:5]: {features.columns[:5]}\n")
+
+    # Every model scores the whole feature matrix at once, and the
+    # per-property Average/StdDev are computed over the prediction matrix
+    if checkpoint_dir is None:
+        started = trace.timer() if trace is not None else None
+        predictions = predict_models(features, model_table_df, workers=ensemble_workers, quantized=quantized)
+        trace_chunk(trace, f'query:{predictor}', molecule_names, started)
+    else:
+        predictions, reused = predict_checkpointed(features, molecule_names, model_table_df, checkpoint_dir,
+                                                   workers=ensemble_workers, trace=trace,
+                                                   trace_stage=f'query:{predictor}', quantized=quantized)
+        if reused:
+            verbose_print(f"Reused {reused} scored chunks of the interrupted run.\n")
+    scored_rows, distinct = predictions.attrs.get('scored_rows'), predictions.attrs.get('distinct_rows')
+    summary = summarize_predictions(predictions, model_table_df)
+
+    # One per-model table for the whole run
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    model_results = pd.concat([molecule_names.rename('MOLECULE_NAME'), predictions], axis=1)
+    verbose_print(f"Predictions of the individual models:\n{preview_table(model_results)}\n")
+
+    # Optional per-molecule files, as written by earlier versions
+    if per_molecule_files:
+        write_molecule_files(molecule_names, predictions, summary, model_table_df, ultimate_dir)
+
+    summary_results = pd.concat([molecule_names.rename('MOLECULE_NAME'), summary], axis=1)
 
     # Process columns to create MultiIndex
     columns = []
@@ -186,7 +470,7 @@ def query(dataset, predictor, show_models_table=False, quiet=False, chart=False,
 
     # Reorder columns if desired
     # Define the desired order of properties
-    desired_properties = ['CHI_logD_pH_2.6', 'CHI_logD_pH_7.4', 'CHI_logD_pH_10.5']
+    desired_properties = DESIRED_PROPERTIES
 
     # Create the list of desired columns
     columns = [('MOLECULE_NAME', '')]
@@ -209,77 +493,41 @@ def query(dataset, predictor, show_models_table=False, quiet=False, chart=False,
         print(f"Predicted on {COLORS[2]}RDKit Fingerprints{RESET} ML Models")
     print(f"{COLORS[2]}------------------------------------------\n{RESET}")
     print(summary_results.to_string(index=False))
-    summary_results.to_csv(os.path.join(ultimate_dir, f"summary_results_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"), sep=';')
+    # Columnar formats store flat column names
+    summary_flat = summary_results.copy()
+    summary_flat.columns = [prop if not stat else f'{prop}_{stat}' for prop, stat in summary_results.columns]
+    try:
+        result_paths = write_results(summary_flat, summary_results, model_results, model_table_df, ultimate_dir,
+                                     timestamp, predictor, output_format, result_tag)
+    except ImportError:
+        print(f"\n{COLORS[1]}Saving {output_format} files requires pyarrow (pip install pyarrow). "
+              f"The results are saved as CSV instead.{RESET}")
+        result_paths = write_results(summary_flat, summary_results, model_results, model_table_df, ultimate_dir,
+                                     timestamp, predictor, 'csv', result_tag)
+    if scored_rows:
+        print(f"\nScored {COLORS[2]}{distinct}{RESET} distinct feature rows for {scored_rows} molecules "
+              f"(deduplication ratio {scored_rows / max(distinct, 1):.2f}).")
     print(f'\nResults files saved in {COLORS[2]}{ultimate_dir}{RESET}\n')
 
     if show_models_table:
         print(f"Option {COLORS[2]}--models{RESET} has not been selected. The script will display below a table"
               f" with details and training metrics for the ML models used.\n")
         
-        df_show_models = model_table_df.copy()
+        df_show_models = candidates_df.copy()
         df_show_models = df_show_models.drop('model_path', axis=1)
         df_show_models[['model_name', 'ML_algorithm', 'property']] = df_show_models[['model_name', 'ML_algorithm', 'property']].astype('string')
         print(df_show_models)
         print('\n\n')
 
-    # List of colors for charts
-    colors = ['red', 'green', 'blue']
-
     if chart:
-
-        # Generating charts
-        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-        fig.subplots_adjust(wspace=0.2)  
-
-        for i, (ax, prop, color) in enumerate(zip(axes, desired_properties, colors)):
-            # Get the data for the property in question
-            x = summary_results['MOLECULE_NAME']
-            y = summary_results[(prop, 'Average')]
-            yerr = summary_results[(prop, 'StdDev')]
-
-            # Spot chart with “whiskers” of error
-            ax.errorbar(x, y, yerr=yerr, fmt='o', capsize=5, color=color, ecolor='black')
-            ax.set_title(prop, fontweight='bold')
-            ax.set_xlabel('Molecule name/ID', fontweight='bold')
-            ax.set_ylabel('Average logD values', fontweight='bold')
-
-            # Y-axis number format settings
-            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.1f}'))
-
-            # Rotate the X-axis labels, if necessary.
-            ax.tick_params(axis='x', rotation=90)
-
-        if predictor == '1H':
-            predictor_title = '¹H'
-        elif predictor == '13C':
-            predictor_title = '¹³C'
-        elif predictor == 'hybrid':
-            predictor_title = '¹H and ¹³C'
-        else:
-            predictor_title = 'RDKit Fingerprints'
-
-        fig.suptitle(f"Average logD values from {predictor_title} representation Predictor", fontweight='bold', fontsize=16)
-
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        # Save the chart
-        chart_file_path = os.path.join(ultimate_dir, 'summary_results_plot.png')
-        plt.savefig(chart_file_path)
-
+        chart_file_path = save_chart(summary_results, desired_properties, predictor, ultimate_dir, chart_limit)
         print(f"Plot saved as {chart_file_path}")
-            
+
         # Open the saved image in your default image viewer program
         try:
-            if sys.platform.startswith('win'):
-                # Windows
-                os.startfile(chart_file_path)
-            elif sys.platform.startswith('linux'):
-                # Linux
-                subprocess.call(['xdg-open', chart_file_path])
-            elif sys.platform.startswith('darwin'):
-                # macOS
-                subprocess.call(['open', chart_file_path])
-            else:
-                print("Unsupported operating system. Cannot open the image automatically.")
+            if not open_image(chart_file_path):
+                print("No display available. The plot is not opened automatically.")
         except Exception as e:
             print(f"Could not open image file: {e}")
 
+    return result_paths
@@ -0,0 +1,153 @@
+# molecule_trace.py
+
+"""
+Per-molecule tracing of the prediction pipeline (--trace).
+
+The stage profiler (profiler.py) reports how long every stage took in
+total; the trace shows which molecules the time went to. With --trace the
+pipeline records the wall time of every molecule in
+
+- generate_mol_files, with the route taken (RDKit, OpenBabel fallback and
+  why, or the error),
+- predict_spectra, measured around processMolFile() inside the Java
+  BatchProcessor (or per file by the lookup backend),
+- bucket,
+- query, the scoring time of the chunk of the molecule divided by its
+  number of molecules (the models score whole chunks at once).
+
+The records are written as one tab-separated trace_<timestamp>.tsv file
+(stage, molecule, milliseconds, detail) next to the results, and a report
+with the slowest molecules and a histogram of the per-molecule times of
+every stage is printed at the end of the run.
+"""
+
+import os
+import time
+from datetime import datetime
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+# Slowest molecules listed in the report
+TOP_N = 10
+
+# Upper edges (ms) of the histogram bins; the last bin is open
+HISTOGRAM_EDGES_MS = [1, 3, 10, 30, 100, 300, 1000, 3000, 10000, 30000]
+
+HISTOGRAM_WIDTH = 40
+
+
+def read_java_times(path):
+    """
+    Reads the '<file>.mol<TAB><milliseconds>[<TAB>detail]' lines written by
+    the Java BatchProcessor (-Dlogd.trace) and deletes the file.
+
+    Returns:
+    - records (list): (molecule, seconds, detail) per processed molecule.
+    """
+    if path is None or not os.path.exists(path):
+        return []
+    records = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            try:
+                name, milliseconds = parts[0], float(parts[1])
+            except (IndexError, ValueError):
+                continue  # last line of a killed JVM
+            if name.endswith('.mol'):
+                name = name[:-len('.mol')]
+            records.append((name, milliseconds / 1000, parts[2] if len(parts) > 2 else ''))
+    os.remove(path)
+    return records
+
+
+class MoleculeTrace:
+    """
+    Collects per-molecule timings.
+
+    Parameters:
+    - enabled (bool): If False, add() does nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []
+        self._timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    def add(self, stage, molecule, seconds, detail=''):
+        """Records *seconds* spent on *molecule* in *stage* (e.g. 'bucket:1H')."""
+        if self.enabled:
+            detail = ' '.join(str(detail or '').split())  # one line, no tabs
+            self.records.append((stage, str(molecule), float(seconds), detail))
+
+    def timer(self):
+        """Start time for add_since(), or None when tracing is disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def add_since(self, stage, molecule, start, detail=''):
+        """Records the time since *start* (see timer())."""
+        if start is not None:
+            self.add(stage, molecule, time.perf_counter() - start, detail)
+
+    def stages(self):
+        """Traced stages in the order they were first recorded."""
+        return list(dict.fromkeys(stage for stage, _, _, _ in self.records))
+
+    def slowest(self, n=TOP_N, stage=None):
+        """The *n* slowest records (of *stage*, or of all stages)."""
+        records = [r for r in self.records if stage is None or r[0] == stage]
+        return sorted(records, key=lambda r: -r[2])[:n]
+
+    def histogram(self, stage):
+        """Number of molecules of *stage* per HISTOGRAM_EDGES_MS bin (plus one open bin)."""
+        counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+        for record_stage, _, seconds, _ in self.records:
+            if record_stage != stage:
+                continue
+            milliseconds = seconds * 1000
+            index = next((i for i, edge in enumerate(HISTOGRAM_EDGES_MS) if milliseconds < edge),
+                         len(HISTOGRAM_EDGES_MS))
+            counts[index] += 1
+        return counts
+
+    def format_report(self, n=TOP_N):
+        """Returns the slowest molecules and the histogram of every stage as text."""
+        lines = [f"{COLORS[2]}Slowest molecules{RESET}",
+                 f"{'stage':<24} {'molecule':<24} {'ms':>10}  detail"]
+        for stage, molecule, seconds, detail in self.slowest(n):
+            lines.append(f"{stage:<24} {molecule:<24} {seconds * 1000:>10.1f}  {detail}")
+
+        labels = [f"< {edge} ms" for edge in HISTOGRAM_EDGES_MS] + [f">= {HISTOGRAM_EDGES_MS[-1]} ms"]
+        for stage in self.stages():
+            counts = self.histogram(stage)
+            total_ms = sum(r[2] for r in self.records if r[0] == stage) * 1000
+            lines.append(f"\n{COLORS[2]}{stage}{RESET}: {sum(counts)} molecules, {total_ms:.0f} ms")
+            used = [i for i, count in enumerate(counts) if count]
+            if not used:
+                continue
+            largest = max(counts)
+            # Bins between the first and the last non-empty one
+            for i in range(used[0], used[-1] + 1):
+                bar = '█' * max(1 if counts[i] else 0, round(HISTOGRAM_WIDTH * counts[i] / largest))
+                lines.append(f"  {labels[i]:>12} {counts[i]:>7} {bar}")
+        return '\n'.join(lines)
+
+    def write(self, output_dir):
+        """
+        Writes trace_<timestamp>.tsv to *output_dir*. Returns its path, or
+        None if tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        trace_path = os.path.join(output_dir, f"trace_{self._timestamp}.tsv")
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            f.write("stage\tmolecule\tms\tdetail\n")
+            for stage, molecule, seconds, detail in self.records:
+                f.write(f"{stage}\t{molecule}\t{seconds * 1000:.1f}\t{detail}\n")
+        return trace_path
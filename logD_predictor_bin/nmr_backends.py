@@ -0,0 +1,417 @@
+# nmr_backends.py
+
+"""
+Pluggable NMR spectrum prediction backends.
+
+A backend takes a directory of .mol files and writes, for every molecule,
+a <molecule>.csv file with one predicted chemical shift per line (one line
+per H atom for 1H, per C atom for 13C). This is the input expected by
+bucket(). A shift file is written under a temporary *.part name and
+renamed when complete, so an interrupted prediction can be resumed (see
+SpectrumBackend.resume()).
+
+Available backends:
+- 'java'   – the NMRShiftDB2 BatchProcessor (predictorh.jar / predictorc.jar),
+             used for real predictions.
+- 'lookup' – a deterministic, pure-Python atom-environment lookup table. Its
+             shifts are only rough estimates and must not be used for logD
+             predictions; it exists to benchmark and load-test the downstream
+             stages (bucketing, merging, model_query) without Java.
+"""
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import thread_budget
+from molecule_trace import read_java_times
+from predictor import MOLECULE_TIMEOUT, run_java_batch_processor
+from run_journal import PART_SUFFIX, publish, remove_partial
+from scheduler import CostModel, mol_file_descriptors, partition
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+
+def link_files(directory, filenames, target_directory):
+    """
+    Creates *target_directory* with hard links (or copies) of the
+    *filenames* of *directory* and returns it.
+    """
+    shutil.rmtree(target_directory, ignore_errors=True)
+    os.makedirs(target_directory)
+    for filename in filenames:
+        source = os.path.join(directory, filename)
+        target = os.path.join(target_directory, filename)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return target_directory
+
+
+class SpectrumBackend:
+    """
+    Base class of the spectrum prediction backends.
+
+    Subclasses implement predict(), which returns the folder with the
+    per-molecule shift CSV files, or None if the prediction failed.
+    """
+
+    name = None
+
+    def predict(self, mol_directory, predictor, quiet=False, work_dir=None):
+        raise NotImplementedError
+
+    @staticmethod
+    def output_folder(predictor, work_dir=None):
+        """Creates and returns the predicted_spectra_<predictor> folder."""
+        csv_output_folder = os.path.join(work_dir or os.getcwd(), f"predicted_spectra_{predictor}")
+        os.makedirs(csv_output_folder, exist_ok=True)
+        return csv_output_folder
+
+    def resume(self, mol_directory, predictor, quiet=False, work_dir=None):
+        """
+        Continues an interrupted predict(): the complete shift files are
+        kept and only the molecules without one are predicted.
+        """
+        work_dir = work_dir or os.getcwd()
+        csv_output_folder = self.output_folder(predictor, work_dir)
+        remove_partial(csv_output_folder)
+        done = {filename[:-len('.csv')] for filename in os.listdir(csv_output_folder) if filename.endswith('.csv')}
+        pending = [filename for filename in os.listdir(mol_directory)
+                   if filename.endswith('.mol') and filename[:-len('.mol')] not in done]
+        if not quiet:
+            print(f"\nReusing {len(done)} predicted {predictor} spectra, {len(pending)} molecules left.")
+        if not pending:
+            return csv_output_folder
+
+        # The backends predict every .mol file of a directory
+        pending_directory = link_files(mol_directory, pending, os.path.join(work_dir, f"pending_mols_{predictor}"))
+        try:
+            return self.predict(pending_directory, predictor, quiet, work_dir)
+        finally:
+            shutil.rmtree(pending_directory, ignore_errors=True)
+
+
+class JavaBackend(SpectrumBackend):
+    """
+    NMRShiftDB2 prediction through the Java BatchProcessor classes.
+
+    The BatchProcessor is compiled on the first call for every nucleus and
+    reused afterwards.
+
+    With workers > 1 the MOL files are split into that many parts of
+    similar estimated cost (see scheduler.py) and one BatchProcessor runs per
+    part, each with its share of the thread budget. The measured time of
+    every part refines the cost model of the nucleus.
+
+    Parameters:
+    - silent (bool): If True, console output of javac/java is discarded.
+    - java_options (list): JVM options (heap, threads), see
+      thread_budget.java_options(). Defaults to a 1 GB heap.
+    - workers (int): Number of concurrent BatchProcessor runs.
+    - cost_model (CostModel): Cost model of the split (None = prior only).
+    - timeout (float): Time limit (seconds) of one molecule; a BatchProcessor
+      that exceeds it or crashes is restarted after the molecule.
+    - trace (MoleculeTrace): Receives the processing time of every molecule.
+    - shift_cache (int): Atom environments (HOSE codes) whose predicted shift
+      the BatchProcessor keeps for reuse by later atoms (0 = off). Only
+      applied to 2D predictions (use3d=False).
+    - symmetry_reuse (bool): If True, one atom per class of topologically
+      equivalent atoms is predicted and its shift used for the whole class.
+      The BatchProcessor only applies it to 2D predictions (use3d=False).
+    - verify_reuse (bool): If True, atoms that would take a cached or
+      symmetry-equivalent shift are still predicted and compared, and the
+      number of differences is reported.
+    - use3d (bool): If False, the shifts are predicted from the 2D structure
+      instead of the 3D coordinates of the MOL files.
+    """
+
+    name = 'java'
+
+    # Fewer MOL files per part than this are predicted in one run
+    MIN_PART_SIZE = 20
+
+    def __init__(self, silent=False, java_options=None, workers=1, cost_model=None, timeout=MOLECULE_TIMEOUT,
+                 trace=None, shift_cache=0, symmetry_reuse=False, verify_reuse=False, use3d=True):
+        self.silent = silent
+        self.use3d = use3d
+        self.trace = trace
+        self.timeout = timeout
+        self.java_options = java_options
+        reuse_options = []
+        if shift_cache:
+            reuse_options.append(f'-Dlogd.cache={int(shift_cache)}')
+            if verify_reuse:
+                reuse_options.append('-Dlogd.cache.verify=true')
+        if symmetry_reuse:
+            reuse_options.append('-Dlogd.symmetry=true')
+            if verify_reuse:
+                reuse_options.append('-Dlogd.symmetry.verify=true')
+        if reuse_options:
+            self.java_options = [*(java_options or ['-Xmx1g']), *reuse_options]
+        self.workers = max(1, int(workers or 1))
+        self.cost_model = cost_model
+        self._compiled = set()
+
+    def predict(self, mol_directory, predictor, quiet=False, work_dir=None):
+        filenames = sorted(f for f in os.listdir(mol_directory) if f.endswith('.mol'))
+        parts = min(self.workers, len(filenames) // self.MIN_PART_SIZE)
+        if parts <= 1:
+            trace_path = self._trace_path(mol_directory, predictor, work_dir)
+            csv_output_folder = run_java_batch_processor(
+                mol_directory, predictor, quiet, work_dir,
+                compile_sources=predictor not in self._compiled, silent=self.silent,
+                java_options=self.java_options, timeout=self.timeout, trace_path=trace_path, use3d=self.use3d)
+            self._read_trace(trace_path, predictor)
+        else:
+            csv_output_folder = self._predict_parts(mol_directory, filenames, parts, predictor, quiet, work_dir)
+        if csv_output_folder is not None:
+            self._compiled.add(predictor)
+        return csv_output_folder
+
+    def _trace_path(self, mol_directory, predictor, work_dir, timings=False):
+        """
+        File of the per-molecule times of the BatchProcessor, or None if
+        neither tracing nor the cost model (*timings*) needs them.
+        """
+        if not timings and (self.trace is None or not self.trace.enabled):
+            return None
+        name = os.path.basename(os.path.normpath(mol_directory))
+        return os.path.join(work_dir or os.getcwd(), f"{name}_{predictor}.trace")
+
+    def _read_trace(self, trace_path, predictor):
+        """Per-molecule times of the BatchProcessor, also added to the trace."""
+        records = read_java_times(trace_path)
+        if self.trace is not None:
+            for name, seconds, detail in records:
+                self.trace.add(f'predict_spectra:{predictor}', name, seconds, detail)
+        return records
+
+    def _predict_parts(self, mol_directory, filenames, parts, predictor, quiet, work_dir):
+        """Runs one BatchProcessor per part of *filenames*, balanced by estimated cost."""
+        work_dir = work_dir or os.getcwd()
+        if predictor not in self._compiled:
+            if run_java_batch_processor(mol_directory, predictor, quiet, work_dir, silent=self.silent,
+                                        java_options=self.java_options, run=False) is None:
+                return None
+            self._compiled.add(predictor)
+
+        stage = f'predict_spectra_{predictor}'
+        rows = [mol_file_descriptors(os.path.join(mol_directory, f)) for f in filenames]
+        model = self.cost_model
+        costs = (model or CostModel(path=None)).estimate(stage, rows).tolist()
+        groups = [group for group in partition(costs, parts) if group]
+
+        # Each JVM gets its share of the thread budget
+        threads = thread_budget.share(thread_budget.budget(), len(groups))
+        java_options = [option for option in (self.java_options or ['-Xmx1g'])
+                        if not option.startswith('-XX:ActiveProcessorCount=')]
+        java_options.append(f'-XX:ActiveProcessorCount={threads}')
+
+        def run_part(number, group):
+            part_directory = link_files(mol_directory, [filenames[i] for i in group],
+                                        os.path.join(work_dir, f"mols_{predictor}_part{number}"))
+            trace_path = self._trace_path(part_directory, predictor, work_dir, timings=model is not None)
+            start = time.perf_counter()
+            try:
+                return run_java_batch_processor(part_directory, predictor, quiet, work_dir, compile_sources=False,
+                                                silent=self.silent, java_options=java_options,
+                                                timeout=self.timeout, trace_path=trace_path, use3d=self.use3d)
+            finally:
+                records = self._read_trace(trace_path, predictor)
+                if model is not None and records:
+                    # One sample per molecule, timed around processMolFile() in the JVM
+                    positions = {filenames[i][:-len('.mol')]: i for i in group}
+                    timed = [(positions[name], seconds) for name, seconds, _ in records if name in positions]
+                    model.add_samples(stage, [rows[i] for i, _ in timed], [seconds for _, seconds in timed])
+                elif model is not None:
+                    # The model is linear, so a part is one sample: summed descriptors, total time
+                    model.add_samples(stage, [[sum(column) for column in zip(*(rows[i] for i in group))]],
+                                      [time.perf_counter() - start])
+                shutil.rmtree(part_directory, ignore_errors=True)
+
+        if not quiet:
+            print(f"\nPredicting {predictor} spectra in {COLORS[2]}{len(groups)}{RESET} parallel parts "
+                  f"({threads} threads each).")
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            folders = list(executor.map(run_part, range(1, len(groups) + 1), groups))
+        return folders[0]
+
+
+class LookupBackend(SpectrumBackend):
+    """
+    Deterministic stand-in predicting shifts from the local atom environment
+    (element, hybridisation, aromaticity, attached hydrogens and neighbouring
+    heteroatoms) with a small increment table. Needs RDKit only.
+
+    Parameters:
+    - silent (bool): If True, nothing is printed.
+    - trace (MoleculeTrace): Receives the processing time of every molecule.
+    - options: Options of other backends (e.g. java_options) are ignored.
+    """
+
+    name = 'lookup'
+
+    # Base shifts (ppm) of the heavy atom carrying the observed hydrogen
+    H_BASE = {
+        ('C', 'SP3', 3): 0.90, ('C', 'SP3', 2): 1.30, ('C', 'SP3', 1): 1.50,
+        ('C', 'SP2', 2): 4.90, ('C', 'SP2', 1): 5.40, ('C', 'SP', 1): 2.50,
+        ('C', 'AROMATIC', 1): 7.26,
+        ('N', 'AROMATIC', 1): 11.50, ('N', 'SP2', 1): 8.00, ('N', 'SP2', 2): 6.50,
+        ('N', 'SP3', 1): 2.00, ('N', 'SP3', 2): 1.50,
+        ('O', 'SP3', 1): 4.50, ('S', 'SP3', 1): 2.00,
+    }
+    # Shift increments (ppm) of an H-bearing sp3 carbon per attached substituent
+    H_ALPHA = {'N': 1.20, 'O': 2.10, 'S': 1.10, 'F': 3.00, 'Cl': 2.10, 'Br': 2.00, 'I': 1.90,
+               'AROMATIC': 1.10, 'CARBONYL': 0.90}
+
+    # Base shifts (ppm) of carbon by hybridisation and number of attached H
+    C_BASE = {
+        ('SP3', 3): 20.0, ('SP3', 2): 30.0, ('SP3', 1): 38.0, ('SP3', 0): 40.0,
+        ('SP2', 2): 115.0, ('SP2', 1): 128.0, ('SP2', 0): 140.0,
+        ('SP', 1): 70.0, ('SP', 0): 80.0,
+        ('AROMATIC', 1): 128.5, ('AROMATIC', 0): 134.0,
+    }
+    # Shift increments (ppm) of carbon per attached heteroatom
+    C_ALPHA = {'N': 18.0, 'O': 35.0, 'S': 12.0, 'F': 60.0, 'Cl': 28.0, 'Br': 18.0, 'I': 0.0}
+
+    SHIFT_RANGES = {'1H': (-1.0, 14.0), '13C': (-10.0, 230.0)}
+
+    def __init__(self, silent=False, trace=None, **options):
+        self.silent = silent
+        self.trace = trace
+        from rdkit import Chem, RDLogger
+        RDLogger.DisableLog("rdApp.*")
+        self._chem = Chem
+
+    @staticmethod
+    def _hybridization(atom):
+        if atom.GetIsAromatic():
+            return 'AROMATIC'
+        return str(atom.GetHybridization()).rsplit('.', 1)[-1]
+
+    def _is_carbonyl(self, atom):
+        return atom.GetSymbol() == 'C' and any(
+            bond.GetBondTypeAsDouble() == 2.0 and bond.GetOtherAtom(atom).GetSymbol() in ('O', 'S')
+            for bond in atom.GetBonds())
+
+    def _proton_shift(self, hydrogen):
+        heavy = hydrogen.GetNeighbors()[0] if hydrogen.GetDegree() else None
+        if heavy is None:
+            return None
+        element, hybridization, n_h = heavy.GetSymbol(), self._hybridization(heavy), heavy.GetTotalNumHs(includeNeighbors=True)
+
+        if element == 'C' and self._is_carbonyl(heavy):
+            return 9.70  # aldehyde
+        if element == 'O':
+            neighbor = next((a for a in heavy.GetNeighbors() if a.GetAtomicNum() > 1), None)
+            if neighbor is not None and self._is_carbonyl(neighbor):
+                return 12.00  # carboxylic acid
+            if neighbor is not None and neighbor.GetIsAromatic():
+                return 9.50  # phenol
+        if element == 'N' and any(self._is_carbonyl(a) for a in heavy.GetNeighbors()):
+            return 8.10  # amide
+
+        shift = self.H_BASE.get((element, hybridization, n_h), self.H_BASE.get((element, hybridization, 1), 2.00))
+        for neighbor in heavy.GetNeighbors():
+            if neighbor.GetAtomicNum() == 1:
+                continue
+            if element == 'C' and hybridization == 'SP3':
+                symbol = neighbor.GetSymbol()
+                if symbol in self.H_ALPHA:
+                    shift += self.H_ALPHA[symbol]
+                elif neighbor.GetIsAromatic():
+                    shift += self.H_ALPHA['AROMATIC']
+                elif self._is_carbonyl(neighbor):
+                    shift += self.H_ALPHA['CARBONYL']
+            elif hybridization == 'AROMATIC' and neighbor.GetIsAromatic() and neighbor.GetSymbol() == 'N':
+                shift += 1.20  # alpha to a ring nitrogen
+        return shift
+
+    def _carbon_shift(self, carbon):
+        hybridization = self._hybridization(carbon)
+        n_h = carbon.GetTotalNumHs(includeNeighbors=True)
+        if self._is_carbonyl(carbon):
+            hetero = sum(1 for a in carbon.GetNeighbors() if a.GetSymbol() in ('N', 'O') and
+                         not any(b.GetBondTypeAsDouble() == 2.0 for b in a.GetBonds()))
+            return 168.0 if hetero else (200.0 if n_h else 205.0)
+        if any(b.GetBondTypeAsDouble() == 3.0 and b.GetOtherAtom(carbon).GetSymbol() == 'N'
+               for b in carbon.GetBonds()):
+            return 118.0  # nitrile
+
+        shift = self.C_BASE.get((hybridization, n_h), self.C_BASE.get((hybridization, 0), 40.0))
+        for neighbor in carbon.GetNeighbors():
+            symbol = neighbor.GetSymbol()
+            if symbol in self.C_ALPHA:
+                weight = 0.6 if hybridization in ('AROMATIC', 'SP2') else 1.0
+                shift += self.C_ALPHA[symbol] * weight
+            elif symbol == 'C' and hybridization == 'SP3':
+                shift += 2.0 if neighbor.GetIsAromatic() else 1.0
+        return shift
+
+    def shifts(self, mol, predictor):
+        """Returns the per-atom shifts of *mol*, in atom order, like the Java BatchProcessor."""
+        low, high = self.SHIFT_RANGES[predictor]
+        atomic_number = 1 if predictor == '1H' else 6
+        values = []
+        for atom in mol.GetAtoms():
+            if atom.GetAtomicNum() != atomic_number:
+                continue
+            shift = self._proton_shift(atom) if predictor == '1H' else self._carbon_shift(atom)
+            if shift is not None:
+                values.append(min(max(shift, low), high))
+        return values
+
+    def predict(self, mol_directory, predictor, quiet=False, work_dir=None):
+        csv_output_folder = self.output_folder(predictor, work_dir)
+        processed = 0
+        failed = []
+        for filename in sorted(os.listdir(mol_directory)):
+            if not filename.endswith('.mol'):
+                continue
+            start = self.trace.timer() if self.trace is not None else None
+            mol = self._chem.MolFromMolFile(os.path.join(mol_directory, filename), removeHs=False)
+            if mol is None:
+                failed.append(filename)
+                continue
+            if predictor == '1H':
+                mol = self._chem.AddHs(mol)
+            csv_path = os.path.join(csv_output_folder, filename[:-len('.mol')] + '.csv')
+            with open(csv_path + PART_SUFFIX, 'w') as f:
+                f.writelines(f"{shift:.2f}\n" for shift in self.shifts(mol, predictor))
+            publish(csv_path + PART_SUFFIX)
+            processed += 1
+            if start is not None:
+                self.trace.add_since(f'predict_spectra:{predictor}', filename[:-len('.mol')], start)
+
+        if self.silent:
+            return csv_output_folder
+        if not quiet:
+            print(f"{COLORS[2]}Lookup-table stand-in backend: shifts are approximate and for testing only.{RESET}")
+        print(f"{COLORS[0]}Total number of .mol files processed for {predictor} NMR prediction: {processed}{RESET}")
+        for filename in failed:
+            print(f"{COLORS[1]}Error while processing file {filename}: could not be read.{RESET}")
+        return csv_output_folder
+
+
+BACKENDS = {
+    'java': JavaBackend,
+    'lookup': LookupBackend,
+}
+
+
+def get_backend(name='java', silent=False, **options):
+    """
+    Returns a new instance of the backend registered as *name*. *options*
+    are passed to the backend (e.g. java_options for 'java').
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown NMR backend '{name}'. Choose one of: {', '.join(BACKENDS)}.")
+    return BACKENDS[name](silent=silent, **options)
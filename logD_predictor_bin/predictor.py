@@ -1,8 +1,69 @@
 import os
 import subprocess
 import platform
+import time
 
-def run_java_batch_processor(mol_directory, predictor, quiet=False):
+from run_journal import PART_SUFFIX
+
+# Directory of this module (logD_predictor_bin), holding the predictor/ sources
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Default time limit (seconds) of the prediction of one molecule
+MOLECULE_TIMEOUT = 120
+
+# Interval (seconds) at which the watchdog checks the BatchProcessor
+WATCHDOG_POLL = 1.0
+
+# Time (seconds) the JVM may take to start and load the prediction tool, on top
+# of the molecule time limit, before the first molecule is reported
+STARTUP_GRACE = 120
+
+# Log of the molecules whose spectrum prediction timed out or crashed the JVM
+PREDICTION_ERROR_LOG = 'nmr_prediction_error.log'
+
+
+def watch_batch_processor(process, progress_path, timeout, startup_grace=STARTUP_GRACE):
+    """
+    Waits for the BatchProcessor *process*. If the molecule named in
+    *progress_path* has been in progress for more than *timeout* seconds,
+    or no molecule has been started *startup_grace* + *timeout* seconds
+    after the launch, the JVM is killed.
+
+    Returns:
+    - timed_out (bool): True if the process was killed.
+    """
+    launched = time.time()
+    while True:
+        try:
+            process.wait(timeout=WATCHDOG_POLL)
+            return False
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            started = os.path.getmtime(progress_path)
+        except OSError:
+            # JVM still starting
+            started = launched
+            if timeout:
+                started += startup_grace
+        if timeout and time.time() - started > timeout:
+            process.kill()
+            process.wait()
+            return True
+
+
+def read_progress(progress_path):
+    """Name of the .mol file the BatchProcessor was working on, or None."""
+    try:
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def run_java_batch_processor(mol_directory, predictor, quiet=False, work_dir=None,
+                             compile_sources=True, silent=False, java_options=None, run=True,
+                             timeout=MOLECULE_TIMEOUT, trace_path=None, use3d=True):
     """
     Compiles and runs the Java BatchProcessor for NMR spectrum prediction
     on the specified directory containing .mol files.
@@ -10,6 +71,23 @@ def run_java_batch_processor(mol_directory, predictor, quiet=False):
     Parameters:
     - mol_directory (str): Path to the input directory containing .mol files.
     - predictor (str): Type of NMR predictor ('1H' or '13C') to use.
+    - work_dir (str): Directory for the output folder (defaults to the
+                      current working directory).
+    - compile_sources (bool): If False, the already compiled BatchProcessor
+                              class is reused and javac is not called.
+    - silent (bool): If True, console output of javac/java is discarded.
+    - java_options (list): JVM options of the run, e.g. ['-Xmx4g'] (defaults
+                           to a 1 GB heap).
+    - run (bool): If False, the BatchProcessor is only compiled.
+    - timeout (float): Time limit (seconds) of one molecule (0 or None = no
+                       limit). A BatchProcessor that exceeds it or crashes is
+                       restarted from the next unprocessed molecule; the
+                       skipped molecule is written to nmr_prediction_error.log.
+    - trace_path (str): If given, the BatchProcessor appends the processing
+                        time of every .mol file to this file (--trace).
+    - use3d (bool): If False, the shifts are predicted from the 2D structure
+                    (BatchProcessor argument 'no3d') instead of the 3D
+                    coordinates of the .mol files.
     
     Returns:
     - csv_output_folder (str): Path to the directory where the predicted CSV
@@ -27,7 +105,7 @@ def run_java_batch_processor(mol_directory, predictor, quiet=False):
              ]
     RESET = '\033[0m'
 
-    csv_output_folder = os.path.join(os.getcwd(), f"predicted_spectra_{predictor}")
+    csv_output_folder = os.path.join(work_dir or os.getcwd(), f"predicted_spectra_{predictor}")
 
     if not os.path.exists(csv_output_folder):
         os.makedirs(csv_output_folder)
@@ -37,7 +115,10 @@ def run_java_batch_processor(mol_directory, predictor, quiet=False):
     classpath_separator = ";" if platform.system() == "Windows" else ":"
 
     # Set the current directory to logD_predictor_bin
-    current_dir = os.path.join(os.getcwd(), "logD_predictor_bin")
+    current_dir = BIN_DIR
+
+    # Output of the Java tools is dropped when running silently
+    output = subprocess.DEVNULL if silent else None
 
     # Use os.path.join for platform-independent paths
     if predictor == "1H":
@@ -57,24 +138,85 @@ def run_java_batch_processor(mol_directory, predictor, quiet=False):
         f'-d "{current_dir}" -Xlint:-options -Xlint:deprecation -proc:none "{batch_processor_java}"'
     )
 
-    try:
-        subprocess.run(compile_command, shell=True, check=True, cwd=current_dir)
-        verbose_print(f"\nSuccessfully compiled {batch_processor_class}.")
-        print("\nSpectra prediction in progress...\n")
-    except subprocess.CalledProcessError as e:
-        print(f"{COLORS[1]}Failed to compile {batch_processor_java}: {e}{RESET}")
-        return
-
-    # Revised java command for cross-platform
-    run_command = (
-        f'java -Xmx1g -classpath "{predictor_jar}{classpath_separator}{cdk_jar}{classpath_separator}{current_dir}" '
-        f'{batch_processor_class} "{mol_directory}" "{csv_output_folder}" '
-        '"Dimethylsulphoxide-D6 (DMSO-D6, C2D6SO)"'
-    )
+    if compile_sources:
+        try:
+            subprocess.run(compile_command, shell=True, check=True, cwd=current_dir,
+                           stdout=output, stderr=output)
+            verbose_print(f"\nSuccessfully compiled {batch_processor_class}.")
+        except subprocess.CalledProcessError as e:
+            print(f"{COLORS[1]}Failed to compile {batch_processor_java}: {e}{RESET}")
+            return
+    if not run:
+        return csv_output_folder
+    verbose_print("\nSpectra prediction in progress...\n")
+
+    # Revised java command for cross-platform. The watchdog below follows the
+    # molecule in progress and restarts the JVM after a hang or a crash,
+    # skipping the molecules already done or failed.
+    name = os.path.basename(os.path.normpath(mol_directory))
+    progress_path = os.path.join(work_dir or os.getcwd(), f"{name}_{predictor}.progress")
+    skip_path = os.path.join(work_dir or os.getcwd(), f"{name}_{predictor}.skip")
+    error_log = os.path.join(work_dir or os.getcwd(), PREDICTION_ERROR_LOG)
+    jvm_options = [*(java_options or ['-Xmx1g']), f'-Dlogd.progress={progress_path}']
+    if trace_path:
+        jvm_options.append(f'-Dlogd.trace={trace_path}')
+    arguments = [
+        '-classpath', f'{predictor_jar}{classpath_separator}{cdk_jar}{classpath_separator}{current_dir}',
+        batch_processor_class, mol_directory, csv_output_folder,
+        'Dimethylsulphoxide-D6 (DMSO-D6, C2D6SO)'
+    ]
+    if not use3d:
+        arguments.append('no3d')
 
+    failed = []
     try:
-        subprocess.run(run_command, shell=True, check=True, cwd=current_dir)
-    except subprocess.CalledProcessError as e:
-        print(f"{COLORS[1]}Failed to run {batch_processor_class}: {e}{RESET}")
+        while True:
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+            restart_options = [f'-Dlogd.skip={skip_path}'] if failed else []
+            process = subprocess.Popen(['java', *jvm_options, *restart_options, *arguments],
+                                       cwd=current_dir, stdout=output, stderr=output)
+            timed_out = watch_batch_processor(process, progress_path, timeout)
+            if process.returncode == 0 and not timed_out:
+                break
+
+            molecule = read_progress(progress_path)
+            if molecule is None and timed_out:
+                print(f"{COLORS[1]}{batch_processor_class} did not start a molecule within "
+                      f"{STARTUP_GRACE + timeout:g} s.{RESET}")
+                break
+            if molecule is not None:
+                # The shift file of the interrupted molecule is incomplete
+                partial_path = os.path.join(csv_output_folder, molecule[:-len('.mol')] + '.csv' + PART_SUFFIX)
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+            finished = molecule is not None and os.path.exists(
+                os.path.join(csv_output_folder, molecule[:-len('.mol')] + '.csv'))
+            if molecule is None or molecule in failed or finished:
+                print(f"{COLORS[1]}Failed to run {batch_processor_class}: exit status {process.returncode}{RESET}")
+                break
+            reason = f"Timed out after {timeout:g} s" if timed_out else f"JVM exited with status {process.returncode}"
+            failed.append(molecule)
+            if trace_path:
+                with open(trace_path, 'a', encoding='utf-8') as f:
+                    elapsed = time.time() - os.path.getmtime(progress_path)
+                    f.write(f"{molecule}\t{elapsed * 1000:.1f}\t{reason}\n")
+            with open(error_log, 'a', encoding='utf-8') as f:
+                f.write(f"Molecule: {molecule[:-len('.mol')]}\nPredictor: {predictor}\nError: {reason}\n\n")
+            print(f"\n{COLORS[1]}{reason} on {molecule}; restarting {batch_processor_class}.{RESET}")
+
+            with open(skip_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(failed) + '\n')
+            done = {filename[:-len('.csv')] for filename in os.listdir(csv_output_folder) if filename.endswith('.csv')}
+            if not any(filename.endswith('.mol') and filename[:-len('.mol')] not in done and filename not in failed
+                       for filename in os.listdir(mol_directory)):
+                break
+    finally:
+        for path in (progress_path, skip_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if failed:
+        print(f"{COLORS[1]}{len(failed)} molecules skipped.{RESET} See '{PREDICTION_ERROR_LOG}' for details.")
 
     return csv_output_folder
@@ -5,7 +5,19 @@ import java.io.File;
 import java.io.FileWriter;
 import java.io.FileReader;
 import java.io.BufferedReader;
+import java.io.IOException;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.StandardCopyOption;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.HashSet;
+import java.util.LinkedHashMap;
+import java.util.List;
 import java.util.Locale;
+import java.util.Map;
+import java.util.Set;
 
 import org.openscience.cdk.DefaultChemObjectBuilder;
 import org.openscience.cdk.interfaces.IAtom;
@@ -15,6 +27,9 @@ import org.openscience.cdk.io.MDLV3000Reader;
 import org.openscience.cdk.aromaticity.Aromaticity;
 import org.openscience.cdk.aromaticity.ElectronDonation;
 import org.openscience.cdk.graph.Cycles;
+import org.openscience.cdk.graph.GraphUtil;
+import org.openscience.cdk.graph.invariant.Canon;
+import org.openscience.cdk.tools.HOSECodeGenerator;
 import org.openscience.nmrshiftdb.PredictionTool;
 import org.openscience.nmrshiftdb.util.AtomUtils;
 
@@ -32,6 +47,64 @@ public class BatchProcessor13C {
     private static final String ANSI_RED = "\033[31m";    // Red color code.
     private static final String ANSI_RESET = "\033[0m";   // Reset color code.
 
+    // File receiving the name of the .mol file in progress (system property logd.progress),
+    // watched by the Python watchdog to detect hung or crashed predictions.
+    private static final String PROGRESS_FILE = System.getProperty("logd.progress");
+
+    // File listing .mol files to skip (system property logd.skip). When it is set, the
+    // BatchProcessor was restarted and .mol files with a finished CSV file are skipped too.
+    private static final String SKIP_FILE = System.getProperty("logd.skip");
+
+    // File receiving the processing time of every .mol file (system property logd.trace).
+    private static final String TRACE_FILE = System.getProperty("logd.trace");
+
+    // Maximum number of atom environments kept in the shift cache (system property logd.cache, 0 = off).
+    // In 2D ("no3d"), atoms with the same HOSE code and solvent get the same prediction, so the shift
+    // predicted for an environment is reused for every later atom with that environment. The key
+    // is a 2D HOSE code, while 3D predictions also depend on the coordinates, so the cache is only
+    // used for 2D predictions.
+    private static final int CACHE_SIZE = Integer.getInteger("logd.cache", 0);
+
+    // Verification mode (system property logd.cache.verify): every atom is still predicted and
+    // compared with the cached shift of its environment.
+    private static final boolean CACHE_VERIFY = Boolean.getBoolean("logd.cache.verify");
+
+    // Spheres of the HOSE codes used as cache keys (the deepest level searched by PredictionTool).
+    private static final int HOSE_SPHERES = 6;
+
+    // Cached marker of environments without a prediction.
+    private static final float[] NO_RESULT = new float[0];
+
+    // Least recently used cache of 2D predictions, keyed by HOSE code and solvent.
+    private static final Map<String, float[]> SHIFT_CACHE = new LinkedHashMap<String, float[]>(1024, 0.75f, true) {
+        @Override
+        protected boolean removeEldestEntry(Map.Entry<String, float[]> eldest) {
+            return size() > CACHE_SIZE;
+        }
+    };
+
+    // Statistics of the shift cache.
+    private static long cacheLookups = 0;
+    private static long cacheHits = 0;
+    private static long cacheMismatches = 0;
+
+    // Symmetry reuse (system property logd.symmetry): atoms are grouped into classes of
+    // topologically equivalent atoms (CDK canonical ranking) and one atom per class is predicted;
+    // the other atoms of the class get its shift, so the CSV rows stay the same.
+    // The classes ignore stereochemistry and geometry, while 3D predictions can differ between
+    // topologically equivalent atoms (diastereotopic CH2 protons), so the reuse is only applied
+    // to 2D predictions ("no3d").
+    private static final boolean SYMMETRY = Boolean.getBoolean("logd.symmetry");
+
+    // Verification mode (system property logd.symmetry.verify): equivalent atoms are still
+    // predicted and compared with the shift of their class.
+    private static final boolean SYMMETRY_VERIFY = Boolean.getBoolean("logd.symmetry.verify");
+
+    // Statistics of the symmetry reuse.
+    private static long symmetryAtoms = 0;
+    private static long symmetryReused = 0;
+    private static long symmetryMismatches = 0;
+
     /**
      * Processes a single .mol file to predict 13C NMR shifts and saves the results to a CSV file.
      * 
@@ -39,8 +112,13 @@ public class BatchProcessor13C {
      * @param csvFilePath The file path where the CSV file will be saved.
      * @param solvent The solvent used for prediction. Default is "Unreported".
      * @param use3d A flag indicating whether to use 3D molecular data for the prediction.
+     * @param predictor The NMRShiftDB prediction tool, shared by all .mol files of the run.
      */
-    private static void processMolFile(File molFile, String csvFilePath, String solvent, boolean use3d) {
+    private static void processMolFile(File molFile, String csvFilePath, String solvent, boolean use3d,
+                                       PredictionTool predictor) {
+        // The shifts are written to <name>.csv.part first, so a run that is killed
+        // while writing never leaves a truncated <name>.csv behind.
+        File partFile = new File(csvFilePath + ".part");
         try {
             // Determine whether molFile is V2000 or V3000 format.
             BufferedReader br = new BufferedReader(new FileReader(molFile));
@@ -69,11 +147,14 @@ public class BatchProcessor13C {
             Aromaticity aromaticity = new Aromaticity(ElectronDonation.cdk(), Cycles.cdkAromaticSet());
             aromaticity.apply(mol);
 
-            // Initialize the NMRShiftDB prediction tool.
-            PredictionTool predictor = new PredictionTool();
+            HOSECodeGenerator hoseGenerator = CACHE_SIZE > 0 && !use3d ? new HOSECodeGenerator() : null;
+
+            // Symmetry classes of the atoms and the shift predicted for each class.
+            long[] symmetryClasses = SYMMETRY && !use3d ? symmetryClasses(mol) : null;
+            Map<Long, float[]> classShifts = new HashMap<>();
 
             // Prepare to write the prediction results to a CSV file.
-            try (BufferedWriter writer = new BufferedWriter(new FileWriter(csvFilePath))) {
+            try (BufferedWriter writer = new BufferedWriter(new FileWriter(partFile))) {
                 // Iterate over all atoms in the molecule.
                 for (int i = 0; i < mol.getAtomCount(); i++) {
                     IAtom curAtom = mol.getAtom(i);
@@ -81,7 +162,7 @@ public class BatchProcessor13C {
 
                     // If the current atom is a CARBON atom (atomic number 6), perform prediction.
                     if (curAtom.getAtomicNumber() == 6) {
-                        result = predictor.predict(mol, curAtom, use3d, solvent);
+                        result = predictAtom(predictor, hoseGenerator, mol, i, symmetryClasses, classShifts, use3d, solvent);
 
                         // Write the predicted NMR shift value to the CSV file if a result is obtained.
                         if (result != null) {
@@ -97,9 +178,223 @@ public class BatchProcessor13C {
             // Print error message in red if file processing fails.
             System.err.println(ANSI_RED + "Error while processing file " + molFile.getName() + ": " + e.getMessage() + ANSI_RESET);
             e.printStackTrace();
+        } finally {
+            // Files finished with an error are kept as before.
+            publish(partFile, csvFilePath);
+        }
+    }
+
+    /**
+     * Computes the symmetry classes of the atoms with the CDK canonical ranking.
+     * 
+     * @param mol The molecule, with explicit hydrogens.
+     * @return The symmetry class of every atom, or null if they cannot be computed
+     *         (every atom of the molecule is then predicted).
+     */
+    private static long[] symmetryClasses(IAtomContainer mol) {
+        try {
+            return Canon.symmetry(mol, GraphUtil.toAdjList(mol));
+        } catch (Exception e) {
+            return null;
+        }
+    }
+
+    /**
+     * Predicts the shift of an atom, or takes it from a symmetry-equivalent atom predicted before.
+     * 
+     * @param predictor The NMRShiftDB prediction tool.
+     * @param hoseGenerator The HOSE code generator, or null if the cache is off.
+     * @param mol The molecule.
+     * @param index The index of the atom to predict.
+     * @param symmetryClasses The symmetry class of every atom, or null if symmetry reuse is off.
+     * @param classShifts The predictions of the symmetry classes seen so far.
+     * @param use3d A flag indicating whether to use 3D molecular data for the prediction.
+     * @param solvent The solvent used for prediction.
+     * @return The prediction, or null if none is available.
+     */
+    private static float[] predictAtom(PredictionTool predictor, HOSECodeGenerator hoseGenerator, IAtomContainer mol,
+                                       int index, long[] symmetryClasses, Map<Long, float[]> classShifts,
+                                       boolean use3d, String solvent) throws Exception {
+        IAtom atom = mol.getAtom(index);
+        if (symmetryClasses == null) {
+            return predictShift(predictor, hoseGenerator, mol, atom, use3d, solvent);
+        }
+        symmetryAtoms++;
+        Long symmetryClass = symmetryClasses[index];
+        if (!classShifts.containsKey(symmetryClass)) {
+            float[] result = predictShift(predictor, hoseGenerator, mol, atom, use3d, solvent);
+            classShifts.put(symmetryClass, result);
+            return result;
+        }
+        symmetryReused++;
+        float[] shared = classShifts.get(symmetryClass);
+        if (!SYMMETRY_VERIFY) {
+            return shared;
+        }
+        float[] result = predictShift(predictor, hoseGenerator, mol, atom, use3d, solvent);
+        if (!sameShift(shared, result)) {
+            symmetryMismatches++;
+            System.err.println(ANSI_RED + "Shift of atom " + (index + 1) + " differs from its symmetry class" + ANSI_RESET);
+        }
+        return result;
+    }
+
+    /**
+     * Predicts the shift of an atom, reusing the cached prediction of its atom environment.
+     * 
+     * @param predictor The NMRShiftDB prediction tool.
+     * @param hoseGenerator The HOSE code generator, or null if the cache is off.
+     * @param mol The molecule.
+     * @param atom The atom to predict.
+     * @param use3d A flag indicating whether to use 3D molecular data for the prediction.
+     * @param solvent The solvent used for prediction.
+     * @return The prediction, or null if none is available.
+     */
+    private static float[] predictShift(PredictionTool predictor, HOSECodeGenerator hoseGenerator,
+                                        IAtomContainer mol, IAtom atom, boolean use3d, String solvent) throws Exception {
+        if (hoseGenerator == null) {
+            return predictor.predict(mol, atom, use3d, solvent);
+        }
+        String key = hoseGenerator.getHOSECode(mol, atom, HOSE_SPHERES) + "|" + solvent;
+        cacheLookups++;
+        float[] cached = SHIFT_CACHE.get(key);
+        if (cached != null) {
+            cacheHits++;
+            if (!CACHE_VERIFY) {
+                return cached == NO_RESULT ? null : cached;
+            }
+        }
+        float[] result = predictor.predict(mol, atom, use3d, solvent);
+        if (cached == null) {
+            SHIFT_CACHE.put(key, result == null ? NO_RESULT : result);
+        } else if (!sameShift(cached == NO_RESULT ? null : cached, result)) {
+            cacheMismatches++;
+            System.err.println(ANSI_RED + "Cached shift differs for environment " + key + ANSI_RESET);
+        }
+        return result;
+    }
+
+    /**
+     * Compares two predictions by the shift written to the CSV file.
+     * 
+     * @param a The first prediction (may be null).
+     * @param b The second prediction (may be null).
+     * @return True if both are missing or have bit-identical shifts.
+     */
+    private static boolean sameShift(float[] a, float[] b) {
+        if (a == null || b == null) {
+            return a == b;
+        }
+        return Float.floatToIntBits(a[1]) == Float.floatToIntBits(b[1]);
+    }
+
+    /**
+     * Prints the hit rate of the shift cache (and the result of the verification).
+     */
+    private static void printCacheStatistics() {
+        double rate = cacheLookups > 0 ? 100.0 * cacheHits / cacheLookups : 0.0;
+        System.out.println(String.format(Locale.US, "Shift cache: %d of %d atoms reused (%.1f%%), %d environments cached.",
+                                         cacheHits, cacheLookups, rate, SHIFT_CACHE.size()));
+        if (CACHE_VERIFY) {
+            String color = cacheMismatches == 0 ? ANSI_GREEN : ANSI_RED;
+            System.out.println(color + "Shift cache verification: " + cacheMismatches + " of " + cacheHits
+                               + " cached shifts differ from the uncached prediction." + ANSI_RESET);
         }
     }
 
+    /**
+     * Prints the share of atoms that took the shift of a symmetry-equivalent atom.
+     */
+    private static void printSymmetryStatistics() {
+        double rate = symmetryAtoms > 0 ? 100.0 * symmetryReused / symmetryAtoms : 0.0;
+        System.out.println(String.format(Locale.US, "Symmetry reuse: %d of %d atoms took the shift of an equivalent atom (%.1f%%).",
+                                         symmetryReused, symmetryAtoms, rate));
+        if (SYMMETRY_VERIFY) {
+            String color = symmetryMismatches == 0 ? ANSI_GREEN : ANSI_RED;
+            System.out.println(color + "Symmetry reuse verification: " + symmetryMismatches + " of " + symmetryReused
+                               + " reused shifts differ from the atom's own prediction." + ANSI_RESET);
+        }
+    }
+
+    /**
+     * Renames a completely written .part file to its final CSV file name.
+     * 
+     * @param partFile The written .part file.
+     * @param csvFilePath The final file path of the CSV file.
+     */
+    private static void publish(File partFile, String csvFilePath) {
+        if (!partFile.exists()) {
+            return;
+        }
+        try {
+            Files.move(partFile.toPath(), Paths.get(csvFilePath),
+                       StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+        } catch (IOException e) {
+            System.err.println(ANSI_RED + "Error while saving file " + csvFilePath + ": " + e.getMessage() + ANSI_RESET);
+        }
+    }
+
+    /**
+     * Writes the name of the .mol file in progress to the progress file, if one is set.
+     * 
+     * @param molFile The .mol file about to be processed.
+     */
+    private static void markProgress(File molFile) {
+        if (PROGRESS_FILE == null) {
+            return;
+        }
+        try {
+            Files.write(Paths.get(PROGRESS_FILE), molFile.getName().getBytes(StandardCharsets.UTF_8));
+        } catch (IOException e) {
+            System.err.println(ANSI_RED + "Error while writing " + PROGRESS_FILE + ": " + e.getMessage() + ANSI_RESET);
+        }
+    }
+
+    /**
+     * Appends the processing time of a .mol file to the trace file.
+     * 
+     * @param writer The open trace file.
+     * @param molFile The processed .mol file.
+     * @param nanos The processing time in nanoseconds.
+     */
+    private static void traceTime(BufferedWriter writer, File molFile, long nanos) {
+        try {
+            writer.write(molFile.getName() + "\t" + String.format(Locale.US, "%.1f", nanos / 1e6) + "\n");
+            // Flushed per file, so the times survive a killed JVM
+            writer.flush();
+        } catch (IOException e) {
+            System.err.println(ANSI_RED + "Error while writing " + TRACE_FILE + ": " + e.getMessage() + ANSI_RESET);
+        }
+    }
+
+    /**
+     * Returns the .mol files still to be processed after a restart: files listed in the
+     * skip file and files with a finished CSV file are left out.
+     * 
+     * @param molFiles All .mol files of the input folder.
+     * @param outputFolder The output folder of the CSV files.
+     * @return The .mol files to process.
+     */
+    private static File[] pendingFiles(File[] molFiles, File outputFolder) {
+        if (SKIP_FILE == null) {
+            return molFiles;
+        }
+        Set<String> skip = new HashSet<>();
+        try {
+            skip.addAll(Files.readAllLines(Paths.get(SKIP_FILE), StandardCharsets.UTF_8));
+        } catch (IOException e) {
+            System.err.println(ANSI_RED + "Error while reading " + SKIP_FILE + ": " + e.getMessage() + ANSI_RESET);
+        }
+        List<File> pending = new ArrayList<>();
+        for (File molFile : molFiles) {
+            File csvFile = new File(outputFolder, molFile.getName().replace(".mol", ".csv"));
+            if (!skip.contains(molFile.getName()) && !csvFile.exists()) {
+                pending.add(molFile);
+            }
+        }
+        return pending.toArray(new File[0]);
+    }
+
     /**
      * Prints a dynamic progress bar with color to indicate progress.
      * 
@@ -171,12 +466,44 @@ public class BatchProcessor13C {
             use3d = false;
         }
 
+        if (CACHE_SIZE > 0 && use3d) {
+            System.out.println("Shift cache is off: 3D predictions depend on more than the 2D HOSE code.");
+        }
+        if (SYMMETRY && use3d) {
+            System.out.println("Symmetry reuse is off: 3D predictions can differ between topologically equivalent atoms.");
+        }
+
         // List all .mol files in the input folder.
         File[] molFiles = inputFolder.listFiles((dir, name) -> name.endsWith(".mol"));
+        if (molFiles != null) {
+            molFiles = pendingFiles(molFiles, outputFolder);
+        }
         if (molFiles != null && molFiles.length > 0) {
             int totalFiles = molFiles.length; // Total number of .mol files to be processed.
             int counter = 1; // Counter to keep track of the number of processed files.
 
+            // Open the trace file, if tracing is requested.
+            BufferedWriter traceWriter = null;
+            if (TRACE_FILE != null) {
+                try {
+                    traceWriter = new BufferedWriter(new FileWriter(TRACE_FILE, true));
+                } catch (IOException e) {
+                    System.err.println(ANSI_RED + "Error while opening " + TRACE_FILE + ": " + e.getMessage() + ANSI_RESET);
+                }
+            }
+
+            // Initialize the NMRShiftDB prediction tool once; loading its database is
+            // far more expensive than predicting one molecule.
+            PredictionTool predictor;
+            try {
+                predictor = new PredictionTool();
+            } catch (Exception e) {
+                System.err.println(ANSI_RED + "Error while initializing the prediction tool: " + e.getMessage() + ANSI_RESET);
+                e.printStackTrace();
+                System.exit(1);
+                return;
+            }
+
             // Iterate over each .mol file in the input folder.
             for (File molFile : molFiles) {
                 // Construct the file path for the output CSV file.
@@ -186,15 +513,34 @@ public class BatchProcessor13C {
                 printProgress(counter, totalFiles);
 
                 // Process the current .mol file.
-                processMolFile(molFile, csvFilePath, solvent, use3d);
+                markProgress(molFile);
+                long started = System.nanoTime();
+                processMolFile(molFile, csvFilePath, solvent, use3d, predictor);
+                if (traceWriter != null) {
+                    traceTime(traceWriter, molFile, System.nanoTime() - started);
+                }
                 counter++; // Increment the counter after processing each file.
             }
 
+            if (traceWriter != null) {
+                try {
+                    traceWriter.close();
+                } catch (IOException e) {
+                    System.err.println(ANSI_RED + "Error while closing " + TRACE_FILE + ": " + e.getMessage() + ANSI_RESET);
+                }
+            }
+
             // Move to a new line after processing all files.
             System.out.println();
 
             // Display the total number of processed .mol files in green.
             System.out.println(ANSI_GREEN + "Total number of .mol files processed for 13C NMR prediction: " + processedFileCount + ANSI_RESET);
+            if (CACHE_SIZE > 0 && !use3d) {
+                printCacheStatistics();
+            }
+            if (SYMMETRY && !use3d) {
+                printSymmetryStatistics();
+            }
         } else {
             // Print an error message in red if no .mol files are found in the input folder.
             System.err.println(ANSI_RED + "No .mol files found in the input folder." + ANSI_RESET);
@@ -0,0 +1,252 @@
+# profiler.py
+
+"""
+Lightweight per-stage instrumentation for the prediction pipeline.
+
+Every pipeline step is wrapped in ``profiler.stage(name)``. When profiling
+is disabled the context manager returns immediately, so the cost is a
+single attribute check per stage. When enabled, each stage records:
+
+- wall time and CPU time (including finished child processes such as the
+  Java BatchProcessor) and the CPU utilisation (average busy cores, also
+  as a share of the thread budget),
+- molecules per second,
+- peak resident memory of the process (and its children, if psutil is
+  available) sampled while the stage runs,
+- optionally a cProfile capture of one chosen stage.
+
+The report is written as JSON with write().
+
+The module also times deferred imports (timed_import) so that the cold
+start cost of every heavy framework can be reported per configuration
+(logD_predictor.py --startup-report).
+"""
+
+import cProfile
+import contextlib
+import importlib
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; /proc is used on Linux instead
+    psutil = None
+
+# Interval (s) between memory samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.05
+
+# (module name, seconds) of every import done through timed_import()
+IMPORT_TIMES = []
+
+
+def timed_import(name):
+    """
+    Imports module *name* on first use and records how long it took.
+    Already imported modules are returned immediately.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.append((name, time.perf_counter() - start))
+    return module
+
+
+def startup_report(script_start, configuration):
+    """
+    Returns the import-time report of this process.
+
+    Parameters:
+    - script_start (float): time.perf_counter() taken at the top of the script.
+    - configuration (dict): Options of the run the report belongs to.
+    """
+    report = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+        'python': platform.python_version(),
+        'configuration': configuration,
+        'imports': [{'module': name, 'seconds': round(seconds, 4)} for name, seconds in IMPORT_TIMES],
+        'deferred_imports_s': round(sum(seconds for _, seconds in IMPORT_TIMES), 4),
+        'script_runtime_s': round(time.perf_counter() - script_start, 4),
+    }
+    if psutil is not None:
+        # Includes interpreter start-up before the script was executed
+        report['process_age_s'] = round(time.time() - psutil.Process().create_time(), 4)
+    return report
+
+
+def current_rss():
+    """
+    Returns the resident memory of this process and its children in bytes,
+    or None if it cannot be measured on this platform.
+    """
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            rss = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return rss
+        except psutil.Error:
+            return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _PeakRSSSampler(threading.Thread):
+    """Polls current_rss() in the background and keeps the maximum."""
+
+    def __init__(self):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self._update()
+
+    def _update(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self._update()
+        return self.peak
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageProfiler:
+    """
+    Collects timings of the pipeline stages.
+
+    Parameters:
+    - enabled (bool): If False, stage() does nothing.
+    - cprofile_stage (str): Name of the stage (without the ':1H' / ':13C'
+      suffix) to run under cProfile, or None.
+    - thread_budget (int): Threads the run may use; the utilisation of
+      every stage is also reported relative to it.
+    """
+
+    def __init__(self, enabled=False, cprofile_stage=None, thread_budget=None):
+        self.enabled = enabled
+        self.cprofile_stage = cprofile_stage
+        self.thread_budget = thread_budget
+        self.molecules = None
+        self.stages = []
+        self.profile_files = []
+        self._started = time.perf_counter()
+        self._timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    @contextlib.contextmanager
+    def stage(self, name, variant=None, molecules=None):
+        """
+        Times the enclosed block as stage *name* (e.g. 'bucket', variant '1H').
+        *molecules* overrides the molecule count used for the throughput.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        label = f"{name}:{variant}" if variant else name
+        profiler = cProfile.Profile() if self.cprofile_stage == name else None
+        sampler = _PeakRSSSampler()
+        sampler.start()
+        cpu_start = _cpu_seconds()
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = _cpu_seconds() - cpu_start
+            peak = sampler.stop()
+
+            count = molecules if molecules is not None else self.molecules
+            record = {
+                'stage': label,
+                'wall_s': round(wall, 4),
+                'cpu_s': round(cpu, 4),
+                'cpu_utilisation': round(cpu / wall, 2) if wall > 0 else None,
+                'budget_utilisation': round(cpu / (wall * self.thread_budget), 2)
+                if wall > 0 and self.thread_budget else None,
+                'molecules': count,
+                'molecules_per_s': round(count / wall, 2) if count and wall > 0 else None,
+                'peak_rss_mb': round(peak / 2**20, 1) if peak is not None else None,
+            }
+            if profiler is not None:
+                record['cprofile'] = self._dump_profile(profiler, label)
+            self.stages.append(record)
+
+    def _dump_profile(self, profiler, label):
+        """Keeps the pstats object until write() decides where to store it."""
+        stats = pstats.Stats(profiler)
+        self.profile_files.append((label, stats))
+        return f"profile_{label.replace(':', '_')}_{self._timestamp}.prof"
+
+    def report(self):
+        """Returns the collected measurements as a dictionary."""
+        total = time.perf_counter() - self._started
+        return {
+            'timestamp': self._timestamp,
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'molecules': self.molecules,
+            'thread_budget': self.thread_budget,
+            'total_wall_s': round(total, 4),
+            'molecules_per_s': round(self.molecules / total, 2) if self.molecules and total > 0 else None,
+            'stages': self.stages,
+        }
+
+    def format_table(self):
+        """Returns the per-stage wall time, CPU time and utilisation as text."""
+        lines = [f"{'stage':<24} {'wall s':>9} {'cpu s':>9} {'cores':>6} {'budget':>7}"]
+        for record in self.stages:
+            budget = record['budget_utilisation']
+            lines.append(f"{record['stage']:<24} {record['wall_s']:>9.2f} {record['cpu_s']:>9.2f} "
+                         f"{record['cpu_utilisation'] or 0:>6.2f} "
+                         f"{f'{budget:.0%}' if budget is not None else '-':>7}")
+        return '\n'.join(lines)
+
+    def write(self, output_dir):
+        """
+        Writes profile_<timestamp>.json (and the cProfile dumps, if any)
+        to *output_dir*. Returns the path of the JSON report or None.
+        """
+        if not self.enabled:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        for label, stats in self.profile_files:
+            stats.dump_stats(os.path.join(output_dir, f"profile_{label.replace(':', '_')}_{self._timestamp}.prof"))
+        report_path = os.path.join(output_dir, f"profile_{self._timestamp}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        return report_path
+
+
+def count_molecules(csv_path):
+    """Number of data rows in the verified input CSV."""
+    with open(csv_path, 'r', encoding='utf-8', errors='replace') as f:
+        return max(sum(1 for _ in f) - 1, 0)
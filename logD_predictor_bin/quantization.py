@@ -0,0 +1,261 @@
+# quantization.py
+
+"""
+Optional int8 inference of the DNN and CNN models (--quantize).
+
+The Net classes of DNN_predict and CNN_predict are float32 Linear/Conv1d
+stacks evaluated on the CPU. quantize_model() prepares a loaded network for
+faster inference:
+
+- every BatchNorm1d is folded into the Linear or Conv1d layer before it
+  (exact in evaluation mode), so conv+BN+activation runs as one
+  convolution followed by the activation,
+- the Linear layers are replaced by dynamically quantised int8 layers
+  (int8 weights, activations quantised per batch).
+
+Quantisation changes the predictions slightly, so it is only used for
+models that passed the accuracy check
+
+    python logD_predictor_bin/quantization.py --predictor hybrid --features merged.csv [--tolerance 0.05]
+
+which compares the int8 and float32 predictions of every DNN/CNN model on
+the features of real molecules (a merged dataset) and records the deltas in
+joblib_models/<predictor>_quantization.json. A model is approved if its
+largest absolute delta is within the tolerance; the approval is dropped as
+soon as the model file changes. Reports without a real reference data set
+(e.g. from synthetic feature matrices) approve no model. With --quantize, logD_predictor.py
+runs the approved models in int8 and all others in float32.
+"""
+
+import argparse
+import json
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import file_stamp
+from model_latency import read_reference_features
+from model_query import FEATURE_COUNTS, MODELS_DIR, algorithm_module, read_model_table
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+# ML algorithms with a quantised path
+QUANTIZABLE = ('DNN', 'CNN')
+
+# Largest accepted absolute prediction delta (logD units) of an int8 model
+DEFAULT_TOLERANCE = 0.05
+
+
+def report_path(predictor, models_dir=MODELS_DIR):
+    """Accuracy check report of *predictor*."""
+    return os.path.join(models_dir, f"{predictor}_quantization.json")
+
+
+def fold_batch_norm(sequential):
+    """
+    Folds every BatchNorm1d of *sequential* into the Linear or Conv1d layer
+    before it and replaces it by Identity. Returns the number of folded layers.
+    """
+    import torch.nn as nn
+    from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+    folded = 0
+    for i in range(1, len(sequential)):
+        layer, norm = sequential[i - 1], sequential[i]
+        if not isinstance(norm, nn.BatchNorm1d):
+            continue
+        if isinstance(layer, nn.Conv1d):
+            sequential[i - 1] = fuse_conv_bn_eval(layer, norm)
+        elif isinstance(layer, nn.Linear):
+            sequential[i - 1] = fuse_linear_bn_eval(layer, norm)
+        else:
+            continue
+        sequential[i] = nn.Identity()
+        folded += 1
+    return folded
+
+
+def quantize_model(model):
+    """
+    Returns an int8 copy of a float32 DNN/CNN network loaded with
+    load_model(): BatchNorm folded, Linear layers dynamically quantised.
+    Compiled TorchScript networks (model bundles) cannot be quantised.
+    """
+    import copy
+
+    import torch
+    import torch.nn as nn
+
+    if isinstance(model, torch.jit.ScriptModule):
+        raise TypeError("Compiled TorchScript networks cannot be quantised; load the original model.")
+    model = copy.deepcopy(model).eval()
+    for module in list(model.modules()):
+        if isinstance(module, nn.Sequential):
+            fold_batch_norm(module)
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in recent PyTorch releases
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def check_models(predictor, features, models_dir=MODELS_DIR, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares the int8 and float32 predictions of the DNN/CNN models of
+    *predictor* on *features*.
+
+    Returns:
+    - results (dict): Per model_name the model file, its stamp, the largest
+      and mean absolute delta, the float32 and int8 scoring times per
+      molecule (ms) and whether it is approved.
+    """
+    import time
+
+    model_table_df = read_model_table(os.path.join(models_dir, f"{predictor}_models_info.csv"))
+    model_table_df = model_table_df[model_table_df['ML_algorithm'].isin(QUANTIZABLE)]
+    input_dim = FEATURE_COUNTS[predictor]
+    results = {}
+    for _, row in model_table_df.iterrows():
+        module = algorithm_module(row['ML_algorithm'])
+        model_path = os.path.join(models_dir, row['model_path'])
+        model = module.load_model(model_path, input_dim)
+        entry = {'model_path': row['model_path'], 'source_stamp': file_stamp(model_path)}
+        try:
+            quantized = quantize_model(model)
+        except (AttributeError, RuntimeError, TypeError) as e:
+            results[row['model_name']] = {**entry, 'approved': False, 'error': str(e)}
+            continue
+        timings = []
+        values = []
+        for network in (model, quantized):
+            module.predict(network, features.iloc[:10])  # warm-up
+            started = time.perf_counter()
+            values.append(module.predict(network, features))
+            timings.append(1000 * (time.perf_counter() - started) / len(features))
+        delta = np.abs(values[1] - values[0])
+        results[row['model_name']] = {
+            **entry,
+            'max_delta': round(float(delta.max()), 4),
+            'mean_delta': round(float(delta.mean()), 4),
+            'float32_ms': round(timings[0], 4),
+            'int8_ms': round(timings[1], 4),
+            'approved': bool(delta.max() <= tolerance),
+        }
+    return results
+
+
+def save_report(predictor, results, tolerance, reference, rows, models_dir=MODELS_DIR):
+    """
+    Writes the accuracy check report of *predictor*, checked on *rows*
+    molecules of the dataset *reference*, and returns its path.
+    """
+    path = report_path(predictor, models_dir)
+    report = {
+        'predictor': predictor,
+        'tolerance': tolerance,
+        'reference': os.path.abspath(reference),
+        'reference_rows': rows,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'models': results,
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def approved_models(predictor, models_dir=MODELS_DIR):
+    """
+    'model_path' entries of the models approved for int8 inference whose
+    files have not changed since the accuracy check. Reports that were not
+    checked on a real dataset approve no model.
+    """
+    path = report_path(predictor, models_dir)
+    if not os.path.exists(path):
+        return set()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if not report.get('reference'):
+        return set()
+    approved = set()
+    for entry in report.get('models', {}).values():
+        model_path = os.path.join(models_dir, entry.get('model_path', ''))
+        if entry.get('approved') and os.path.exists(model_path) and file_stamp(model_path) == entry.get('source_stamp'):
+            approved.add(entry['model_path'])
+    return approved
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Checks the int8 predictions of the DNN/CNN models against float32 and approves the models "
+                    "within tolerance for --quantize.")
+    parser.add_argument(
+        "--predictor",
+        nargs='+',
+        default=None,
+        choices=list(FEATURE_COUNTS),
+        help="Representations to check (default: the ones with a models table matching the --features columns)."
+    )
+    parser.add_argument(
+        "--models-dir",
+        default=MODELS_DIR,
+        help="Directory with the models tables and model files (default: joblib_models)."
+    )
+    parser.add_argument(
+        "--features",
+        required=True,
+        help="Merged dataset CSV (MOLECULE_NAME and feature columns) of real molecules used as reference; "
+             "the approval only holds for inputs like it."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Largest accepted absolute delta of a prediction (default: {DEFAULT_TOLERANCE})."
+    )
+    args = parser.parse_args()
+
+    # By default, the representations with a models table and the feature count of the dataset
+    columns = len(pd.read_csv(args.features, nrows=0).columns) - 1
+    predictors = args.predictor or [p for p in FEATURE_COUNTS if FEATURE_COUNTS[p] == columns and
+                                    os.path.exists(os.path.join(args.models_dir, f"{p}_models_info.csv"))]
+    if not predictors:
+        print(f"{COLORS[1]}No *_models_info.csv table in {args.models_dir} matches the {columns} feature columns "
+              f"of {args.features}.{RESET}")
+        return
+
+    for predictor in predictors:
+        try:
+            features = read_reference_features(args.features, predictor)
+        except ValueError as e:
+            print(f"{COLORS[1]}{e}{RESET}")
+            raise SystemExit(1)
+        print(f"Checking int8 {COLORS[2]}{predictor}{RESET} models on {len(features)} molecules ...")
+        results = check_models(predictor, features.astype(float), args.models_dir, args.tolerance)
+        print(f"   {'model':<40} {'max delta':>10} {'mean delta':>11} {'float32 ms':>11} {'int8 ms':>9}")
+        for model_name, entry in results.items():
+            color = COLORS[0] if entry['approved'] else COLORS[1]
+            if 'error' in entry:
+                print(f"   {model_name:<40} {color}not quantised: {entry['error']}{RESET}")
+                continue
+            print(f"   {model_name:<40} {entry['max_delta']:>10.4f} {entry['mean_delta']:>11.4f} "
+                  f"{entry['float32_ms']:>11.4f} {entry['int8_ms']:>9.4f}  "
+                  f"{color}{'int8' if entry['approved'] else 'float32'}{RESET}")
+        path = save_report(predictor, results, args.tolerance, args.features, len(features), args.models_dir)
+        approved = sum(entry['approved'] for entry in results.values())
+        print(f"{COLORS[0]}{approved} of {len(results)} models approved for --quantize, report saved in {path}{RESET}\n")
+
+
+if __name__ == "__main__":
+    main()
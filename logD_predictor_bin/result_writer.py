@@ -0,0 +1,172 @@
+# result_writer.py
+
+"""
+Writes the result tables of a prediction run.
+
+Every run produces two tables:
+- summary_results_<timestamp>   – Average and StdDev per property,
+- model_predictions_<timestamp> – the prediction of every model.
+
+CSV (default) keeps the semicolon-separated layout with the two-level
+summary header. Parquet and Feather store flat columns with proper dtypes
+and embed the run information (predictor, timestamp and the rows of
+<predictor>_models_info.csv) as file metadata, so large result sets load
+in seconds and stay self-describing. Both need pyarrow.
+
+Sharded runs (logD_predictor.py --shard i/N) add a shard tag to the file
+names; merge_results() combines the tables of all shards (see sharding.py).
+"""
+
+import json
+import os
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'feather']
+
+# Key of the run information in the Parquet/Feather schema metadata
+METADATA_KEY = b'logD_predictor'
+
+
+def _metadata(predictor, timestamp, model_table_df):
+    return json.dumps({
+        'predictor': predictor,
+        'timestamp': timestamp,
+        'models': model_table_df.drop(columns=['model_path'], errors='ignore').to_dict(orient='records'),
+    }, default=str).encode('utf-8')
+
+
+def _write_arrow(df, path, output_format, metadata):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: metadata})
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, path)
+
+
+def write_results(summary, summary_table, model_results, model_table_df, output_dir, timestamp,
+                  predictor, output_format='csv', tag=None):
+    """
+    Saves the summary and the per-model predictions of a run.
+
+    Parameters:
+    - summary (pd.DataFrame): MOLECULE_NAME and flat '<property>_Average' /
+      '<property>_StdDev' columns.
+    - summary_table (pd.DataFrame): The same data with the two-level header
+      shown in the console (written to CSV).
+    - model_results (pd.DataFrame): MOLECULE_NAME and one column per model.
+    - model_table_df (pd.DataFrame): The models used.
+    - output_dir (str): Directory of the files.
+    - timestamp (str): Time stamp used in the file names.
+    - predictor (str): Representation of the models.
+    - output_format (str): 'csv', 'parquet' or 'feather'.
+    - tag (str): Appended to the file names, e.g. the shard of the run.
+
+    Returns:
+    - paths (list): The written files.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}.")
+
+    suffix = f"{timestamp}_{tag}" if tag else timestamp
+    summary_path = os.path.join(output_dir, f"summary_results_{suffix}.{output_format}")
+    models_path = os.path.join(output_dir, f"model_predictions_{suffix}.{output_format}")
+
+    if output_format == 'csv':
+        summary_table.to_csv(summary_path, sep=';')
+        model_results.to_csv(models_path, index=False, sep=';')
+    else:
+        metadata = _metadata(predictor, timestamp, model_table_df)
+        _write_arrow(summary, summary_path, output_format, metadata)
+        _write_arrow(model_results, models_path, output_format, metadata)
+    return [summary_path, models_path]
+
+
+def read_results(path):
+    """
+    Reads a Parquet or Feather result file.
+
+    Returns:
+    - (df, metadata): The table and the run information stored with it
+      (None if the file has none).
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path)
+    metadata = (table.schema.metadata or {}).get(METADATA_KEY)
+    return table.to_pandas(), json.loads(metadata) if metadata else None
+
+
+def _read_shard(path, output_format, summary):
+    if output_format != 'csv':
+        return read_results(path)
+    import pandas as pd
+
+    # CSV cells are kept as text, so the merged file repeats them unchanged
+    if not summary:
+        return pd.read_csv(path, sep=';', dtype=str, keep_default_na=False), None
+    table = pd.read_csv(path, sep=';', header=[0, 1], index_col=0, dtype=str, keep_default_na=False)
+    # The empty second header cell of MOLECULE_NAME is read back as 'Unnamed: ...'
+    table.columns = pd.MultiIndex.from_tuples(
+        [(prop, '' if stat.startswith('Unnamed:') else stat) for prop, stat in table.columns])
+    return table, None
+
+
+def merge_results(shard_files, output_dir, timestamp, output_format='csv', sort_key=None, expected_rows=None):
+    """
+    Combines the result tables of the shards of a run into the tables a
+    single run would have written.
+
+    Parameters:
+    - shard_files (list): (summary_path, models_path) of every shard.
+    - output_dir (str): Directory of the merged files.
+    - timestamp (str): Time stamp used in the file names.
+    - output_format (str): Format of the shard files and the merged files.
+    - sort_key (callable): Row order, applied to the molecule names.
+    - expected_rows (int): Number of molecules of all shards together.
+
+    Returns:
+    - (paths, molecule_names): The written files and the molecule names of
+      the merged tables, in order.
+
+    Raises ValueError if a molecule appears in more than one shard or the
+    number of molecules differs from *expected_rows*.
+    """
+    import pandas as pd
+
+    summaries, models, metadata = [], [], None
+    for summary_path, models_path in shard_files:
+        summary, metadata = _read_shard(summary_path, output_format, True)
+        model_results, _ = _read_shard(models_path, output_format, False)
+        summaries.append(summary)
+        models.append(model_results)
+
+    summary = pd.concat(summaries, ignore_index=True)
+    model_results = pd.concat(models, ignore_index=True)
+    names = summary.iloc[:, 0].astype(str)
+    duplicated = names[names.duplicated()].unique().tolist()
+    if duplicated:
+        raise ValueError(f"Molecules found in more than one shard: {', '.join(duplicated[:10])}.")
+    if expected_rows is not None and len(names) != expected_rows:
+        raise ValueError(f"The shard tables hold {len(names)} molecules instead of {expected_rows}.")
+    order = sorted(range(len(names)), key=lambda i: sort_key(names.iloc[i])) if sort_key else list(range(len(names)))
+    summary = summary.iloc[order].reset_index(drop=True)
+    model_results = model_results.iloc[order].reset_index(drop=True)
+
+    summary_path = os.path.join(output_dir, f"summary_results_{timestamp}.{output_format}")
+    models_path = os.path.join(output_dir, f"model_predictions_{timestamp}.{output_format}")
+    if output_format == 'csv':
+        summary.to_csv(summary_path, sep=';')
+        model_results.to_csv(models_path, index=False, sep=';')
+    else:
+        run_information = dict(metadata or {}, timestamp=timestamp)
+        encoded = json.dumps(run_information, default=str).encode('utf-8')
+        _write_arrow(summary, summary_path, output_format, encoded)
+        _write_arrow(model_results, models_path, output_format, encoded)
+    return [summary_path, models_path], names.iloc[order].tolist()
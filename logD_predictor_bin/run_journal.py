@@ -0,0 +1,117 @@
+# run_journal.py
+
+"""
+Run journal for checkpointed command line runs (--checkpoint / --resume).
+
+A checkpointed run keeps its workspace (see workspace.py) when it does not
+finish, e.g. after an out-of-memory error, a reboot of the node or Ctrl-C,
+and can be continued with
+
+    python logD_predictor_bin/logD_predictor.py input.csv --resume <run-id>
+
+The journal (run_journal.jsonl in the workspace) records, one JSON line per
+completed stage, which stages finished and how many molecules they
+produced; a resumed run skips those stages. Inside an unfinished stage the
+per-molecule artifacts themselves are the checkpoint: every MOL file, shift
+file, bucketed spectrum and chunk of model scores is written to a *.part
+file first and renamed only when it is complete, so a file without the
+suffix is never truncated. Before they are reused, leftover *.part files
+are removed and the artifacts are checked again (MOL block terminator,
+number of buckets, scored molecule names).
+"""
+
+import hashlib
+import json
+import os
+
+JOURNAL_FILE = 'run_journal.jsonl'
+
+# Suffix of artifacts that are still being written
+PART_SUFFIX = '.part'
+
+
+def file_digest(path):
+    """SHA-256 of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish(part_path, path=None):
+    """Renames a completely written *.part file to its final name and returns it."""
+    path = path or part_path[:-len(PART_SUFFIX)]
+    os.replace(part_path, path)
+    return path
+
+
+def remove_partial(directory):
+    """Deletes the *.part files left in *directory* by an interrupted run and returns their number."""
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    for filename in os.listdir(directory):
+        if filename.endswith(PART_SUFFIX):
+            os.remove(os.path.join(directory, filename))
+            removed += 1
+    return removed
+
+
+def is_complete_mol(path):
+    """True if the MOL file at *path* ends with its 'M  END' terminator."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 64))
+            return b'M  END' in f.read()
+    except OSError:
+        return False
+
+
+def count_lines(path):
+    """Number of lines of the text file at *path*, or None if it cannot be read."""
+    try:
+        with open(path, 'rb') as f:
+            return sum(1 for _ in f)
+    except OSError:
+        return None
+
+
+class RunJournal:
+    """
+    Append-only journal of the completed stages of one run.
+
+    Parameters:
+    - work_dir (str): Workspace of the run; the journal is read from it if
+      it exists already.
+    """
+
+    def __init__(self, work_dir):
+        self.path = os.path.join(work_dir, JOURNAL_FILE)
+        self.records = []
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # The last line of a journal interrupted while writing
+                        break
+
+    def record(self, stage, key=None, **info):
+        """Appends a completed *stage* (for *key*, e.g. the nucleus) and syncs it to disk."""
+        entry = {'stage': stage, 'key': key, **info}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.records.append(entry)
+        return entry
+
+    def completed(self, stage, key=None):
+        """The last record of *stage* for *key*, or None if the stage has not finished."""
+        for entry in reversed(self.records):
+            if entry.get('stage') == stage and entry.get('key') == key:
+                return entry
+        return None
@@ -0,0 +1,223 @@
+# run_log.py
+
+"""
+Buffered run logging for logD_predictor.py.
+
+sys.stdout and sys.stderr are replaced by LogStream objects. Console output
+is written immediately, while the copy for RUN_LOG_FILE.log is handed to a
+background thread that strips the ANSI colour codes and writes the records
+in batches, so a print() costs neither a regex nor a flush() on the calling
+thread.
+
+Every complete line becomes a record with a time stamp and a level
+(stdout: INFO, stderr: WARNING, RunLog.log(): any level). Records below the
+configured level are not written. The file is either plain text (the
+console transcript, as before) or JSON lines with one structured record per
+line.
+
+Progress bars redrawn with a leading carriage return are rate-limited on
+the console and never reach the log file.
+"""
+
+import json
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_FORMATS = ['text', 'jsonl']
+
+# Seconds between two console redraws of a progress bar
+PROGRESS_INTERVAL = 0.1
+
+# Seconds after which buffered records are flushed to disk
+FLUSH_INTERVAL = 1.0
+
+ANSI_ESCAPE = re.compile(r'''
+    \x1B # ESC
+    (?:   # 7-bit C1 Fe (various sequences)
+        [@-Z\\-_]
+    | # or CSI [ - ].
+        \[
+        [0-?]* # Optional parameters.
+        [-/]* # Optional intermediate bytes.
+        [@-~] # Final byte
+    )
+''', re.VERBOSE)
+
+
+def strip_ansi_codes(s):
+    return ANSI_ESCAPE.sub('', s)
+
+
+class RunLog:
+    """
+    Asynchronous writer of the run log file.
+
+    Parameters:
+    - path (str): Log file, truncated when the log is opened.
+    - level (str): Lowest level written to the file.
+    - fmt (str): 'text' or 'jsonl'.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path, level='INFO', fmt='text'):
+        self.path = path
+        self.configure(level, fmt)
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._thread = threading.Thread(target=self._writer, name='run-log', daemon=True)
+        self._thread.start()
+
+    def configure(self, level='INFO', fmt='text'):
+        """Changes the level filter and the file format of later records."""
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level '{level}'. Choose one of: {', '.join(LOG_LEVELS)}.")
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format '{fmt}'. Choose one of: {', '.join(LOG_FORMATS)}.")
+        self.level = level
+        self.fmt = fmt
+        self._threshold = LOG_LEVELS[level]
+
+    def enabled_for(self, level):
+        return LOG_LEVELS[level] >= self._threshold
+
+    def record(self, level, message):
+        """Queues one log record; the calling thread does no I/O."""
+        if LOG_LEVELS[level] >= self._threshold:
+            self._queue.put((time.time(), level, message))
+
+    def log(self, level, message, console=None):
+        """
+        Records *message* as *level* and, if *console* is given, writes it
+        there as well.
+        """
+        if console is not None:
+            console.write(message + '\n')
+            console.flush()
+        for line in message.split('\n'):
+            self.record(level, line)
+
+    def _format(self, created, level, message):
+        message = strip_ansi_codes(message)
+        if self.fmt == 'jsonl':
+            return json.dumps({
+                'time': datetime.fromtimestamp(created).isoformat(timespec='milliseconds'),
+                'level': level,
+                'message': message,
+            }, ensure_ascii=False) + '\n'
+        return message + '\n'
+
+    def _writer(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self._file.flush()
+                last_flush = time.monotonic()
+                continue
+
+            # Drain everything that is already queued in one batch
+            batch = []
+            while item is not self._STOP:
+                batch.append(self._format(*item))
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._file.writelines(batch)
+
+            if item is self._STOP:
+                self._file.flush()
+                return
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+    def close(self):
+        """Writes all pending records and closes the file."""
+        if self._file.closed:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._file.close()
+
+
+class LogStream:
+    """
+    File-like replacement of sys.stdout / sys.stderr.
+
+    Parameters:
+    - console: The original stream (sys.__stdout__ or sys.__stderr__).
+    - run_log (RunLog): Receives one record per complete line.
+    - level (str): Level of the records written through this stream.
+    """
+
+    def __init__(self, console, run_log, level='INFO'):
+        self.console = console
+        self.run_log = run_log
+        self.level = level
+        self._partial = ''
+        self._pending_redraw = None
+        self._last_redraw = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, obj):
+        with self._lock:
+            if '\r' in obj and '\n' not in obj:
+                self._redraw(obj)
+                return len(obj)
+
+            if self._pending_redraw is not None:
+                # Show the final state of a bar whose last redraw was skipped
+                self.console.write(self._pending_redraw)
+                self._pending_redraw = None
+            # Interactive consoles are line-buffered already
+            self.console.write(obj)
+
+            if self.run_log.enabled_for(self.level):
+                lines = (self._partial + obj).split('\n')
+                self._partial = lines.pop()
+                for line in lines:
+                    # Keep only the text after the last redraw of a line
+                    self.run_log.record(self.level, line.rsplit('\r', 1)[-1])
+            return len(obj)
+
+    def _redraw(self, obj):
+        now = time.monotonic()
+        if now - self._last_redraw < PROGRESS_INTERVAL:
+            self._pending_redraw = obj
+            return
+        self._last_redraw = now
+        self._pending_redraw = None
+        self.console.write(obj)
+        self.console.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pending_redraw is not None:
+                self.console.write(self._pending_redraw)
+                self._pending_redraw = None
+            self.console.flush()
+
+    def close_line(self):
+        """Records an unterminated last line (e.g. before the log is closed)."""
+        with self._lock:
+            if self._partial:
+                self.run_log.record(self.level, self._partial.rsplit('\r', 1)[-1])
+                self._partial = ''
+
+    def isatty(self):
+        return self.console.isatty()
+
+    def fileno(self):
+        return self.console.fileno()
+
+    @property
+    def encoding(self):
+        return self.console.encoding
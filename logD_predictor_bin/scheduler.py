@@ -0,0 +1,190 @@
+# scheduler.py
+
+"""
+Cost-aware ordering of the per-molecule work of parallel stages.
+
+Embedding a molecule (gen_mols) and predicting its shifts (Java
+PredictionTool) take longer the more heavy atoms and rings it has, and a few
+macrocycles at the end of the input leave every other worker idle while
+they finish. With --workers N the parallel stages therefore hand out the
+molecules longest-first:
+
+- MOL generation submits the molecules to its worker processes in the order
+  of decreasing estimated cost,
+- the Java prediction splits the MOL files into N balanced parts (greedy
+  longest-first assignment, see partition()) and runs one BatchProcessor
+  per part.
+
+The cost of a molecule is estimated from cheap RDKit descriptors
+(descriptors()) by a linear CostModel per stage. A built-in prior ranks the
+molecules by size and ring complexity; after every run the measured
+per-molecule times are stored in Prediction_Results/cost_model.json and the
+model is refitted to them, so the estimates follow the machine and the
+chemistry actually processed. Until MIN_SAMPLES timings exist, the fit is
+blended with the prior (scaled to the measured times), so a few runs
+already shift the estimates towards the measurements.
+"""
+
+import heapq
+import json
+import os
+
+import numpy as np
+
+# Descriptors of the cost model, in this order
+DESCRIPTOR_NAMES = ['constant', 'heavy_atoms', 'heavy_atoms_squared', 'rings', 'macrocycle',
+                    'rotatable_bonds', 'hydrogens']
+
+# Prior cost (arbitrary units) used until enough timings have been recorded
+PRIOR_WEIGHTS = [1.0, 1.0, 0.02, 2.0, 20.0, 0.5, 0.2]
+
+# Timings kept per stage for fitting, needed before the prior is blended
+# with the fit, and needed before the fit replaces the prior completely
+MAX_SAMPLES = 5000
+MIN_BLEND_SAMPLES = 3
+MIN_SAMPLES = 50
+
+COST_MODEL_FILE = os.path.join("Prediction_Results", "cost_model.json")
+
+
+def descriptors(mol):
+    """Cost descriptors (DESCRIPTOR_NAMES) of an RDKit molecule."""
+    from rdkit import Chem
+    from rdkit.Chem import rdMolDescriptors
+
+    ring_info = mol.GetRingInfo()
+    try:
+        ring_info.NumRings()
+    except RuntimeError:  # unsanitised molecules have no ring information
+        Chem.FastFindRings(mol)
+        ring_info = mol.GetRingInfo()
+    heavy = mol.GetNumHeavyAtoms()
+    largest_ring = max((len(ring) for ring in ring_info.AtomRings()), default=0)
+    hydrogens = sum(atom.GetTotalNumHs(includeNeighbors=True) for atom in mol.GetAtoms() if atom.GetAtomicNum() > 1)
+    try:
+        rotatable = rdMolDescriptors.CalcNumRotatableBonds(mol)
+    except Exception:  # unsanitised molecules
+        rotatable = 0
+    return [1.0, heavy, heavy * heavy, ring_info.NumRings(), float(largest_ring >= 12), rotatable, hydrogens]
+
+
+def smiles_descriptors(smiles):
+    """Descriptors of a SMILES string (a small default if it cannot be parsed)."""
+    from rdkit import Chem
+
+    mol = Chem.MolFromSmiles(str(smiles))
+    if mol is None:
+        return [1.0, 1, 1, 0, 0.0, 0, 0]
+    return descriptors(mol)
+
+
+def mol_file_descriptors(path):
+    """Descriptors of a MOL file."""
+    from rdkit import Chem
+
+    mol = Chem.MolFromMolFile(path, sanitize=False, removeHs=False)
+    if mol is None:
+        return [1.0, 1, 1, 0, 0.0, 0, 0]
+    mol.UpdatePropertyCache(strict=False)
+    return descriptors(mol)
+
+
+class CostModel:
+    """
+    Linear per-molecule cost model of the parallel stages.
+
+    Parameters:
+    - path (str): JSON file with the recorded timings and fitted weights
+      (None keeps everything in memory).
+    """
+
+    def __init__(self, path=COST_MODEL_FILE):
+        self.path = path
+        self.stages = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.stages = json.load(f).get('stages', {})
+            except (OSError, ValueError):
+                self.stages = {}
+
+    def weights(self, stage):
+        """Fitted weights of *stage*, or the prior."""
+        return self.stages.get(stage, {}).get('weights') or PRIOR_WEIGHTS
+
+    def estimate(self, stage, rows):
+        """Estimated cost of every descriptor row in *rows*."""
+        if len(rows) == 0:
+            return np.zeros(0)
+        costs = np.asarray(rows, dtype=float) @ np.asarray(self.weights(stage), dtype=float)
+        return np.maximum(costs, 1e-6)
+
+    def add_samples(self, stage, rows, seconds):
+        """Records measured *seconds* of molecules with descriptor *rows*."""
+        entry = self.stages.setdefault(stage, {'samples': [], 'weights': None})
+        entry['samples'].extend([list(map(float, row)), float(s)] for row, s in zip(rows, seconds))
+        del entry['samples'][:-MAX_SAMPLES]
+
+    def fit(self, stage):
+        """
+        Refits *stage* by non-negative least squares. With fewer than
+        MIN_SAMPLES timings the fit is blended with the prior scaled to the
+        timings, weighted by the share of MIN_SAMPLES that was recorded.
+        """
+        entry = self.stages.get(stage)
+        if not entry or len(entry['samples']) < MIN_BLEND_SAMPLES:
+            return None
+        X = np.array([row for row, _ in entry['samples']], dtype=float)
+        y = np.array([s for _, s in entry['samples']], dtype=float)
+        active = list(range(X.shape[1]))
+        # Drop descriptors with a negative weight until all are non-negative
+        while active:
+            solution, *_ = np.linalg.lstsq(X[:, active], y, rcond=None)
+            if (solution >= 0).all():
+                break
+            active.pop(int(np.argmin(solution)))
+        weights = np.zeros(X.shape[1])
+        weights[active] = solution if active else 0.0
+        if len(y) < MIN_SAMPLES:
+            prior = X @ np.asarray(PRIOR_WEIGHTS, dtype=float)
+            scale = float(prior @ y) / float(prior @ prior) if prior.any() else 0.0
+            share = len(y) / MIN_SAMPLES
+            weights = share * weights + (1 - share) * max(scale, 0.0) * np.asarray(PRIOR_WEIGHTS, dtype=float)
+        entry['weights'] = weights.tolist() if weights.any() else None
+        return entry['weights']
+
+    def save(self):
+        """Refits every stage and writes the model file."""
+        for stage in self.stages:
+            self.fit(stage)
+        if not self.path:
+            return None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'descriptors': DESCRIPTOR_NAMES, 'stages': self.stages}, f)
+        os.replace(self.path + '.tmp', self.path)
+        return self.path
+
+
+def longest_first(costs):
+    """Indices of *costs* from the most to the least expensive (stable for ties)."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def partition(costs, parts, order=None):
+    """
+    Splits items into *parts* groups of similar total cost: the items are
+    taken in *order* (default: longest first) and each goes to the group
+    with the lowest total so far.
+
+    Returns:
+    - groups (list): One list of item indices per group.
+    """
+    order = order if order is not None else longest_first(costs)
+    loads = [(0.0, part) for part in range(parts)]
+    groups = [[] for _ in range(parts)]
+    for i in order:
+        load, part = heapq.heappop(loads)
+        groups[part].append(i)
+        heapq.heappush(loads, (load + costs[i], part))
+    return groups
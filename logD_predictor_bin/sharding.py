@@ -0,0 +1,242 @@
+# sharding.py
+
+"""
+Deterministic sharding of a library over several nodes and merging of the
+shard results.
+
+Every node runs the same input file with its own shard:
+
+    python logD_predictor_bin/logD_predictor.py library.csv --predictor hybrid --use_svr --shard 1/4
+    python logD_predictor_bin/logD_predictor.py library.csv --predictor hybrid --use_svr --shard 2/4
+    ...
+
+The molecules are assigned to the shards from the verified input alone, so
+every node computes the same split without talking to the others: the
+molecules are taken from the most to the least expensive (estimated from
+the SMILES, see estimate_cost()), ties broken by a hash of name and SMILES,
+and each one goes to the shard with the lowest total cost so far. The split
+does not depend on the row order of the input file.
+
+A shard writes its result tables with a shard-<i>-of-<N> tag and a
+shard_<i>-of-<N>_<timestamp>.json manifest. Once all shards are collected
+in one results folder,
+
+    python logD_predictor_bin/sharding.py --predictor hybrid
+
+checks that every shard of the same input is present exactly once and
+merges them into the summary and per-model tables a single-node run writes.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from result_writer import merge_results
+from scheduler import partition
+
+# ANSI color
+COLORS = ['\033[38;5;46m',    # Green
+          '\033[38;5;196m',   # Red
+          '\033[38;5;214m'    # Orange
+         ]
+RESET = '\033[0m'
+
+# Atoms of a SMILES string: bracket atoms and the organic subset
+SMILES_ATOM = re.compile(r"\[[^\]]+\]|Br|Cl|[BCNOPSFI]|[bcnops]")
+
+MANIFEST_PATTERN = re.compile(r"shard_(\d+)-of-(\d+)_(.+)\.json$")
+
+
+def parse_shard(text):
+    """Parses 'i/N' (1 <= i <= N) into (i, N)."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", text)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"Invalid shard '{text}'. Use i/N with 1 <= i <= N, e.g. 2/8.")
+    return int(match.group(1)), int(match.group(2))
+
+
+def shard_tag(shard, shards):
+    """Tag of the result files of shard *shard* of *shards*."""
+    return f"shard-{shard}-of-{shards}"
+
+
+def estimate_cost(smiles):
+    """Relative processing cost of a molecule: its number of heavy atoms."""
+    return max(1, len(SMILES_ATOM.findall(str(smiles))))
+
+
+def _stable_hash(name, smiles):
+    return hashlib.sha1(f"{name}\t{smiles}".encode('utf-8')).hexdigest()
+
+
+def assign_shards(names, smiles, shards, costs=None):
+    """
+    Shard number (1..shards) of every molecule, balanced by cost.
+
+    Parameters:
+    - names (list): Molecule names.
+    - smiles (list): SMILES strings.
+    - shards (int): Number of shards.
+    - costs (list): Cost of every molecule (default: estimate_cost()).
+
+    Returns:
+    - assignment (list): Shard number of every molecule, in input order.
+    """
+    costs = costs if costs is not None else [estimate_cost(s) for s in smiles]
+    order = sorted(range(len(names)), key=lambda i: (-costs[i], _stable_hash(names[i], smiles[i])))
+    assignment = [0] * len(names)
+    for shard, group in enumerate(partition(costs, shards, order), start=1):
+        for i in group:
+            assignment[i] = shard
+    return assignment
+
+
+def select_shard(verified_csv_path, shard, shards):
+    """
+    Keeps only the rows of *shard* in the verified CSV file (rewritten in
+    place). Rows with a repeated MOLECULE_NAME are dropped first, as the
+    pipeline does.
+
+    Returns:
+    - (selected, total): Number of molecules of the shard and of the input.
+    """
+    data = pd.read_csv(verified_csv_path, dtype={'MOLECULE_NAME': str})
+    data = data.drop_duplicates(subset='MOLECULE_NAME', keep='first')
+    assignment = assign_shards(data['MOLECULE_NAME'].tolist(), data['SMILES'].tolist(), shards)
+    selected = data[[number == shard for number in assignment]]
+    selected.to_csv(verified_csv_path, index=False)
+    return len(selected), len(data)
+
+
+def write_manifest(output_dir, shard, shards, result_paths, predictor, input_path, input_sha256, selected, molecules):
+    """
+    Saves the manifest of a finished shard next to its result files and
+    returns its path. *selected* is the number of input molecules of the
+    shard, *molecules* the number of rows of its result tables.
+    """
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    output_format = os.path.splitext(result_paths[0])[1].lstrip('.')
+    manifest = {
+        'shard': shard,
+        'shards': shards,
+        'predictor': predictor,
+        'input': os.path.abspath(input_path),
+        'input_sha256': input_sha256,
+        'selected': selected,
+        'molecules': molecules,
+        'output_format': output_format,
+        'summary': os.path.basename(result_paths[0]),
+        'models': os.path.basename(result_paths[1]),
+        'timestamp': timestamp,
+    }
+    path = os.path.join(output_dir, f"shard_{shard}-of-{shards}_{timestamp}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def read_manifests(paths):
+    manifests = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['path'] = path
+        manifests.append(manifest)
+    return manifests
+
+
+def check_shards(manifests):
+    """
+    Raises ValueError unless *manifests* describe every shard of one input
+    exactly once.
+    """
+    if not manifests:
+        raise ValueError("No shard manifests found.")
+    runs = {(m['input_sha256'], m['shards'], m['predictor'], m['output_format']) for m in manifests}
+    if len(runs) > 1:
+        raise ValueError("The manifests belong to different inputs, shard counts, representations or formats: "
+                         + "; ".join(f"{p} {n} shards of input {d[:12]} ({f})" for d, n, p, f in sorted(runs))
+                         + ". Pass the manifests of one run with --manifests.")
+    shards = manifests[0]['shards']
+    found = {}
+    for manifest in manifests:
+        found.setdefault(manifest['shard'], []).append(os.path.basename(manifest['path']))
+    duplicates = {shard: files for shard, files in found.items() if len(files) > 1}
+    missing = [shard for shard in range(1, shards + 1) if shard not in found]
+    problems = []
+    if missing:
+        problems.append(f"missing shards {', '.join(f'{s}/{shards}' for s in missing)}")
+    if duplicates:
+        problems.append("duplicate shards " + "; ".join(f"{s}/{shards}: {', '.join(files)}"
+                                                          for s, files in sorted(duplicates.items())))
+    if problems:
+        raise ValueError("Cannot merge: " + ", ".join(problems) + ".")
+
+
+def merge_shards(manifests, output_dir):
+    """
+    Merges the result tables of the shards described by *manifests*.
+
+    Returns:
+    - paths (list): The merged summary and per-model files.
+    """
+    check_shards(manifests)
+    manifests = sorted(manifests, key=lambda m: m['shard'])
+    shard_files = []
+    for manifest in manifests:
+        directory = os.path.dirname(manifest['path'])
+        shard_files.append((os.path.join(directory, manifest['summary']), os.path.join(directory, manifest['models'])))
+
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    # Rows in the order of a single-node run (merger() sorts the <name>.csv files)
+    paths, _ = merge_results(shard_files, output_dir, timestamp, manifests[0]['output_format'],
+                             sort_key=lambda name: f"{name}.csv",
+                             expected_rows=sum(m['molecules'] for m in manifests))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merges the results of a run split with logD_predictor.py --shard i/N into one summary.")
+    parser.add_argument(
+        "--predictor",
+        default='hybrid',
+        choices=['1H', '13C', 'FP', 'hybrid'],
+        help="Representation of the run (default: hybrid)."
+    )
+    parser.add_argument(
+        "--results-dir",
+        default=None,
+        help="Folder with the shard results (default: Prediction_Results/<predictor>_logD_results)."
+    )
+    parser.add_argument(
+        "--manifests",
+        nargs='+',
+        default=None,
+        help="Shard manifests (shard_<i>-of-<N>_*.json) to merge instead of all manifests of the results folder."
+    )
+    args = parser.parse_args()
+
+    results_dir = args.results_dir or os.path.join(os.getcwd(), "Prediction_Results", f'{args.predictor}_logD_results')
+    paths = args.manifests or sorted(path for path in glob.glob(os.path.join(results_dir, 'shard_*-of-*_*.json'))
+                                     if MANIFEST_PATTERN.search(os.path.basename(path)))
+    try:
+        manifests = [m for m in read_manifests(paths) if m['predictor'] == args.predictor]
+        merged = merge_shards(manifests, results_dir)
+    except ValueError as e:
+        print(f"{COLORS[1]}{e}{RESET}")
+        raise SystemExit(1)
+
+    print(f"Merged {COLORS[2]}{len(manifests)}{RESET} shards:")
+    for path in merged:
+        print(f"   {COLORS[0]}{path}{RESET}")
+
+
+if __name__ == "__main__":
+    main()
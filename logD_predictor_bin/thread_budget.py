@@ -0,0 +1,130 @@
+# thread_budget.py
+
+"""
+CPU thread budget shared by the JVM and the native libraries.
+
+The Java BatchProcessor, XGBoost (OpenMP), PyTorch (intra-op pool) and the
+BLAS under scikit-learn each default to one thread per core, and trample
+each other when they run concurrently or next to other jobs. configure()
+sets one process-wide budget (logD_predictor.py --threads / --cpu-budget):
+
+- the OpenMP/BLAS environment variables are set before the libraries are
+  imported (they are imported lazily, see profiler.timed_import), and
+  libraries that are already loaded are limited directly,
+- java_options() passes the budget to the JVM (-XX:ActiveProcessorCount)
+  together with the heap size,
+- the ensemble executor in model_query splits the budget between the
+  concurrently running models and limits every library to its share with
+  limit_threads().
+- the MOL generation workers of gen_mols (--workers) are capped at the
+  budget and limit their libraries to their share in the same way.
+
+RDKit embeds one molecule at a time and is single-threaded already.
+"""
+
+import contextlib
+import os
+import sys
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # threadpoolctl ships with scikit-learn, but is optional here
+    threadpool_limits = None
+
+
+# Read by the OpenMP / BLAS runtimes when they are loaded
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Total threads of this process set by configure(); None = all CPUs
+BUDGET = None
+
+
+def available_cpus():
+    """Number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on Windows / macOS
+        return os.cpu_count() or 1
+
+
+def resolve_budget(threads=None, cpu_budget=None):
+    """
+    Total number of threads for *threads* (absolute) or *cpu_budget* (share
+    of the available CPUs, e.g. 0.5); all CPUs if neither is given.
+    """
+    if threads is not None:
+        if threads < 1:
+            raise ValueError("The thread budget must be at least 1.")
+        return int(threads)
+    if cpu_budget is not None:
+        if not 0 < cpu_budget <= 1:
+            raise ValueError("The CPU budget must be a fraction between 0 and 1.")
+        return max(1, round(available_cpus() * cpu_budget))
+    return available_cpus()
+
+
+def configure(threads=None, cpu_budget=None):
+    """
+    Sets the thread budget of this process and returns it. Without
+    arguments nothing is limited and every library keeps its default.
+    """
+    global BUDGET
+    if threads is None and cpu_budget is None:
+        BUDGET = None
+        return available_cpus()
+
+    BUDGET = resolve_budget(threads, cpu_budget)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(BUDGET)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(BUDGET)
+    if threadpool_limits is not None:
+        threadpool_limits(limits=BUDGET)
+    return BUDGET
+
+
+def budget():
+    """Current total thread budget (all CPUs unless configure() limited it)."""
+    return BUDGET or available_cpus()
+
+
+def java_options(heap='1g', extra=None):
+    """
+    JVM options of the BatchProcessor: the heap size, the thread budget
+    (if one is set) and any *extra* options (a string).
+    """
+    options = [f'-Xmx{heap}']
+    if BUDGET is not None:
+        # Sizes the GC and common fork-join pools of the JVM
+        options.append(f'-XX:ActiveProcessorCount={BUDGET}')
+    if extra:
+        options.extend(extra.split())
+    return options
+
+
+def share(total, parts):
+    """Threads per part when *total* threads are split into *parts*."""
+    return max(1, int(total) // max(1, int(parts)))
+
+
+@contextlib.contextmanager
+def limit_threads(threads):
+    """
+    Limits the BLAS/OpenMP thread pools and the PyTorch intra-op threads to
+    *threads* while the block runs and restores the previous settings.
+    XGBoost boosters are configured with their share once instead (see
+    model_query.get_model()).
+    """
+    torch = sys.modules.get('torch')  # only limited if a model already imported it
+    torch_threads = torch.get_num_threads() if torch is not None else None
+    if torch is not None:
+        torch.set_num_threads(threads)
+    limits = threadpool_limits(limits=threads) if threadpool_limits is not None else contextlib.nullcontext()
+    try:
+        with limits:
+            yield
+    finally:
+        if torch is not None:
+            torch.set_num_threads(torch_threads)
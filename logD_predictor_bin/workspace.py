@@ -0,0 +1,102 @@
+# workspace.py
+
+"""
+Per-run scratch workspace of the command line pipeline.
+
+Every run of logD_predictor.py writes its intermediate files (verified CSV,
+.mol files, predicted spectra, bucketed spectra, merged matrices and model
+queries) into its own directory, so concurrent runs started from the same
+folder never overwrite each other's files and nothing is left in the
+working directory.
+
+The workspace is created below a selectable root:
+
+- --scratch-root <dir> on the command line,
+- else the LOGD_SCRATCH_ROOT environment variable,
+- else the system temporary directory.
+
+Pointing the root at a RAM-backed file system such as /dev/shm keeps the
+many small per-molecule files off the disk. The workspace is removed when
+the run ends, successfully or not, unless it is kept for debugging or, with
+--checkpoint, to resume a run that did not finish (see run_journal.py).
+"""
+
+import os
+import shutil
+import tempfile
+
+# Environment variable with the default root of the workspaces
+SCRATCH_ROOT_ENV = 'LOGD_SCRATCH_ROOT'
+
+# Prefix of the workspace directories; the rest of the name is the run id
+WORKSPACE_PREFIX = 'logD_run_'
+
+# Files of the workspace copied to the working directory before it is removed,
+# as <run id>_<name> so that concurrent runs do not overwrite each other's logs
+KEEP_FILES = ('mol_creation_error.log', 'mol_creation_warning.log', 'nmr_prediction_error.log')
+
+
+def scratch_root(root=None):
+    """Root directory of the workspaces (None = system temporary directory)."""
+    return root or os.environ.get(SCRATCH_ROOT_ENV) or None
+
+
+class Workspace:
+    """
+    Unique scratch directory of one run, usable as a context manager.
+
+    Parameters:
+    - root (str): Parent directory (see scratch_root()).
+    - keep (bool): If True, the directory is not removed at the end.
+    - prefix (str): Prefix of the directory name.
+    - run_id (str): Reopens the workspace of this earlier run (or the
+      workspace directory given as a path) instead of creating a new one.
+    """
+
+    def __init__(self, root=None, keep=False, prefix=WORKSPACE_PREFIX, run_id=None):
+        root = scratch_root(root)
+        self.prefix = prefix
+        self.keep = keep
+        if run_id is not None:
+            self.path = run_id if os.path.isdir(run_id) else os.path.join(root or tempfile.gettempdir(), prefix + run_id)
+            if not os.path.isdir(self.path):
+                raise FileNotFoundError(f"No workspace of run '{run_id}' found ({self.path}).")
+            return
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=root)
+
+    @property
+    def run_id(self):
+        """Identifier of the run, accepted by --resume."""
+        name = os.path.basename(os.path.normpath(self.path))
+        return name[len(self.prefix):] if name.startswith(self.prefix) else self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
+
+    def collect(self, destination=None, names=KEEP_FILES):
+        """
+        Copies the *names* files that exist in the workspace to
+        *destination* (default: the current working directory) as
+        <run id>_<name> and returns the copied paths.
+        """
+        destination = destination or os.getcwd()
+        run_id = os.path.basename(os.path.normpath(self.run_id))
+        copied = []
+        for name in names:
+            source = os.path.join(self.path, name)
+            if os.path.exists(source):
+                copied.append(shutil.copy2(source, os.path.join(destination, f'{run_id}_{name}')))
+        return copied
+
+    def cleanup(self):
+        """Removes the workspace unless it is kept. Returns True if it was removed."""
+        if self.keep or not os.path.exists(self.path):
+            return False
+        shutil.rmtree(self.path, ignore_errors=True)
+        return True
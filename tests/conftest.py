@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline modules are flat modules of logD_predictor_bin
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logD_predictor_bin"))
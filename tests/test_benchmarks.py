@@ -0,0 +1,32 @@
+"""
+Baseline comparison of benchmarks/run_benchmarks.py: throughput drops and
+peak memory growth beyond the tolerance are both regressions.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+run_benchmarks = pytest.importorskip("run_benchmarks")
+
+
+def results(molecules_per_s, peak_rss_mb):
+    stage = {'stage': 'query', 'molecules_per_s': molecules_per_s, 'peak_rss_mb': peak_rss_mb}
+    return {'benchmarks': [{'size': 100, 'representation': 'FP', 'stages': [stage]}]}
+
+
+def test_within_tolerance_passes():
+    assert run_benchmarks.compare(results(95.0, 210.0), results(100.0, 200.0), 0.2) == []
+
+
+def test_memory_growth_is_a_regression():
+    regressions = run_benchmarks.compare(results(100.0, 300.0), results(100.0, 200.0), 0.2)
+    assert [r['metric'] for r in regressions] == ['peak_rss_mb']
+    assert regressions[0]['baseline_peak_rss_mb'] == 200.0
+
+
+def test_throughput_drop_is_a_regression():
+    regressions = run_benchmarks.compare(results(50.0, 200.0), results(100.0, 200.0), 0.2)
+    assert [r['metric'] for r in regressions] == ['molecules_per_s']
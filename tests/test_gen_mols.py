@@ -0,0 +1,79 @@
+"""
+MOL generation in worker processes: a molecule that hangs past its time
+limit is killed and logged, the others are still written.
+"""
+
+import multiprocessing
+import os
+import time
+
+import pytest
+
+pytest.importorskip("rdkit")
+pd = pytest.importorskip("pandas")
+
+import gen_mols
+
+MOLECULES = {"ethanol": "CCO", "hangs": "c1ccccc1O", "toluene": "Cc1ccccc1"}
+
+
+def write_input(path):
+    pd.DataFrame({"MOLECULE_NAME": list(MOLECULES), "SMILES": list(MOLECULES.values())}).to_csv(path, index=False)
+
+
+def test_molecules_are_written(tmp_path):
+    csv_path = str(tmp_path / "input.csv")
+    write_input(csv_path)
+    output_dir = gen_mols.generate_mol_files(csv_path, work_dir=str(tmp_path), workers=2, quiet=True)
+    assert sorted(os.listdir(output_dir)) == sorted(f"{name}.mol" for name in MOLECULES)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the patched build_mol_file only reaches forked workers")
+def test_hung_molecule_is_killed(monkeypatch, tmp_path):
+    build_mol_file = gen_mols.build_mol_file
+
+    def hang(name, smiles, output_dir, timeout):
+        if name == "hangs":
+            time.sleep(60)
+        return build_mol_file(name, smiles, output_dir, timeout)
+
+    monkeypatch.setattr(gen_mols, "build_mol_file", hang)
+    monkeypatch.setattr(gen_mols, "KILL_GRACE", 0.5)
+    csv_path = str(tmp_path / "input.csv")
+    write_input(csv_path)
+    started = time.time()
+    output_dir = gen_mols.generate_mol_files(csv_path, work_dir=str(tmp_path), timeout=0.5, quiet=True)
+
+    assert time.time() - started < 30
+    assert sorted(os.listdir(output_dir)) == ["ethanol.mol", "toluene.mol"]
+    with open(tmp_path / "mol_creation_error.log", encoding="utf-8") as f:
+        assert "Molecule: hangs" in f.read()
+
+
+def test_openbabel_fallback_removes_its_temporary_file(monkeypatch, tmp_path):
+    def missing_obabel(*args, **kwargs):
+        raise FileNotFoundError("obabel")
+
+    monkeypatch.setattr(gen_mols.tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(gen_mols.subprocess, "run", missing_obabel)
+    mol = gen_mols.Chem.MolFromSmiles("CCO")
+    with pytest.raises(FileNotFoundError):
+        gen_mols.openbabel_fallback(mol, str(tmp_path / "out.mol"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_workers_are_capped_by_the_thread_budget(monkeypatch, tmp_path):
+    started = []
+    start_worker = gen_mols._start_worker
+
+    def counting_start_worker(output_dir, timeout, threads):
+        started.append(threads)
+        return start_worker(output_dir, timeout, threads)
+
+    monkeypatch.setattr(gen_mols.thread_budget, "BUDGET", 2)
+    monkeypatch.setattr(gen_mols, "_start_worker", counting_start_worker)
+    csv_path = str(tmp_path / "input.csv")
+    write_input(csv_path)
+    gen_mols.generate_mol_files(csv_path, work_dir=str(tmp_path), workers=8, quiet=True)
+    assert started == [1, 1]
@@ -0,0 +1,76 @@
+"""
+Micro-batching of logD_server: timed-out requests are not scored, and a
+failing molecule only fails its own request.
+"""
+
+import threading
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("rdkit")
+
+from logD_server import MicroBatcher
+
+
+class FakePredictor:
+    """Scores SMILES by length; 'bad' SMILES fail, and the first call can be held."""
+
+    def __init__(self):
+        self.calls = []
+        self.called = threading.Event()
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def predict(self, smiles, names=None):
+        self.calls.append(list(smiles))
+        self.called.set()
+        self.hold.wait()
+        if any(s == 'bad' for s in smiles):
+            raise ValueError("could not parse 'bad'")
+        return pd.DataFrame({'SMILES': smiles, 'logD': [float(len(s)) for s in smiles]})
+
+
+def submit_all(batcher, requests):
+    outcomes = [None] * len(requests)
+
+    def run(i, smiles):
+        try:
+            outcomes[i] = batcher.submit(smiles, timeout=10)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, smiles)) for i, smiles in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_failing_molecule_only_fails_its_request():
+    predictor = FakePredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=64, max_wait=0.5)
+    outcomes = submit_all(batcher, [['CCO'], ['bad'], ['CCCC', 'CN']])
+
+    assert list(outcomes[0]['logD']) == [3.0]
+    assert isinstance(outcomes[1], ValueError)
+    assert list(outcomes[2]['logD']) == [4.0, 2.0]
+    assert batcher.stats()['errors'] == 1
+
+
+def test_timed_out_request_is_not_scored():
+    predictor = FakePredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=64, max_wait=0.0)
+    predictor.hold.clear()
+    first = threading.Thread(target=batcher.submit, args=(['CCO'],))
+    first.start()
+    assert predictor.called.wait(10)
+    with pytest.raises(TimeoutError):
+        batcher.submit(['CCCCO'], timeout=0.05)
+    predictor.hold.set()
+    first.join()
+
+    assert list(batcher.submit(['CN'], timeout=10)['logD']) == [2.0]
+    assert ['CCCCO'] not in predictor.calls
+    assert batcher.stats()['cancelled'] == 1
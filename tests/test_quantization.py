@@ -0,0 +1,40 @@
+"""
+--quantize approvals: only reports checked on a real reference dataset
+approve models, and only while the model files are unchanged.
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+import quantization
+from model_bundle import file_stamp
+
+
+def write_report(models_dir, **fields):
+    model_path = models_dir / "hybrid_CHI_logD_pH_7.4_dnn.pth"
+    model_path.write_bytes(b"weights")
+    report = {'predictor': 'hybrid', 'tolerance': 0.05, **fields,
+              'models': {'hybrid_DNN': {'model_path': model_path.name, 'source_stamp': file_stamp(str(model_path)),
+                                        'max_delta': 0.01, 'approved': True}}}
+    (models_dir / "hybrid_quantization.json").write_text(json.dumps(report))
+    return model_path
+
+
+def test_report_with_reference_dataset_approves(tmp_path):
+    model_path = write_report(tmp_path, reference=str(tmp_path / "merged.csv"), reference_rows=100)
+    assert quantization.approved_models('hybrid', str(tmp_path)) == {model_path.name}
+
+
+def test_report_without_reference_dataset_approves_nothing(tmp_path):
+    write_report(tmp_path, reference_rows=1000)
+    assert quantization.approved_models('hybrid', str(tmp_path)) == set()
+
+
+def test_changed_model_file_is_not_approved(tmp_path):
+    model_path = write_report(tmp_path, reference=str(tmp_path / "merged.csv"), reference_rows=100)
+    model_path.write_bytes(b"retrained weights")
+    assert quantization.approved_models('hybrid', str(tmp_path)) == set()
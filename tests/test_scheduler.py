@@ -0,0 +1,95 @@
+"""Cost model of the --workers stages: the fitted timings replace the prior."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scheduler import DESCRIPTOR_NAMES, MIN_BLEND_SAMPLES, MIN_SAMPLES, PRIOR_WEIGHTS, CostModel
+
+STAGE = 'predict_spectra_1H'
+
+# Measured cost driven by the hydrogens only, unlike the prior (rings, macrocycles)
+TRUE_WEIGHTS = np.zeros(len(DESCRIPTOR_NAMES))
+TRUE_WEIGHTS[DESCRIPTOR_NAMES.index('hydrogens')] = 0.01
+
+
+def molecules(count, seed=0):
+    """Descriptor rows (DESCRIPTOR_NAMES) of random molecules."""
+    rng = np.random.default_rng(seed)
+    heavy = rng.integers(5, 60, count)
+    return [[1.0, h, h * h, rng.integers(0, 6), float(rng.random() < 0.1), rng.integers(0, 12), rng.integers(0, 80)]
+            for h in heavy]
+
+
+# Few hydrogens but many rings, and the reverse
+RINGS = [1.0, 30, 900, 6, 1.0, 0, 2]
+CHAINS = [1.0, 30, 900, 0, 0.0, 20, 62]
+
+
+def test_prior_until_enough_samples():
+    model = CostModel(path=None)
+    rows = molecules(MIN_BLEND_SAMPLES - 1)
+    model.add_samples(STAGE, rows, np.asarray(rows, dtype=float) @ TRUE_WEIGHTS)
+    model.save()
+    assert model.weights(STAGE) == PRIOR_WEIGHTS
+    assert model.estimate(STAGE, [RINGS])[0] > model.estimate(STAGE, [CHAINS])[0]
+
+
+def test_blend_moves_towards_the_fit():
+    model = CostModel(path=None)
+    rows = molecules(MIN_SAMPLES // 2)
+    model.add_samples(STAGE, rows, np.asarray(rows, dtype=float) @ TRUE_WEIGHTS)
+    model.save()
+    weights = np.asarray(model.weights(STAGE))
+    assert not np.allclose(weights / weights.sum(), np.asarray(PRIOR_WEIGHTS) / sum(PRIOR_WEIGHTS))
+    # Half of the weight is the fit, which only uses the hydrogens
+    assert weights[DESCRIPTOR_NAMES.index('hydrogens')] > 0.005
+
+
+def test_fit_takes_over():
+    model = CostModel(path=None)
+    rows = molecules(MIN_SAMPLES * 4)
+    model.add_samples(STAGE, rows, np.asarray(rows, dtype=float) @ TRUE_WEIGHTS)
+    model.save()
+    np.testing.assert_allclose(model.weights(STAGE), TRUE_WEIGHTS, atol=1e-6)
+    # The ranking follows the measurements, not the prior
+    assert model.estimate(STAGE, [CHAINS])[0] > model.estimate(STAGE, [RINGS])[0]
+
+
+def test_fit_is_saved(tmp_path):
+    path = str(tmp_path / "cost_model.json")
+    model = CostModel(path=path)
+    rows = molecules(MIN_SAMPLES)
+    model.add_samples(STAGE, rows, np.asarray(rows, dtype=float) @ TRUE_WEIGHTS)
+    model.save()
+    np.testing.assert_allclose(CostModel(path=path).weights(STAGE), TRUE_WEIGHTS, atol=1e-6)
+
+
+def test_java_parts_record_per_molecule_samples(tmp_path, monkeypatch):
+    """Every molecule timed by the BatchProcessor is one sample of the cost model."""
+    Chem = pytest.importorskip("rdkit.Chem")
+    import nmr_backends
+
+    mol_directory = tmp_path / "mols"
+    mol_directory.mkdir()
+    smiles = ['C' * n for n in range(1, 21)] + ['c1ccccc1' + 'C' * n for n in range(20)]
+    for number, text in enumerate(smiles):
+        Chem.MolToMolFile(Chem.MolFromSmiles(text), str(mol_directory / f"m{number:02d}.mol"))
+
+    def fake_batch_processor(directory, predictor, quiet=False, work_dir=None, run=True, trace_path=None, **options):
+        if run and trace_path:
+            with open(trace_path, 'w', encoding='utf-8') as f:
+                for filename in sorted(os.listdir(directory)):
+                    f.write(f"{filename}\t{10 + len(filename)}\n")
+        return str(tmp_path / "out")
+
+    monkeypatch.setattr(nmr_backends, 'run_java_batch_processor', fake_batch_processor)
+    model = CostModel(path=None)
+    backend = nmr_backends.JavaBackend(silent=True, workers=2, cost_model=model)
+    backend.predict(str(mol_directory), '1H', quiet=True, work_dir=str(tmp_path))
+
+    samples = model.stages['predict_spectra_1H']['samples']
+    assert len(samples) == len(smiles)
+    assert all(seconds == pytest.approx(0.017) for _, seconds in samples)
@@ -0,0 +1,83 @@
+"""
+End-to-end check of --shard: the merged results of shards 1/2 and 2/2 must be
+byte-identical to the results of one unsharded run.
+
+The pipeline runs with the pure-Python 'lookup' NMR backend and small SVR
+models trained on random data, so neither Java nor the released models are
+needed.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+joblib = pytest.importorskip("joblib")
+pytest.importorskip("rdkit")
+SVR = pytest.importorskip("sklearn.svm").SVR
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(REPO, "logD_predictor_bin")
+PROPERTIES = ['CHI_logD_pH_2.6', 'CHI_logD_pH_7.4', 'CHI_logD_pH_10.5']
+
+
+def make_models(models_dir, predictor='hybrid', input_dim=500):
+    """One small SVR per property, listed in <predictor>_models_info.csv."""
+    os.makedirs(models_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    rows = []
+    for prop in PROPERTIES:
+        features = rng.random((40, input_dim))
+        model_path = f"{predictor}_{prop}_svr.joblib"
+        joblib.dump(SVR().fit(features, rng.normal(size=40)), os.path.join(models_dir, model_path))
+        rows.append({'model_path': model_path, 'model_name': f"{predictor}_{prop}_SVR", 'ML_algorithm': 'SVR',
+                     'property': prop, 'RMSE': 0.5, 'MAE': 0.4, 'Q2': 0.7, 'PEARSON': 0.8})
+    pd.DataFrame(rows).to_csv(os.path.join(models_dir, f"{predictor}_models_info.csv"), sep=';', index=False)
+
+
+@pytest.fixture
+def program(tmp_path):
+    """Copy of logD_predictor_bin with test models."""
+    target = tmp_path / "logD_predictor_bin"
+    shutil.copytree(SOURCE_DIR, target, ignore=shutil.ignore_patterns('__pycache__', 'joblib_models', 'img'))
+    make_models(str(target / "joblib_models"))
+    return target
+
+
+def run(program, cwd, *args):
+    os.makedirs(cwd, exist_ok=True)
+    command = [sys.executable, str(program / "logD_predictor.py"), os.path.join(SOURCE_DIR, "input_example.csv"),
+               "--predictor", "hybrid", "--nmr-backend", "lookup", "--use_svr", "--quiet", *args]
+    completed = subprocess.run(command, cwd=cwd, input="\n", capture_output=True, text=True, timeout=600)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+
+def result_file(cwd, pattern):
+    paths = glob.glob(os.path.join(cwd, "Prediction_Results", "hybrid_logD_results", pattern))
+    assert len(paths) == 1, paths
+    with open(paths[0], 'rb') as f:
+        return f.read()
+
+
+def test_merged_shards_match_single_run(program, tmp_path):
+    single = str(tmp_path / "single")
+    sharded = str(tmp_path / "sharded")
+    run(program, single)
+    run(program, sharded, "--shard", "1/2")
+    run(program, sharded, "--shard", "2/2")
+
+    merge = subprocess.run([sys.executable, str(program / "sharding.py"), "--predictor", "hybrid"],
+                           cwd=sharded, capture_output=True, text=True, timeout=300)
+    assert merge.returncode == 0, merge.stdout + merge.stderr
+
+    for prefix in ("summary_results_", "model_predictions_"):
+        merged = [path for path in glob.glob(os.path.join(sharded, "Prediction_Results", "hybrid_logD_results",
+                                                          f"{prefix}*.csv")) if "shard-" not in path]
+        assert len(merged) == 1, merged
+        with open(merged[0], 'rb') as f:
+            assert f.read() == result_file(single, f"{prefix}*.csv")
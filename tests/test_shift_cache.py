@@ -0,0 +1,40 @@
+"""
+Regression checks of --shift-cache: the shift files of the Java
+BatchProcessor must be the same with and without the cache, on the 2D path
+(--nmr-2d) where it is used and on the default 3D path where it is off.
+
+Needs a JDK and the predictor jars in logD_predictor_bin/predictor; skipped
+otherwise.
+"""
+
+import re
+
+import pytest
+
+from test_symmetry_reuse import NUCLEI, batch_processor, predict_shifts, write_mol_files
+
+
+@pytest.mark.parametrize("nucleus", list(NUCLEI))
+def test_cached_shifts_match_2d_predictions(nucleus, tmp_path):
+    classpath, class_name = batch_processor(nucleus, tmp_path)
+    mol_folder = str(tmp_path / "mols")
+    write_mol_files(mol_folder)
+    plain, _ = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "plain"), "no3d")
+    cached, output = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "cached"), "no3d",
+                                    options=("-Dlogd.cache=1000",))
+
+    assert int(re.search(r"Shift cache: (\d+) of", output).group(1)) > 0
+    assert cached == plain
+
+
+@pytest.mark.parametrize("nucleus", list(NUCLEI))
+def test_shift_cache_keeps_3d_shifts(nucleus, tmp_path):
+    classpath, class_name = batch_processor(nucleus, tmp_path)
+    mol_folder = str(tmp_path / "mols")
+    write_mol_files(mol_folder)
+    plain, _ = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "plain"))
+    cached, output = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "cached"),
+                                    options=("-Dlogd.cache=1000",))
+
+    assert cached == plain
+    assert "Shift cache is off" in output
@@ -0,0 +1,37 @@
+"""
+Compiled SVR bundles: the exported kernel evaluation must reproduce the
+scikit-learn predictions, and models whose kernel coefficient cannot be
+read from public parameters fall back to a joblib copy.
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+SVR = pytest.importorskip("sklearn.svm").SVR
+
+import SVR_predict
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    return rng.random((60, 12)), rng.normal(size=60)
+
+
+@pytest.mark.parametrize("kernel", ['rbf', 'linear', 'poly', 'sigmoid'])
+@pytest.mark.parametrize("gamma", ['scale', 'auto', 0.05])
+def test_compiled_predictions_match(kernel, gamma, data, tmp_path):
+    features, target = data
+    model = SVR(kernel=kernel, gamma=gamma, coef0=0.1).fit(features, target)
+    path = SVR_predict.save_compiled(model, str(tmp_path / "svr"))
+    assert path.endswith('.json')
+    compiled = SVR_predict.load_compiled(path)
+    assert np.abs(compiled.predict(features) - model.predict(features)).max() < 1e-9
+
+
+def test_unknown_fitted_gamma_falls_back_to_joblib(data, tmp_path):
+    features, target = data
+    model = SVR(gamma='scale').fit(features, target)
+    del model._gamma  # e.g. renamed by a newer scikit-learn
+    path = SVR_predict.save_compiled(model, str(tmp_path / "svr"))
+    assert path.endswith('.joblib')
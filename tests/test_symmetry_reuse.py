@@ -0,0 +1,142 @@
+"""
+Regression checks of --symmetry-reuse.
+
+With --nmr-2d the launcher passes 'no3d' to the Java BatchProcessor, and the
+reused shifts must equal the per-atom predictions on that path. With the
+default 3D predictions the topological classes are not used, so molecules
+with diastereotopic CH2 protons keep their per-atom shifts.
+
+The BatchProcessor checks need a JDK and the predictor jars in
+logD_predictor_bin/predictor and are skipped otherwise.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import nmr_backends
+import predictor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICTOR_DIR = os.path.join(REPO, "logD_predictor_bin", "predictor")
+CDK_JAR = os.path.join(PREDICTOR_DIR, "cdk-2.9.jar")
+
+# Methyl, tert-butyl and para-phenyl atoms, and CH2 protons next to a stereocentre
+MOLECULES = {
+    "butan-2-ol": "C[C@@H](O)CC",
+    "2-methylbutanoic_acid": "CC[C@H](C)C(=O)O",
+    "phenylalanine": "N[C@@H](Cc1ccccc1)C(=O)O",
+    "4-tert-butyltoluene": "Cc1ccc(cc1)C(C)(C)C",
+}
+
+NUCLEI = {
+    "1H": ("predictorh.jar", "BatchProcessor1H"),
+    "13C": ("predictorc.jar", "BatchProcessor13C"),
+}
+
+
+class FinishedProcess:
+    returncode = 0
+
+    def wait(self, timeout=None):
+        return 0
+
+
+def test_nmr_2d_reaches_the_batch_processor(monkeypatch, tmp_path):
+    commands = []
+
+    def popen(command, **kwargs):
+        commands.append(command)
+        return FinishedProcess()
+
+    monkeypatch.setattr(predictor.subprocess, "Popen", popen)
+    for use3d in (True, False):
+        predictor.run_java_batch_processor(str(tmp_path), "1H", quiet=True, work_dir=str(tmp_path),
+                                           compile_sources=False, use3d=use3d)
+    assert commands[0][-1] != "no3d"
+    assert commands[1][-1] == "no3d"
+
+
+def test_java_backend_passes_use3d(monkeypatch, tmp_path):
+    calls = []
+
+    def run_java_batch_processor(*args, **kwargs):
+        calls.append(kwargs)
+        return str(tmp_path)
+
+    monkeypatch.setattr(nmr_backends, "run_java_batch_processor", run_java_batch_processor)
+    backend = nmr_backends.get_backend("java", silent=True, symmetry_reuse=True, use3d=False)
+    backend.predict(str(tmp_path), "1H", quiet=True, work_dir=str(tmp_path))
+    assert calls[0]["use3d"] is False
+    assert "-Dlogd.symmetry=true" in calls[0]["java_options"]
+
+
+def batch_processor(nucleus, tmp_path):
+    """Classpath and class name of the compiled BatchProcessor of *nucleus*."""
+    predictor_jar, class_name = NUCLEI[nucleus]
+    predictor_jar = os.path.join(PREDICTOR_DIR, predictor_jar)
+    if shutil.which("javac") is None or shutil.which("java") is None:
+        pytest.skip("no JDK")
+    if not (os.path.exists(predictor_jar) and os.path.exists(CDK_JAR)):
+        pytest.skip("predictor jars not installed")
+    classes = str(tmp_path / "classes")
+    classpath = os.pathsep.join([predictor_jar, CDK_JAR, classes])
+    subprocess.run(["javac", "-classpath", classpath, "-d", classes, "-proc:none",
+                    os.path.join(PREDICTOR_DIR, f"{class_name}.java")],
+                   check=True, capture_output=True, timeout=300)
+    return classpath, class_name
+
+
+def write_mol_files(folder):
+    Chem = pytest.importorskip("rdkit.Chem")
+    from gen_mols import safe_embed_molecule
+
+    os.makedirs(folder)
+    for name, smiles in MOLECULES.items():
+        mol, warning = safe_embed_molecule(Chem.AddHs(Chem.MolFromSmiles(smiles)))
+        assert warning is None, warning
+        Chem.MolToMolFile(mol, os.path.join(folder, f"{name}.mol"))
+
+
+def predict_shifts(classpath, class_name, mol_folder, output_folder, *arguments, options=()):
+    os.makedirs(output_folder)
+    completed = subprocess.run(["java", "-Xmx1g", *options, "-classpath", classpath,
+                                f"predictor.{class_name}", mol_folder, output_folder,
+                                "Dimethylsulphoxide-D6 (DMSO-D6, C2D6SO)", *arguments],
+                               capture_output=True, text=True, timeout=600)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    shifts = {}
+    for name in MOLECULES:
+        with open(os.path.join(output_folder, f"{name}.csv"), 'rb') as f:
+            shifts[name] = f.read()
+    return shifts, completed.stdout
+
+
+@pytest.mark.parametrize("nucleus", list(NUCLEI))
+def test_reused_shifts_match_2d_predictions(nucleus, tmp_path):
+    classpath, class_name = batch_processor(nucleus, tmp_path)
+    mol_folder = str(tmp_path / "mols")
+    write_mol_files(mol_folder)
+    plain, _ = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "plain"), "no3d")
+    reused, output = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "reused"), "no3d",
+                                    options=("-Dlogd.symmetry=true",))
+
+    # Reused shifts are written without predicting the atom, so equal files mean equal shifts
+    assert int(re.search(r"Symmetry reuse: (\d+) of", output).group(1)) > 0
+    assert reused == plain
+
+
+@pytest.mark.parametrize("nucleus", list(NUCLEI))
+def test_symmetry_reuse_keeps_3d_shifts(nucleus, tmp_path):
+    classpath, class_name = batch_processor(nucleus, tmp_path)
+    mol_folder = str(tmp_path / "mols")
+    write_mol_files(mol_folder)
+    plain, _ = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "plain"))
+    reused, output = predict_shifts(classpath, class_name, mol_folder, str(tmp_path / "reused"),
+                                    options=("-Dlogd.symmetry=true",))
+
+    assert reused == plain
+    assert "Symmetry reuse is off" in output
@@ -0,0 +1,37 @@
+"""
+The Java watchdog (predictor.watch_batch_processor) must kill a process that
+never reports a molecule as well as one stuck on a molecule.
+"""
+
+import subprocess
+import sys
+import time
+
+import predictor
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+
+def test_kills_process_without_progress(monkeypatch, tmp_path):
+    monkeypatch.setattr(predictor, "WATCHDOG_POLL", 0.1)
+    process = subprocess.Popen(SLEEPER)
+    started = time.time()
+    assert predictor.watch_batch_processor(process, str(tmp_path / "missing.progress"), timeout=0.5,
+                                           startup_grace=0.5)
+    assert process.returncode is not None
+    assert time.time() - started < 30
+
+
+def test_kills_process_stuck_on_a_molecule(monkeypatch, tmp_path):
+    monkeypatch.setattr(predictor, "WATCHDOG_POLL", 0.1)
+    progress_path = tmp_path / "run.progress"
+    progress_path.write_text("stuck.mol")
+    process = subprocess.Popen(SLEEPER)
+    assert predictor.watch_batch_processor(process, str(progress_path), timeout=0.5, startup_grace=60)
+    assert process.returncode is not None
+
+
+def test_finished_process_is_not_timed_out(tmp_path):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    assert not predictor.watch_batch_processor(process, str(tmp_path / "missing.progress"), timeout=0.5,
+                                               startup_grace=0.5)
@@ -0,0 +1,26 @@
+"""
+Checks that the logs of concurrent runs are collected under run-specific
+names instead of overwriting each other in the working directory.
+"""
+
+import os
+
+from workspace import Workspace
+
+
+def test_collect_prefixes_the_logs_with_the_run_id(tmp_path):
+    destination = tmp_path / "cwd"
+    destination.mkdir()
+    runs = [Workspace(str(tmp_path / "scratch")) for _ in range(2)]
+    for run in runs:
+        with open(os.path.join(run.path, "mol_creation_error.log"), 'w') as f:
+            f.write(run.run_id)
+
+    copied = [path for run in runs for path in run.collect(str(destination))]
+
+    assert sorted(os.path.basename(path) for path in copied) == \
+        sorted(f"{run.run_id}_mol_creation_error.log" for run in runs)
+    for run in runs:
+        with open(destination / f"{run.run_id}_mol_creation_error.log") as f:
+            assert f.read() == run.run_id
+        assert run.cleanup()
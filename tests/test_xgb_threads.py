@@ -0,0 +1,43 @@
+"""
+XGBoost boosters shared through the model cache are configured once per
+thread count and never reconfigured by predict().
+"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+joblib = pytest.importorskip("joblib")
+xgb = pytest.importorskip("xgboost")
+
+import model_query
+import XGB_predict
+
+
+def booster_nthread(booster):
+    return int(json.loads(booster.save_config())['learner']['generic_param']['nthread'])
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    rng = np.random.default_rng(0)
+    features = pd.DataFrame(rng.random((50, 8)), columns=[f"FEATURE_{i + 1}" for i in range(8)])
+    model = xgb.XGBRegressor(n_estimators=5).fit(features, rng.random(50))
+    path = str(tmp_path / "test_xgb.joblib")
+    joblib.dump(model, path)
+    return path, features
+
+
+def test_boosters_are_cached_per_thread_count(model_path, monkeypatch):
+    monkeypatch.setattr(model_query, "_MODEL_CACHE", {})
+    path, features = model_path
+    one = model_query.get_model('XGB', path, 8, nthread=1)
+    two = model_query.get_model('XGB', path, 8, nthread=2)
+
+    assert one is model_query.get_model('XGB', path, 8, nthread=1)
+    assert (booster_nthread(one), booster_nthread(two)) == (1, 2)
+    np.testing.assert_array_equal(XGB_predict.predict(one, features), XGB_predict.predict(two, features))
+    # Scoring does not touch the configuration of the shared boosters
+    assert (booster_nthread(one), booster_nthread(two)) == (1, 2)